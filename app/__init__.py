@@ -26,12 +26,48 @@ def create_app() -> Flask:
     # Load configuration
     app.config.from_object(Config)
 
+    # Queue-based logging so requests never block on stderr
+    from app.logs import configure_logging
+    configure_logging()
+
     # Ensure output directory exists
     os.makedirs(app.config['OUTPUT_DIR'], exist_ok=True)
 
+    # Server-side sessions: the cookie only carries a session ID
+    from app.sessions import ServerSideSessionInterface, get_session_store
+    session_store = get_session_store()
+    if session_store is not None:
+        app.session_interface = ServerSideSessionInterface(session_store)
+
     # Register blueprints
     from app.routes import invoice_bp
+    from app.api import api_bp
     app.register_blueprint(invoice_bp)
+    app.register_blueprint(api_bp)
+
+    # Fingerprinted, precompressed CSS/JS and pre-rendered page fragments
+    from app.assets import init_assets
+    from app.page_cache import init_page_cache
+    init_assets(app)
+    init_page_cache(app)
+
+    # Initialize ReportLab, fonts, styles and logos now: under gunicorn this
+    # runs once in the master and the forked workers share the result
+    from app.warmup import record_first_request, warm_up
+    if app.config['WARMUP_ENABLED']:
+        warm_up(app)
+    record_first_request(app)
+
+    # Start background cleanup of expired invoices. Under gunicorn the app
+    # is preloaded in the master, so each worker starts its own scheduler
+    # from the post_fork hook in gunicorn_config.py instead.
+    if not os.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn"):
+        from app.cleanup import start_cleanup_scheduler
+        start_cleanup_scheduler()
+        
+        if app.config['RENDER_QUEUE_ENABLED'] and app.config['RENDER_QUEUE_INPROCESS']:
+            from app.jobs import start_render_workers
+            start_render_workers()
 
     return app
 
@@ -0,0 +1,244 @@
+"""
+Exact invoice aggregation over a column-oriented view of the expenses.
+Amounts are held as integer paisa (1/100 BDT) in an int64 buffer and
+categories as integer codes indexed against EXPENSE_CATEGORIES, so the
+total, per-category and per-month subtotals and the date-range check are
+computed in one pass without float rounding error. NumPy is used when it is
+installed; otherwise the stdlib array module. Amounts (or sums) that would
+not fit in int64 are aggregated as Python ints instead, which are exact at
+any size.
+"""
+
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from app.models import EXPENSE_CATEGORIES, ExpenseTable
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the array fallback gives the same results
+    np = None
+
+
+CENT = Decimal("0.01")
+INT64_MAX = 2 ** 63 - 1
+
+
+def to_paisa(amount) -> int:
+    """
+    Convert a BDT amount (float, Decimal, int or str) to integer paisa.
+
+    Floats go through their shortest repr, so a form value such as 0.1 is
+    read as exactly 10 paisa rather than its binary approximation.
+    """
+    if isinstance(amount, int):
+        return amount * 100
+    if isinstance(amount, float):
+        # Two-decimal amounts (everything the form produces) land within
+        # float noise of a whole number of paisa
+        scaled = amount * 100
+        paisa = round(scaled)
+        if abs(scaled - paisa) < 1e-6:
+            return paisa
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    return int(value.quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+class ExpenseColumns:
+    """
+    Column-oriented copy of a list of ExpenseItems (or an ExpenseTable).
+
+    ``amounts`` are paisa, ``categories`` are codes into ``category_names``
+    (EXPENSE_CATEGORIES first, then unknown categories in first-seen
+    order), ``months`` are ``year * 12 + month - 1`` and ``days`` are date
+    ordinals.
+
+    The columns are NumPy arrays (``vectorized``) when NumPy is installed
+    and no sum of the amounts can overflow int64; otherwise stdlib arrays,
+    with ``amounts`` a list of Python ints if one of them exceeds int64.
+    """
+
+    __slots__ = ("amounts", "categories", "months", "days", "category_names", "vectorized")
+
+    def __init__(self, expenses):
+        if isinstance(expenses, ExpenseTable):
+            amounts, categories, months, days, names = self._from_table(expenses)
+        else:
+            amounts, categories, months, days, names = self._from_items(expenses)
+
+        vector = np.frombuffer(amounts, dtype=np.int64) if np is not None and isinstance(amounts, array) else None
+        self.vectorized = vector is not None and _sums_fit_int64(vector)
+        if self.vectorized:
+            amounts = vector
+            categories = np.frombuffer(categories, dtype=np.uint16)
+            months = np.asarray(months, dtype=np.int64)
+            days = np.asarray(days, dtype=np.int64)
+
+        self.amounts = amounts
+        self.categories = categories
+        self.months = months
+        self.days = days
+        self.category_names = names
+
+    @staticmethod
+    def _from_items(expenses) -> tuple:
+        codes = {name: code for code, name in enumerate(EXPENSE_CATEGORIES)}
+        names = list(EXPENSE_CATEGORIES)
+        amounts, categories, months, days = array("q"), array("H"), array("l"), array("l")
+
+        for item in expenses:
+            code = codes.get(item.category)
+            if code is None:
+                code = codes[item.category] = len(names)
+                names.append(item.category)
+            expense_date = item.date
+            paisa = to_paisa(item.amount)
+            try:
+                amounts.append(paisa)
+            except OverflowError:
+                amounts = list(amounts)  # Beyond int64: keep exact Python ints
+                amounts.append(paisa)
+            categories.append(code)
+            months.append(expense_date.year * 12 + expense_date.month - 1)
+            days.append(expense_date.toordinal())
+        return amounts, categories, months, days, names
+
+    @staticmethod
+    def _from_table(table: ExpenseTable) -> tuple:
+        # The table already holds category codes in the same numbering and
+        # date ordinals; only amounts and months need converting
+        month_of = {}
+        for day in set(table.days):
+            day_date = date.fromordinal(day)
+            month_of[day] = day_date.year * 12 + day_date.month - 1
+        try:
+            amounts = array("q", map(to_paisa, table.amounts))
+        except OverflowError:
+            amounts = list(map(to_paisa, table.amounts))
+        return (
+            amounts,
+            array("H", table.categories),
+            array("l", map(month_of.__getitem__, table.days)),
+            array("l", table.days),
+            list(table.category_names),
+        )
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+
+def _sums_fit_int64(amounts) -> bool:
+    """Whether no partial sum of an int64 NumPy array can overflow int64."""
+    if not len(amounts):
+        return True
+    return max(int(amounts.max()), -int(amounts.min())) * len(amounts) <= INT64_MAX
+
+
+@dataclass(frozen=True)
+class InvoiceTotals:
+    """
+    Aggregates of an invoice's expenses, all amounts in integer paisa.
+
+    Attributes:
+        total: Sum of all expenses
+        by_category: {category: subtotal} in EXPENSE_CATEGORIES order
+        category_counts: {category: number of expenses}
+        by_month: {(year, month): subtotal} in calendar order
+        out_of_range: Indices of expenses dated outside the invoice period
+        count: Number of expenses aggregated
+        source: The expense list the totals were computed from
+    """
+
+    total: int
+    by_category: dict
+    category_counts: dict
+    by_month: dict
+    out_of_range: tuple
+    count: int
+    source: object
+
+    @property
+    def total_amount(self) -> float:
+        """Total in BDT, rounded exactly to the paisa."""
+        return self.total / 100
+
+    @property
+    def total_decimal(self) -> Decimal:
+        return Decimal(self.total) / 100
+
+
+def aggregate(expenses, start_date=None, end_date=None) -> InvoiceTotals:
+    """
+    Compute totals, category and month subtotals and the date-range check.
+
+    Args:
+        expenses: List of ExpenseItem
+        start_date, end_date: Invoice period; expenses outside it (inclusive)
+            are listed in ``out_of_range``. Skipped if either is None.
+    """
+    columns = ExpenseColumns(expenses)
+    first = start_date.toordinal() if start_date is not None and end_date is not None else None
+    last = end_date.toordinal() if first is not None else None
+
+    if columns.vectorized:
+        total, by_code, counts, by_month, out_of_range = _aggregate_numpy(columns, first, last)
+    else:
+        total, by_code, counts, by_month, out_of_range = _aggregate_array(columns, first, last)
+
+    names = columns.category_names
+    return InvoiceTotals(
+        total=total,
+        by_category={names[code]: amount for code, amount in sorted(by_code.items())},
+        category_counts={names[code]: count for code, count in sorted(counts.items())},
+        by_month={(month // 12, month % 12 + 1): amount for month, amount in sorted(by_month.items())},
+        out_of_range=tuple(out_of_range),
+        count=len(columns),
+        source=expenses,
+    )
+
+
+def _aggregate_numpy(columns: ExpenseColumns, first, last) -> tuple:
+    amounts, categories = columns.amounts, columns.categories
+    total = int(amounts.sum())
+
+    # np.add.at accumulates in int64, so subtotals stay exact (ExpenseColumns
+    # only vectorizes amounts whose sums fit)
+    by_code = np.zeros(len(columns.category_names), dtype=np.int64)
+    np.add.at(by_code, categories, amounts)
+    counts = np.bincount(categories, minlength=len(columns.category_names))
+    used = np.flatnonzero(counts)
+
+    months, month_index = np.unique(columns.months, return_inverse=True)
+    by_month = np.zeros(len(months), dtype=np.int64)
+    np.add.at(by_month, month_index, amounts)
+
+    out_of_range = []
+    if first is not None:
+        out_of_range = np.flatnonzero((columns.days < first) | (columns.days > last)).tolist()
+
+    return (
+        total,
+        {int(code): int(by_code[code]) for code in used},
+        {int(code): int(counts[code]) for code in used},
+        {int(month): int(amount) for month, amount in zip(months, by_month)},
+        out_of_range,
+    )
+
+
+def _aggregate_array(columns: ExpenseColumns, first, last) -> tuple:
+    total = 0
+    by_code, counts, by_month, out_of_range = {}, {}, {}, []
+    check_range = first is not None
+
+    for index, (amount, code, month, day) in enumerate(
+        zip(columns.amounts, columns.categories, columns.months, columns.days)
+    ):
+        total += amount
+        by_code[code] = by_code.get(code, 0) + amount
+        counts[code] = counts.get(code, 0) + 1
+        by_month[month] = by_month.get(month, 0) + amount
+        if check_range and not first <= day <= last:
+            out_of_range.append(index)
+
+    return total, by_code, counts, by_month, out_of_range
@@ -0,0 +1,302 @@
+"""
+JSON REST API for headless invoice rendering.
+POST an Invoice as JSON to /api/v1/invoices and get the PDF back, or a
+render job ID in async mode. Payloads are validated with the same rules
+as the invoice form, and the render cache key doubles as the PDF's ETag.
+Archived invoices are searched under /api/v1/archive, which requires the
+ARCHIVE_API_TOKEN as a bearer token.
+"""
+
+import json
+import logging
+import re
+import zlib
+from datetime import date
+from flask import Blueprint, Response, jsonify, request, send_file, url_for
+from app.archive import get_archive
+from app.jobs import get_job_queue, QueueFullError, DONE, INVOICE
+from app.metrics import registry, timed
+from app.models import Invoice
+from app.render_cache import get_render_cache, invoice_key
+from app.storage import get_invoice_store
+from app.utils import bearer_token_matches, invoice_filename
+from app.validation import invoice_errors
+from config import Config
+
+api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+logger = logging.getLogger(__name__)
+
+INVOICE_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+class ApiError(Exception):
+    """An error answered with a JSON ``{"error": ..., "errors": [...]}`` body."""
+
+    def __init__(self, message: str, status: int, errors: list = None, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.errors = errors
+        self.headers = headers
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(error):
+    registry.inc("invoice_api_requests_total", result=str(error.status))
+    body = {"error": str(error)}
+    if error.errors:
+        body["errors"] = error.errors
+    return jsonify(body), error.status, error.headers or {}
+
+
+@api_bp.errorhandler(413)
+def handle_too_large(error):
+    # Bodies over MAX_CONTENT_LENGTH are rejected by Werkzeug while reading
+    registry.inc("invoice_api_requests_total", result="413")
+    return jsonify(error="Request body too large"), 413
+
+
+def _read_body() -> bytes:
+    """
+    Return the request body, decompressing ``Content-Encoding: gzip``.
+
+    The compressed body is limited by MAX_CONTENT_LENGTH and the
+    decompressed one by API_MAX_BODY_SIZE, so a small gzip bomb cannot
+    expand into unbounded memory.
+
+    Raises:
+        ApiError: 413 if a limit is exceeded, 415 for other encodings,
+            400 for a corrupt gzip stream
+    """
+    limit = Config.API_MAX_BODY_SIZE
+    encoding = request.headers.get("Content-Encoding", "identity").strip().lower()
+    if encoding not in ("identity", "gzip"):
+        raise ApiError(f"Unsupported Content-Encoding: {encoding}", 415)
+    if encoding == "identity" and (request.content_length or 0) > limit:
+        raise ApiError("Request body too large", 413)
+
+    body = request.get_data(cache=False)
+    if encoding == "identity":
+        return body
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, limit + 1)
+    except zlib.error:
+        raise ApiError("Request body is not valid gzip", 400) from None
+    if len(data) > limit:
+        raise ApiError("Request body too large", 413)
+    if not decompressor.eof:
+        raise ApiError("Request body is not valid gzip", 400)
+    return data
+
+
+def _parse_invoice(body: bytes) -> Invoice:
+    """
+    Build and validate an Invoice from a JSON body.
+
+    Raises:
+        ApiError: 400 for malformed JSON or missing fields, 413 for too
+            many expenses, 422 (with per-field errors) for invalid values
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise ApiError("Request body is not valid JSON", 400) from None
+    if not isinstance(data, dict) or not isinstance(data.get("expenses"), list):
+        raise ApiError("Expected a JSON object with an 'expenses' list", 400)
+    if len(data["expenses"]) > Config.API_MAX_EXPENSES:
+        raise ApiError(f"Too many expenses (max {Config.API_MAX_EXPENSES})", 413)
+
+    try:
+        invoice = Invoice.from_dict(data)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ApiError(f"Invalid invoice: {e}", 400) from None
+
+    errors = invoice_errors(invoice, Config.IMPORT_MAX_ERRORS)
+    if errors:
+        raise ApiError("Invoice validation failed", 422, errors)
+    return invoice
+
+
+def _wants_async() -> bool:
+    if request.args.get("async", "").lower() in ("1", "true"):
+        return True
+    return "respond-async" in request.headers.get("Prefer", "").lower()
+
+
+def _send_pdf(stored_name: str, key: str, download_name: str = None):
+    pdf = get_invoice_store().open(stored_name)
+    if pdf is None:
+        return None
+    with timed("send_file"):
+        return send_file(
+            pdf,
+            mimetype="application/pdf",
+            download_name=download_name or stored_name,
+            etag=key,
+            conditional=True,
+        )
+
+
+@api_bp.route("/invoices", methods=["POST"])
+def create_invoice():
+    """
+    Render an invoice from a JSON body.
+
+    Returns the PDF (200), or with ``Prefer: respond-async`` (or
+    ``?async=1``) and the render queue enabled a job to poll (202). The
+    ETag is the invoice's content key: a request whose If-None-Match
+    already names it gets 304 without rendering.
+    """
+    with timed("form_validation"):
+        invoice = _parse_invoice(_read_body())
+
+    key = invoice_key(invoice)
+    stored_name = f"{key}.pdf"
+    invoice_url = url_for("api.get_invoice", key=key)
+
+    if request.if_none_match.contains(key):
+        registry.inc("invoice_api_requests_total", result="304")
+        response = Response(status=304)
+        response.set_etag(key)
+        return response
+
+    cache = get_render_cache()
+    if Config.RENDER_QUEUE_ENABLED and _wants_async():
+        if cache.lookup(stored_name):
+            registry.inc("invoice_api_requests_total", result="done")
+            return jsonify(status="done", invoice_url=invoice_url)
+        try:
+            job_id = get_job_queue().enqueue(invoice, stored_name)
+        except QueueFullError:
+            raise ApiError("The render queue is full. Please retry shortly.", 503) from None
+
+        logger.info("API PDF queued: %s", stored_name)
+        registry.inc("invoice_api_requests_total", result="queued")
+        status_url = url_for("api.get_job", job_id=job_id)
+        response = jsonify(job_id=job_id, status="queued", status_url=status_url, invoice_url=invoice_url)
+        response.status_code = 202
+        response.headers["Location"] = status_url
+        return response
+
+    stored_name, cached = cache.get_or_render(invoice)
+    logger.info("API PDF %s: %s", "served from cache" if cached else "generated", stored_name)
+    response = _send_pdf(stored_name, key, invoice_filename(invoice))
+    if response is None:
+        raise ApiError("Rendered invoice is no longer available", 500)
+    registry.inc("invoice_api_requests_total", result="cached" if cached else "rendered")
+    return response
+
+
+@api_bp.route("/invoices/<key>")
+def get_invoice(key):
+    """Download a rendered invoice by its content key (the ETag of POST /invoices)."""
+    if not INVOICE_KEY.fullmatch(key):
+        raise ApiError("Unknown invoice", 404)
+    response = _send_pdf(f"{key}.pdf", key)
+    if response is None:
+        raise ApiError("Unknown invoice", 404)
+    return response
+
+
+@api_bp.route("/jobs/<job_id>")
+def get_job(job_id):
+    """Return the status of an async render job, with the invoice's URL once it is rendered."""
+    job = get_job_queue().get(job_id) if Config.RENDER_QUEUE_ENABLED else None
+    # Batch jobs are only reported by /batch/<job_id>
+    if job is None or job["kind"] != INVOICE:
+        raise ApiError("Unknown job", 404)
+
+    body = {"id": job["id"], "status": job["status"], "error": job["error"]}
+    if job["status"] == DONE:
+        body["invoice_url"] = url_for("api.get_invoice", key=job["filename"][:-len(".pdf")])
+    return jsonify(body)
+
+
+def _archive():
+    """
+    Return the archive for an authorized request.
+
+    Archived invoices hold every employee's expenses, so the endpoints are
+    only served with ARCHIVE_API_TOKEN set, to requests carrying it as
+    ``Authorization: Bearer <token>``.
+    """
+    archive = get_archive()
+    if archive is None or not Config.ARCHIVE_API_TOKEN:
+        raise ApiError("The invoice archive is not enabled", 404)
+    if not bearer_token_matches(Config.ARCHIVE_API_TOKEN):
+        raise ApiError("A valid archive API token is required", 401, headers={"WWW-Authenticate": "Bearer"})
+    return archive
+
+
+def _archive_filter(name: str):
+    """Return a query parameter, checking that dates are ISO (YYYY-MM-DD)."""
+    value = request.args.get(name, "").strip() or None
+    if value and name in ("from", "to"):
+        try:
+            value = date.fromisoformat(value).isoformat()
+        except ValueError:
+            raise ApiError(f"'{name}' must be a date (YYYY-MM-DD)", 400) from None
+    return value
+
+
+@api_bp.route("/archive/invoices")
+def query_archive():
+    """
+    Search archived invoices.
+
+    Query parameters (all optional, combined with AND): ``employee_id``,
+    ``company``, ``department``, ``category`` (invoices with at least one
+    expense in it), ``from`` and ``to`` (invoices whose period overlaps),
+    ``limit`` and ``cursor`` (``next_cursor`` of the previous page).
+    Returns the page of invoices, totals over all matches and the cursor
+    of the next page.
+    """
+    archive = _archive()
+    try:
+        limit = int(request.args.get("limit", 0)) or None
+    except ValueError:
+        raise ApiError("'limit' must be an integer", 400) from None
+    try:
+        result = archive.query(
+            employee_id=_archive_filter("employee_id"),
+            company=_archive_filter("company"),
+            department=_archive_filter("department"),
+            category=_archive_filter("category"),
+            period_from=_archive_filter("from"),
+            period_to=_archive_filter("to"),
+            cursor=_archive_filter("cursor"),
+            limit=limit,
+        )
+    except ValueError as e:
+        raise ApiError(str(e), 400) from None
+
+    for invoice in result["invoices"]:
+        invoice["url"] = url_for("api.get_archived_invoice", invoice_id=invoice["id"])
+        invoice["pdf_url"] = url_for("api.get_archived_pdf", invoice_id=invoice["id"])
+    if result["next_cursor"]:
+        args = dict(request.args, cursor=result["next_cursor"])
+        result["next_url"] = url_for("api.query_archive", **args)
+    return jsonify(result)
+
+
+@api_bp.route("/archive/invoices/<int:invoice_id>")
+def get_archived_invoice(invoice_id):
+    """Return an archived invoice with its expenses."""
+    invoice = _archive().get(invoice_id)
+    if invoice is None:
+        raise ApiError("Unknown archived invoice", 404)
+    invoice["pdf_url"] = url_for("api.get_archived_pdf", invoice_id=invoice_id)
+    return jsonify(invoice)
+
+
+@api_bp.route("/archive/invoices/<int:invoice_id>/pdf")
+def get_archived_pdf(invoice_id):
+    """Download an archived invoice's PDF."""
+    found = _archive().open_pdf(invoice_id)
+    if found is None:
+        raise ApiError("Unknown archived invoice", 404)
+    path, filename = found
+    with timed("send_file"):
+        return send_file(path, mimetype="application/pdf", download_name=filename, conditional=True)
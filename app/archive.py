@@ -0,0 +1,442 @@
+"""
+Persistent, indexed archive of generated invoices.
+Invoice and expense data go into a SQLite database (WAL mode, shared by
+all gunicorn workers) and PDFs into a content-addressed blob directory,
+so auditors can look up past reports by employee, company, department,
+period and category long after the working copy in OUTPUT_DIR expired.
+Archived invoices are kept for ARCHIVE_RETENTION_DAYS.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config import Config
+from app.metrics import registry, timed
+from app.storage import write_atomic
+
+
+logger = logging.getLogger(__name__)
+
+# Invoices deleted per transaction by purge_expired, so retention sweeps
+# never hold the write lock for long
+PURGE_BATCH_SIZE = 500
+
+
+class InvoiceArchive:
+    """
+    SQLite invoice archive with PDFs stored as blobs named by their SHA-256.
+
+    Amounts are stored as integer paisa. ``invoice_categories`` holds each
+    invoice's per-category subtotals (at most one row per category), which
+    is what category lookups and totals read instead of the expense rows.
+    The lookup indexes end in (start_date, id) for keyset pagination and
+    carry the period and totals, so totals over many matches never read
+    the invoice rows themselves.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            company TEXT NOT NULL,
+            prepared_by TEXT NOT NULL,
+            employee_id TEXT NOT NULL,
+            department TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            profile TEXT,
+            expense_count INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            pdf_digest TEXT NOT NULL,
+            pdf_size INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS invoices_employee
+            ON invoices (employee_id, start_date, id, end_date, expense_count, total);
+        CREATE INDEX IF NOT EXISTS invoices_company
+            ON invoices (company, start_date, id, end_date, expense_count, total);
+        CREATE INDEX IF NOT EXISTS invoices_department
+            ON invoices (department, start_date, id, end_date, expense_count, total);
+        CREATE INDEX IF NOT EXISTS invoices_period ON invoices (start_date, id, end_date, expense_count, total);
+        CREATE INDEX IF NOT EXISTS invoices_created ON invoices (created_at);
+        CREATE INDEX IF NOT EXISTS invoices_pdf ON invoices (pdf_digest);
+
+        CREATE TABLE IF NOT EXISTS expenses (
+            invoice_id INTEGER NOT NULL,
+            line INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            note TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            PRIMARY KEY (invoice_id, line)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS invoice_categories (
+            category TEXT NOT NULL,
+            invoice_id INTEGER NOT NULL,
+            expense_count INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            PRIMARY KEY (category, invoice_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS invoice_categories_invoice ON invoice_categories (invoice_id);
+    """
+
+    def __init__(self, path: str, blob_dir: str):
+        self.path = path
+        self.blob_dir = blob_dir
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(blob_dir, exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are per-thread)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def blob_path(self, digest: str) -> str:
+        """Return the blob file for a PDF's SHA-256 hex digest."""
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.pdf")
+
+    def add(self, invoice, pdf: bytes, key: str = None, created_at: float = None) -> int:
+        """
+        Archive an invoice and its PDF unless the same invoice is archived.
+
+        Identical PDFs share one blob. The blob is written while the
+        database write lock is held, so a concurrent retention sweep cannot
+        delete it between the write and the insert.
+
+        Args:
+            invoice: Rendered Invoice
+            pdf: Its PDF bytes
+            key: Invoice content key (default: render_cache.invoice_key)
+            created_at: Archive time (default: now); retention counts from it
+
+        Returns:
+            int: Archive ID of the invoice
+        """
+        from app.render_cache import invoice_key
+        from app.utils import invoice_filename
+
+        key = key or invoice_key(invoice)
+        digest = hashlib.sha256(pdf).hexdigest()
+        totals = invoice.totals
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id FROM invoices WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return row["id"]
+
+            blob = self.blob_path(digest)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                write_atomic(blob, pdf)
+
+            invoice_id = conn.execute(
+                """
+                INSERT INTO invoices (
+                    key, company, prepared_by, employee_id, department, start_date, end_date,
+                    profile, expense_count, total, filename, pdf_digest, pdf_size, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    key,
+                    invoice.company.strip(),
+                    invoice.prepared_by.strip(),
+                    invoice.employee_id.strip(),
+                    invoice.department.strip(),
+                    invoice.start_date.isoformat(),
+                    invoice.end_date.isoformat(),
+                    invoice.profile,
+                    totals.count,
+                    totals.total,
+                    invoice_filename(invoice),
+                    digest,
+                    len(pdf),
+                    created_at or time.time(),
+                ),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (invoice_id, line, item.date.isoformat(), item.category, item.description,
+                     item.note or "", amount)
+                    for line, (item, amount) in enumerate(zip(invoice.expenses, _paisa(invoice.expenses)))
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO invoice_categories VALUES (?, ?, ?, ?)",
+                (
+                    (category, invoice_id, totals.category_counts[category], amount)
+                    for category, amount in totals.by_category.items()
+                ),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return invoice_id
+
+    def get(self, invoice_id: int):
+        """
+        Return an archived invoice with its expenses, or None for an unknown ID.
+
+        Returns:
+            dict | None: Invoice fields as in query() plus an ``expenses`` list
+        """
+        conn = self._connection()
+        row = conn.execute("SELECT * FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
+        if row is None:
+            return None
+        invoice = _invoice_dict(row)
+        invoice["expenses"] = [
+            {
+                "date": expense["date"],
+                "category": expense["category"],
+                "description": expense["description"],
+                "note": expense["note"],
+                "amount": expense["amount"] / 100,
+            }
+            for expense in conn.execute(
+                "SELECT * FROM expenses WHERE invoice_id = ? ORDER BY line", (invoice_id,)
+            )
+        ]
+        return invoice
+
+    def open_pdf(self, invoice_id: int):
+        """
+        Return the archived PDF's blob path and download name.
+
+        Returns:
+            tuple | None: (path, filename), or None if unknown or the blob is missing
+        """
+        row = self._connection().execute(
+            "SELECT pdf_digest, filename FROM invoices WHERE id = ?", (invoice_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        path = self.blob_path(row["pdf_digest"])
+        if not os.path.exists(path):
+            return None
+        return path, row["filename"]
+
+    def query(
+        self,
+        employee_id: str = None,
+        company: str = None,
+        department: str = None,
+        category: str = None,
+        period_from: str = None,
+        period_to: str = None,
+        cursor: str = None,
+        limit: int = None,
+    ) -> dict:
+        """
+        Find archived invoices, newest period first, one page at a time.
+
+        Filters are combined with AND; the period filters select invoices
+        whose period overlaps [period_from, period_to] (ISO dates). Pages
+        are keyset-paginated: pass the previous page's ``next_cursor`` to
+        get the next one, so deep pages cost the same as the first.
+
+        Args:
+            limit: Page size (default ARCHIVE_PAGE_SIZE, capped at
+                ARCHIVE_MAX_PAGE_SIZE)
+
+        Returns:
+            dict: ``invoices`` (this page), ``totals`` over every match
+            (invoice and expense counts and amount; with a category filter,
+            that category's expenses and amount) and ``next_cursor`` (None
+            on the last page)
+
+        Raises:
+            ValueError: For a malformed cursor
+        """
+        limit = max(1, min(limit or Config.ARCHIVE_PAGE_SIZE, Config.ARCHIVE_MAX_PAGE_SIZE))
+        where, params = [], []
+        for column, value in (("employee_id", employee_id), ("company", company), ("department", department)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if period_from:
+            where.append("end_date >= ?")
+            params.append(period_from)
+        if period_to:
+            where.append("start_date <= ?")
+            params.append(period_to)
+
+        conn = self._connection()
+        with timed("archive_query"):
+            clause = f"WHERE {' AND '.join(where)}" if where else ""
+            if category and where:
+                count, expense_count, total = conn.execute(
+                    f"""
+                    SELECT COUNT(*), SUM(c.expense_count), SUM(c.amount) FROM invoices
+                    JOIN invoice_categories AS c ON c.category = ? AND c.invoice_id = invoices.id
+                    {clause}
+                    """,
+                    [category, *params],
+                ).fetchone()
+            elif category:
+                count, expense_count, total = conn.execute(
+                    "SELECT COUNT(*), SUM(expense_count), SUM(amount) FROM invoice_categories WHERE category = ?",
+                    (category,),
+                ).fetchone()
+            else:
+                count, expense_count, total = conn.execute(
+                    f"SELECT COUNT(*), SUM(expense_count), SUM(total) FROM invoices {clause}", params
+                ).fetchone()
+            totals = {"invoices": count, "expenses": expense_count or 0, "total": (total or 0) / 100}
+
+            page_where, page_params = list(where), list(params)
+            if category:
+                # Walk the invoices in page order and probe the category
+                page_where.append(
+                    "EXISTS (SELECT 1 FROM invoice_categories WHERE category = ? AND invoice_id = invoices.id)"
+                )
+                page_params.append(category)
+            if cursor:
+                page_where.append("(start_date, id) < (?, ?)")
+                page_params.extend(_decode_cursor(cursor))
+            page_clause = f"WHERE {' AND '.join(page_where)}" if page_where else ""
+            rows = conn.execute(
+                f"SELECT * FROM invoices {page_clause} ORDER BY start_date DESC, id DESC LIMIT ?",
+                [*page_params, limit + 1],
+            ).fetchall()
+
+        next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return {
+            "invoices": [_invoice_dict(row) for row in rows[:limit]],
+            "totals": totals,
+            "next_cursor": next_cursor,
+        }
+
+    def purge_expired(self, retention_days: int) -> tuple:
+        """
+        Delete invoices archived more than retention_days ago.
+
+        Blobs no longer referenced by any invoice are deleted with them.
+        A retention of 0 keeps everything.
+
+        Returns:
+            tuple: (invoices removed, blob bytes reclaimed)
+        """
+        if not retention_days:
+            return 0, 0
+        cutoff = time.time() - retention_days * 86400
+        conn = self._connection()
+        removed, reclaimed = 0, 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, pdf_digest FROM invoices WHERE created_at < ? LIMIT ?",
+                    (cutoff, PURGE_BATCH_SIZE),
+                ).fetchall()
+                ids = [(row["id"],) for row in rows]
+                conn.executemany("DELETE FROM expenses WHERE invoice_id = ?", ids)
+                conn.executemany("DELETE FROM invoice_categories WHERE invoice_id = ?", ids)
+                conn.executemany("DELETE FROM invoices WHERE id = ?", ids)
+                for digest in {row["pdf_digest"] for row in rows}:
+                    if conn.execute("SELECT 1 FROM invoices WHERE pdf_digest = ? LIMIT 1", (digest,)).fetchone():
+                        continue
+                    try:
+                        path = self.blob_path(digest)
+                        size = os.path.getsize(path)
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    reclaimed += size
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            removed += len(rows)
+            if len(rows) < PURGE_BATCH_SIZE:
+                return removed, reclaimed
+
+
+def _paisa(expenses):
+    from app.aggregation import to_paisa
+    return (to_paisa(item.amount) for item in expenses)
+
+
+def _invoice_dict(row) -> dict:
+    return {
+        "id": row["id"],
+        "key": row["key"],
+        "company": row["company"],
+        "prepared_by": row["prepared_by"],
+        "employee_id": row["employee_id"],
+        "department": row["department"],
+        "start_date": row["start_date"],
+        "end_date": row["end_date"],
+        "profile": row["profile"],
+        "expense_count": row["expense_count"],
+        "total": row["total"] / 100,
+        "filename": row["filename"],
+        "pdf_size": row["pdf_size"],
+        "created_at": row["created_at"],
+    }
+
+
+def _encode_cursor(row) -> str:
+    token = f"{row['start_date']}|{row['id']}".encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_date, invoice_id = token.split("|")
+        return start_date, int(invoice_id)
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+
+
+_archive = None
+_lock = threading.Lock()
+
+
+def get_archive():
+    """Return the process-wide archive, or None unless ARCHIVE_ENABLED."""
+    global _archive
+    if not Config.ARCHIVE_ENABLED:
+        return None
+    with _lock:
+        if _archive is None:
+            _archive = InvoiceArchive(Config.ARCHIVE_DB, Config.ARCHIVE_BLOB_DIR)
+        return _archive
+
+
+def archive_invoice(invoice, pdf: bytes, key: str = None) -> None:
+    """
+    Archive a freshly rendered invoice if the archive is enabled.
+
+    Failures are logged and counted but never fail the render.
+    """
+    archive = get_archive()
+    if archive is None:
+        return
+    try:
+        with timed("archive_write"):
+            archive.add(invoice, pdf, key)
+    except (sqlite3.Error, OSError):
+        logger.exception("Could not archive invoice %s", key)
+        registry.inc("invoice_archive_writes_total", result="error")
+    else:
+        registry.inc("invoice_archive_writes_total", result="ok")
@@ -0,0 +1,140 @@
+"""
+Fingerprinted, precompressed static assets.
+CSS and JS files are read once at start-up, named after a hash of their
+content (``css/style.3f2a9c1b7e.css``) and compressed with gzip (and
+brotli when installed). They are served from memory under /assets with
+immutable caching, so browsers only refetch them after a deploy that
+changes them.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from flask import Blueprint, Response, abort, current_app, request, url_for
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # Optional: without it assets are only gzip-compressed
+    brotli = None
+
+
+assets_bp = Blueprint("assets", __name__, url_prefix="/assets")
+
+ASSET_EXTENSIONS = (".css", ".js")
+HASH_LENGTH = 10
+
+
+@dataclass
+class Asset:
+    """One static file with its precompressed variants."""
+
+    path: str  # Versioned path under /assets, e.g. css/style.3f2a9c1b7e.css
+    digest: str
+    mimetype: str
+    variants: dict = field(default_factory=dict)  # Content-Encoding -> bytes ("identity" = original)
+
+
+def _versioned_path(filename: str, digest: str) -> str:
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def load_asset(static_folder: str, filename: str) -> Asset:
+    """
+    Read a static file and build its fingerprinted, compressed variants.
+
+    Files under ASSET_COMPRESS_MIN_SIZE bytes are not compressed, and a
+    compressed variant is only kept if it is smaller than the original.
+    """
+    with open(os.path.join(static_folder, filename), "rb") as asset_file:
+        data = asset_file.read()
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    asset = Asset(_versioned_path(filename, digest), digest, mimetype, {"identity": data})
+
+    if len(data) >= Config.ASSET_COMPRESS_MIN_SIZE:
+        compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(data, quality=11)
+        for encoding, body in compressed.items():
+            if len(body) < len(data):
+                asset.variants[encoding] = body
+    return asset
+
+
+class AssetManifest:
+    """
+    Fingerprinted CSS/JS files of a static folder, held in memory.
+
+    Attributes:
+        assets: Original path (css/style.css) -> Asset
+        versioned: Versioned path -> Asset
+    """
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self.assets = {}
+        self.versioned = {}
+        for root, _, files in os.walk(static_folder):
+            for name in sorted(files):
+                if name.endswith(ASSET_EXTENSIONS):
+                    filename = os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, "/")
+                    asset = load_asset(static_folder, filename)
+                    self.assets[filename] = asset
+                    self.versioned[asset.path] = asset
+
+    def url(self, filename: str) -> str:
+        """
+        Return the fingerprinted URL of a static file.
+
+        Files the manifest does not cover (e.g. logos) fall back to the
+        plain /static URL.
+        """
+        asset = self.assets.get(filename)
+        if asset is None:
+            return url_for("static", filename=filename)
+        return url_for("assets.asset", filename=asset.path)
+
+
+def _preferred_encoding(asset: Asset) -> str:
+    """Pick the best variant the client accepts (brotli, then gzip)."""
+    accepted = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in asset.variants and accepted[encoding]:
+            return encoding
+    return "identity"
+
+
+@assets_bp.route("/<path:filename>")
+def asset(filename):
+    """Serve a fingerprinted asset from memory with immutable caching."""
+    asset = current_app.extensions["asset_manifest"].versioned.get(filename)
+    if asset is None:
+        abort(404)
+
+    encoding = _preferred_encoding(asset)
+    response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = f"public, max-age={Config.ASSET_MAX_AGE}, immutable"
+    # One ETag per variant: caches must not mix up encodings
+    response.set_etag(f"{asset.digest}-{encoding}")
+    return response.make_conditional(request)
+
+
+def init_assets(app) -> AssetManifest:
+    """
+    Build the asset manifest for ``app`` and expose ``asset_url()`` to templates.
+
+    Returns:
+        AssetManifest: Also stored as ``app.extensions["asset_manifest"]``
+    """
+    manifest = AssetManifest(app.static_folder)
+    app.extensions["asset_manifest"] = manifest
+    app.register_blueprint(assets_bp)
+    app.jinja_env.globals["asset_url"] = manifest.url
+    return manifest
@@ -0,0 +1,418 @@
+"""
+Batch invoice generation for bulk month-end runs.
+Renders many invoices in parallel worker processes and packages the
+results as a ZIP archive or a directory of PDFs with a JSON manifest.
+
+Usage:
+    python -m app.batch invoices.json -o reports.zip
+    python -m app.batch invoices.csv --output-dir reports/ --workers 8
+    python -m app.batch annual.csv --stream -o annual.pdf
+    python -m app.batch invoices.json -o reports.zip --profile compact
+    python -m app.batch invoices.csv --consolidate --output-dir consolidated/
+"""
+
+import argparse
+import csv
+import dataclasses
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from config import Config
+from app.metrics import registry
+from app.models import Invoice, ExpenseItem, ExpenseTable
+from app.profiles import PROFILES, get_profile
+from app.utils import invoice_filename, process_pool
+from app.validation import invoice_errors
+
+
+INVOICE_FIELDS = ("company", "prepared_by", "employee_id", "department", "start_date", "end_date")
+
+
+def load_invoices_json(fp):
+    """
+    Yield Invoices from a JSON document.
+
+    Accepts either a list of invoice objects or ``{"invoices": [...]}``.
+    """
+    data = json.load(fp)
+    if isinstance(data, dict):
+        data = data.get("invoices")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of invoices")
+    for index, item in enumerate(data):
+        try:
+            yield Invoice.from_dict(item)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invoice {index}: {e}") from None
+
+
+def load_invoices_csv(fp):
+    """
+    Yield Invoices from a CSV file with one expense per row.
+
+    Each row repeats the invoice columns (company, prepared_by, employee_id,
+    department, start_date, end_date) followed by the expense columns
+    (date, category, description, note, amount). Consecutive rows with the
+    same invoice columns form one invoice, so only the current invoice is
+    held in memory, its expenses in a compact ExpenseTable.
+    """
+    current_key, current = None, None
+    for line, row in enumerate(csv.DictReader(fp), start=2):
+        try:
+            key = tuple(row[field] for field in INVOICE_FIELDS)
+            expense = ExpenseItem.from_dict(row)
+        except KeyError as e:
+            raise ValueError(f"CSV line {line}: missing column {e.args[0]!r}") from None
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"CSV line {line}: {e}") from None
+
+        if key != current_key:
+            if current is not None:
+                yield current
+            data = dict(zip(INVOICE_FIELDS, key), expenses=[])
+            current_key, current = key, Invoice.from_dict(data)
+            current.expenses = ExpenseTable()
+        current.expenses.append(expense)
+
+    if current is not None:
+        yield current
+
+
+def stream_invoice_csv(fp):
+    """
+    Read a single-invoice CSV lazily for streaming generation.
+
+    Uses the same columns as load_invoices_csv, but every row must belong
+    to the invoice on the first row.
+
+    Returns:
+        tuple: (Invoice header with no expenses, iterator of ExpenseItem)
+
+    Raises:
+        ValueError: If the CSV is empty or a row is invalid (raised while
+            iterating for rows after the first)
+    """
+    rows = enumerate(csv.DictReader(fp), start=2)
+    first = next(rows, None)
+    if first is None:
+        raise ValueError("CSV file has no expense rows")
+    try:
+        key = tuple(first[1][field] for field in INVOICE_FIELDS)
+    except KeyError as e:
+        raise ValueError(f"CSV line 2: missing column {e.args[0]!r}") from None
+    header = Invoice.from_dict(dict(zip(INVOICE_FIELDS, key), expenses=[]))
+
+    def expenses():
+        for line, row in itertools.chain([first], rows):
+            try:
+                if tuple(row[field] for field in INVOICE_FIELDS) != key:
+                    raise ValueError("row belongs to a different invoice")
+                yield ExpenseItem.from_dict(row)
+            except KeyError as e:
+                raise ValueError(f"CSV line {line}: missing column {e.args[0]!r}") from None
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"CSV line {line}: {e}") from None
+
+    return header, expenses()
+
+
+def load_invoices(fp, fmt: str, profile: str = None):
+    """
+    Yield Invoices from an open text file in 'json' or 'csv' format.
+
+    A ``profile`` name overrides each invoice's own output profile.
+    """
+    if fmt == "json":
+        invoices = load_invoices_json(fp)
+    elif fmt == "csv":
+        invoices = load_invoices_csv(fp)
+    else:
+        raise ValueError(f"Unsupported batch format: {fmt!r}")
+    if profile is None:
+        return invoices
+    return _with_profile(invoices, get_profile(profile).name)
+
+
+def _with_profile(invoices, profile: str):
+    for invoice in invoices:
+        invoice.profile = profile
+        yield invoice
+
+
+def batch_errors(invoices, max_errors: int = None) -> list:
+    """
+    Check loaded invoices with the form's rules (app.validation.invoice_errors),
+    including that every expense is dated within its invoice's period.
+
+    Invoices are checked one at a time, so a CSV is validated in bounded memory.
+
+    Returns:
+        list: ``{"invoice": index, "field": ..., "message": ...}`` dicts;
+        empty if every invoice is valid
+    """
+    errors = []
+    for index, invoice in enumerate(invoices):
+        remaining = None if max_errors is None else max_errors - len(errors)
+        if remaining is not None and remaining <= 0:
+            break
+        errors.extend({"invoice": index, **error} for error in invoice_errors(invoice, remaining, within_period=True))
+    return errors
+
+
+def stream_errors(fp, max_errors: int = None) -> list:
+    """Like batch_errors for a single-invoice CSV read by stream_invoice_csv."""
+    header, expenses = stream_invoice_csv(fp)
+    return batch_errors([dataclasses.replace(header, expenses=expenses)], max_errors)
+
+
+def _render(invoice) -> bytes:
+    """Process pool entry point: render one invoice to PDF bytes."""
+    from app.pdf_generator import render_invoice_pdf
+    pdf = render_invoice_pdf(invoice)
+    registry.flush()
+    return pdf
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """
+    Return this process's shared pool of BATCH_WORKERS processes, creating it on first use.
+
+    The default pool for library callers; the CLI passes its own and the
+    render queue renders /batch jobs on its worker pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = process_pool(Config.BATCH_WORKERS)
+        return _pool
+
+
+def render_batch(invoices, pool=None, chunk_size: int = None):
+    """
+    Render invoices in parallel, yielding ``(invoice, pdf_bytes)`` in input order.
+
+    At most ``chunk_size`` renders are in flight at once and the input is
+    consumed lazily, so memory stays bounded regardless of batch size.
+    """
+    pool = pool or get_render_pool()
+    chunk_size = chunk_size or Config.BATCH_CHUNK_SIZE
+    pending = deque()
+
+    for invoice in invoices:
+        pending.append((invoice, pool.submit(_render, invoice)))
+        if len(pending) >= chunk_size:
+            invoice, future = pending.popleft()
+            yield invoice, future.result()
+
+    while pending:
+        invoice, future = pending.popleft()
+        yield invoice, future.result()
+
+
+def _unique_name(filename: str, used: set) -> str:
+    """Suffix filename with -2, -3, ... if it was already used in this batch."""
+    name, counter = filename, 1
+    while name in used:
+        counter += 1
+        name = f"{filename[:-4]}-{counter}.pdf"
+    used.add(name)
+    return name
+
+
+def _manifest_entry(filename: str, invoice, pdf: bytes) -> dict:
+    return {
+        "filename": filename,
+        "company": invoice.company,
+        "prepared_by": invoice.prepared_by,
+        "employee_id": invoice.employee_id,
+        "department": invoice.department,
+        "start_date": invoice.start_date.isoformat(),
+        "end_date": invoice.end_date.isoformat(),
+        "expenses": len(invoice.expenses),
+        "total": invoice.total_amount,
+        "size": len(pdf),
+    }
+
+
+def write_zip(results, fileobj) -> list:
+    """
+    Write rendered PDFs and a manifest.json into a ZIP archive.
+
+    Args:
+        results: Iterable of (invoice, pdf_bytes) from render_batch
+        fileobj: Writable binary file object
+
+    Returns:
+        list: Manifest entries
+    """
+    manifest, used = [], set()
+    # PDF streams are already compressed, so store them as-is
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED) as archive:
+        for invoice, pdf in results:
+            filename = _unique_name(invoice_filename(invoice), used)
+            archive.writestr(filename, pdf)
+            manifest.append(_manifest_entry(filename, invoice, pdf))
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    return manifest
+
+
+def write_directory(results, output_dir: str) -> list:
+    """
+    Write rendered PDFs and a manifest.json into a directory.
+
+    Returns:
+        list: Manifest entries
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest, used = [], set()
+    for invoice, pdf in results:
+        filename = _unique_name(invoice_filename(invoice), used)
+        with open(os.path.join(output_dir, filename), "wb") as pdf_file:
+            pdf_file.write(pdf)
+        manifest.append(_manifest_entry(filename, invoice, pdf))
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def build_batch_zip(invoices, pool=None):
+    """
+    Render invoices into a ZIP held in a spooled temporary file.
+
+    Returns:
+        SpooledTemporaryFile: ZIP archive positioned at the start
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=Config.PDF_SPOOL_MAX_SIZE)
+    write_zip(render_batch(invoices, pool), buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.batch", description=__doc__.splitlines()[1])
+    parser.add_argument("input", help="JSON or CSV file with invoices ('-' for stdin)")
+    parser.add_argument("--format", choices=["json", "csv"], help="Input format (default: from file extension)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("-o", "--output", help="Write a ZIP archive to this path")
+    output.add_argument("--output-dir", help="Write PDFs and manifest.json to this directory")
+    parser.add_argument("--workers", type=int, default=Config.BATCH_WORKERS, help="Render processes")
+    parser.add_argument("--chunk-size", type=int, default=Config.BATCH_CHUNK_SIZE, help="Max renders in flight")
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        help="Output profile for every invoice (default: each invoice's, then PDF_PROFILE)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Render a single-invoice CSV of any length to one PDF (-o) with bounded memory",
+    )
+    parser.add_argument(
+        "--consolidate",
+        action="store_true",
+        help="Merge the invoices behind a cover page: into one PDF (-o) or one per "
+             "company, department and month (--output-dir)",
+    )
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "json")
+    if args.stream and (fmt != "csv" or not args.output):
+        parser.error("--stream needs CSV input and an -o PDF path")
+    fp = _open_input(args.input)
+
+    # Nothing is rendered unless every invoice is valid
+    try:
+        errors = stream_errors(fp, Config.IMPORT_MAX_ERRORS) if args.stream else \
+            batch_errors(load_invoices(fp, fmt), Config.IMPORT_MAX_ERRORS)
+    except ValueError as e:
+        errors = [{"message": str(e)}]
+    if errors:
+        fp.close()
+        for error in errors:
+            location = f"Invoice {error['invoice']}: {error['field']}: " if "invoice" in error else ""
+            print(f"Error: {location}{error['message']}", file=sys.stderr)
+        return 1
+    fp.seek(0)
+
+    if args.stream:
+        return _stream_main(fp, args.output, args.profile)
+    if args.consolidate:
+        return _consolidate_main(fp, fmt, args)
+
+    try:
+        with fp, ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = render_batch(load_invoices(fp, fmt, args.profile), pool, args.chunk_size)
+            if args.output:
+                with open(args.output, "wb") as zip_file:
+                    manifest = write_zip(results, zip_file)
+                destination = args.output
+            else:
+                manifest = write_directory(results, args.output_dir)
+                destination = args.output_dir
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Rendered {len(manifest)} invoices to {destination}")
+    return 0
+
+
+def _open_input(path: str):
+    """Open the input for reading twice (validation, then rendering); stdin is spooled to a file."""
+    if path != "-":
+        return open(path, newline="", encoding="utf-8")
+    spool = tempfile.TemporaryFile("w+", newline="", encoding="utf-8")
+    shutil.copyfileobj(sys.stdin, spool)
+    spool.seek(0)
+    return spool
+
+
+def _consolidate_main(fp, fmt: str, args) -> int:
+    """Render the input into consolidated PDFs."""
+    from app.consolidate import consolidate, consolidate_groups
+
+    try:
+        with fp, ProcessPoolExecutor(max_workers=args.workers) as pool:
+            invoices = load_invoices(fp, fmt, args.profile)
+            if args.output:
+                members = consolidate(invoices, args.output, pool, args.chunk_size)
+                print(f"Consolidated {len(members)} invoices into {args.output}")
+            else:
+                manifest = consolidate_groups(invoices, args.output_dir, pool, args.chunk_size)
+                print(f"Wrote {len(manifest)} consolidated PDFs to {args.output_dir}")
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _stream_main(fp, output: str, profile: str = None) -> int:
+    """Render one streamed CSV invoice to a PDF file."""
+    from app.pdf_generator import generate_invoice_pdf_streaming
+
+    try:
+        with fp:
+            header, expenses = stream_invoice_csv(fp)
+            header.profile = profile
+            totals = generate_invoice_pdf_streaming(header, expenses, output)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Rendered {totals.count} expenses (BDT {totals.total_decimal:,.2f}) to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Background cleanup of expired invoice PDFs.
+Keeps an append-only expiry index next to the generated files so sweeps
+only touch expired entries, and runs sweeps on a daemon thread instead of
+in the request path.
+"""
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from app.metrics import registry
+from app.sessions import get_session_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryIndex:
+    """
+    Min-heap of (created_at, filename) persisted in a small sidecar file.
+
+    Writers append one JSON line per file. The sweeping process keeps the
+    heap in memory and only reads lines appended since its last sweep, so a
+    sweep costs O(new entries + expired entries * log n) instead of a
+    directory listing plus a stat per file.
+
+    Restarting a file's expiry clock appends another line for it. Only the
+    newest line per file matters (the sweep skips files modified after the
+    cutoff), so the sweep compacts the index once it holds COMPACT_RATIO
+    lines per distinct file.
+    """
+
+    COMPACT_RATIO = 2
+    COMPACT_MIN_ENTRIES = 1000  # Smaller indexes are not worth deduplicating
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._heap = []
+        self._position = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self, blocking: bool = True):
+        """Serialize index access across gunicorn workers; yields False if busy."""
+        if fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, filename: str, created_at: float = None) -> None:
+        """Record a newly written file."""
+        line = json.dumps([created_at or time.time(), filename]) + "\n"
+        with self._file_lock():
+            with open(self.path, "a", encoding="utf-8") as index_file:
+                index_file.write(line)
+
+    def seed(self, directory: str, suffix: str = ".pdf") -> None:
+        """Index files already in directory, once, when no sidecar exists yet."""
+        with self._file_lock():
+            if os.path.exists(self.path) or not os.path.isdir(directory):
+                return
+            with open(self.path, "a", encoding="utf-8") as index_file:
+                for entry in os.scandir(directory):
+                    if entry.name.endswith(suffix) and entry.is_file():
+                        index_file.write(json.dumps([entry.stat().st_mtime, entry.name]) + "\n")
+
+    def pop_expired(self, cutoff: float) -> list:
+        """
+        Remove and return filenames created at or before cutoff.
+
+        Returns an empty list when another process is currently sweeping.
+        """
+        with self._lock, self._file_lock(blocking=False) as acquired:
+            if not acquired:
+                return []
+            self._refresh()
+
+            expired = []
+            while self._heap and self._heap[0][0] <= cutoff:
+                expired.append(heapq.heappop(self._heap)[1])
+
+            if self._compact() or expired:
+                self._rewrite()
+            return expired
+
+    def _compact(self) -> bool:
+        """Keep only the newest entry per file if duplicates pass COMPACT_RATIO."""
+        if len(self._heap) < self.COMPACT_MIN_ENTRIES:
+            return False
+        newest = {}
+        for created_at, filename in self._heap:
+            if created_at > newest.get(filename, float("-inf")):
+                newest[filename] = created_at
+        if len(self._heap) < len(newest) * self.COMPACT_RATIO:
+            return False
+        self._heap = [(created_at, filename) for filename, created_at in newest.items()]
+        heapq.heapify(self._heap)
+        return True
+
+    def _refresh(self) -> None:
+        """Load entries appended since the last sweep into the heap."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._heap, self._position, self._inode = [], 0, None
+            return
+
+        # Rewritten by another process since we last looked: reload it all
+        if stat.st_ino != self._inode or stat.st_size < self._position:
+            self._heap, self._position, self._inode = [], 0, stat.st_ino
+
+        with open(self.path, "rb") as index_file:
+            index_file.seek(self._position)
+            data = index_file.read()
+
+        # Ignore a trailing partial line; it is picked up on the next sweep
+        complete = data[:data.rfind(b"\n") + 1]
+        self._position += len(complete)
+        for line in complete.splitlines():
+            try:
+                created_at, filename = json.loads(line)
+            except ValueError:
+                continue
+            heapq.heappush(self._heap, (created_at, filename))
+
+    def _rewrite(self) -> None:
+        """Persist the remaining heap, replacing the sidecar atomically."""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            for created_at, filename in self._heap:
+                index_file.write(json.dumps([created_at, filename]) + "\n")
+        os.replace(temp_path, self.path)
+        stat = os.stat(self.path)
+        self._inode, self._position = stat.st_ino, stat.st_size
+
+
+class CleanupScheduler(threading.Thread):
+    """
+    Daemon thread that purges expired invoices every ``interval`` seconds
+    and publishes this process's metrics every ``flush_interval`` seconds.
+    """
+
+    def __init__(self, interval: int, max_age_seconds: int, flush_interval: int = None):
+        super().__init__(name="invoice-cleanup", daemon=True)
+        self.interval = interval
+        self.max_age_seconds = max_age_seconds
+        self.flush_interval = flush_interval or Config.METRICS_FLUSH_INTERVAL
+        self.pid = os.getpid()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        next_sweep = time.monotonic()
+        while True:
+            if time.monotonic() >= next_sweep:
+                self.sweep()
+                next_sweep = time.monotonic() + self.interval
+            registry.flush()
+            if self._stop_event.wait(min(self.flush_interval, next_sweep - time.monotonic())):
+                break
+
+    def sweep(self) -> None:
+        """Run a single cleanup pass and record its metrics."""
+        from app.storage import get_invoice_store
+
+        started = time.perf_counter()
+        try:
+            files, size = get_invoice_store().purge_expired(self.max_age_seconds)
+            session_store = get_session_store()
+            if session_store is not None:
+                registry.inc("invoice_sessions_expired_total", session_store.purge_expired())
+            # /batch queues jobs even with the render queue disabled
+            if Config.RENDER_QUEUE_ENABLED or os.path.exists(Config.RENDER_QUEUE_DB):
+                from app.jobs import get_job_queue
+                get_job_queue().purge(self.max_age_seconds, Config.RENDER_QUEUE_JOB_TIMEOUT)
+            if Config.ARCHIVE_ENABLED:
+                # Archived invoices follow the retention policy, not max_age_seconds
+                from app.archive import get_archive
+                archived, archived_size = get_archive().purge_expired(Config.ARCHIVE_RETENTION_DAYS)
+                registry.inc("invoice_archive_purged_total", archived)
+                registry.inc("invoice_archive_bytes_reclaimed_total", archived_size)
+        except Exception:
+            # Never let a failed sweep kill the thread
+            logger.exception("Cleanup sweep failed")
+            registry.inc("invoice_cleanup_errors_total")
+        else:
+            registry.inc("invoice_cleanup_files_reclaimed_total", files)
+            registry.inc("invoice_cleanup_bytes_reclaimed_total", size)
+        registry.inc("invoice_cleanup_sweeps_total")
+        registry.observe("invoice_cleanup_sweep_seconds", time.perf_counter() - started)
+        registry.set("invoice_cleanup_last_sweep_timestamp_seconds", time.time())
+        registry.flush()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_cleanup_scheduler() -> CleanupScheduler:
+    """
+    Start the cleanup thread for this process if it is not already running.
+
+    Safe to call after fork: a scheduler inherited from a parent process is
+    not running in the child, so a new one is started.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler.pid != os.getpid() or not _scheduler.is_alive():
+            _scheduler = CleanupScheduler(Config.CLEANUP_INTERVAL, Config.CLEANUP_MAX_AGE)
+            _scheduler.start()
+        return _scheduler
+
+
+def stop_cleanup_scheduler() -> None:
+    """Stop this process's cleanup thread, if any."""
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.pid == os.getpid():
+            _scheduler.stop()
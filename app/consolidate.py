@@ -0,0 +1,280 @@
+"""
+Consolidated PDFs: many invoices merged into one document, e.g. one per
+department and month for finance.
+Member invoices are rendered in parallel worker processes (app.batch) and
+their pages are merged with pypdf without re-rendering. Objects repeated
+in every member, the watermark logo and fonts, are deduplicated as the
+merge proceeds. A cover page lists each member's total and first page,
+and every member gets a PDF bookmark.
+
+Grouped output reads the input in order, one group at a time, so the
+invoices must already be sorted (or at least grouped) by company,
+department and month.
+
+Usage:
+    python -m app.batch invoices.csv --consolidate --output-dir consolidated/
+    python -m app.batch invoices.json --consolidate -o hr-2026-01.pdf
+"""
+
+import hashlib
+import io
+import json
+import os
+from dataclasses import dataclass
+from datetime import date
+from itertools import groupby
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+from app.batch import render_batch
+from app.pdf_generator import render_cover_pdf
+
+
+@dataclass
+class ConsolidatedMember:
+    """One invoice in a consolidated PDF, as listed on the cover page."""
+
+    prepared_by: str
+    employee_id: str
+    start_date: date
+    end_date: date
+    expenses: int  # Number of expense rows
+    total: int  # Exact total in paisa
+    pages: int
+    first_page: int = 0  # 1-based page of the consolidated PDF
+
+    def to_dict(self) -> dict:
+        return {
+            "prepared_by": self.prepared_by,
+            "employee_id": self.employee_id,
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "expenses": self.expenses,
+            "total": self.total / 100,
+            "pages": self.pages,
+            "first_page": self.first_page,
+        }
+
+
+class SharedResources:
+    """
+    Deduplicate page resources (fonts, the watermark form and its image)
+    across the PDFs merged into one writer.
+
+    Before a member is appended, each resource its pages reference is
+    replaced by a reference to an identical resource of an earlier member.
+    pypdf has already copied that one into the writer and reuses the copy,
+    so repeated resources are never cloned into the output at all.
+    """
+
+    RESOURCE_TYPES = ("/Font", "/XObject")
+
+    def __init__(self):
+        self._canonical = {}  # digest -> IndirectObject in the first reader that had it
+
+    def share(self, reader: PdfReader) -> None:
+        """Point the resources of ``reader``'s pages at identical earlier ones."""
+        digests = {}
+        for page in reader.pages:
+            resources = page["/Resources"]
+            for resource_type in self.RESOURCE_TYPES:
+                if resource_type not in resources:
+                    continue
+                entries = resources.raw_get(resource_type)
+                if isinstance(entries, IndirectObject):
+                    # ReportLab shares one font dictionary between pages
+                    resources[NameObject(resource_type)] = self._canonical_ref(entries, digests)
+                    continue
+                for name in list(entries):
+                    ref = entries.raw_get(name)
+                    if isinstance(ref, IndirectObject):
+                        entries[NameObject(name)] = self._canonical_ref(ref, digests)
+
+    def _canonical_ref(self, ref: IndirectObject, digests: dict) -> IndirectObject:
+        return self._canonical.setdefault(_digest(ref, digests), ref)
+
+
+def _digest(obj, digests: dict) -> bytes:
+    """
+    Hash a PDF object by content, following references.
+
+    Streams are hashed as stored (still encoded), so nothing is decoded.
+    ``digests`` memoizes indirect objects of one reader by object number.
+    """
+    if isinstance(obj, IndirectObject):
+        if obj.idnum not in digests:
+            digests[obj.idnum] = b""  # Guards against reference cycles
+            digests[obj.idnum] = _digest(obj.get_object(), digests)
+        return digests[obj.idnum]
+
+    digest = hashlib.sha1(type(obj).__name__.encode())
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj):
+            digest.update(key.encode())
+            digest.update(_digest(obj.raw_get(key), digests))
+        if isinstance(obj, StreamObject):
+            # The base class returns the raw bytes; EncodedStreamObject would decode them
+            digest.update(StreamObject.get_data(obj))
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            digest.update(_digest(item, digests))
+    else:
+        digest.update(repr(obj).encode())
+    return digest.digest()
+
+
+def consolidation_key(invoice) -> tuple:
+    """Return the (company, department, YYYY-MM of start_date) group of an invoice."""
+    return invoice.company, invoice.department, invoice.start_date.strftime("%Y-%m")
+
+
+def consolidated_filename(key: tuple) -> str:
+    """Build the PDF name of a group: YYYY-MM_Department_Company.pdf"""
+    company, department, month = key
+    return f"{month}_{department.replace(' ', '')}_{company.replace(' ', '')}.pdf"
+
+
+def group_invoices(invoices):
+    """
+    Split invoices into runs with the same consolidation_key.
+
+    The input is read lazily and in order, so only one group is held at a
+    time; invoices must be sorted (or grouped) by consolidation_key.
+
+    Yields:
+        tuple: (key, iterator of that run's invoices), consumed before the next
+
+    Raises:
+        ValueError: If a key's invoices are split across non-adjacent runs
+    """
+    seen = set()
+    for key, members in groupby(invoices, key=consolidation_key):
+        if key in seen:
+            company, department, month = key
+            raise ValueError(
+                f"Invoices are not grouped: {company} / {department} / {month} appears again "
+                "after other groups; sort the input by company, department and month"
+            )
+        seen.add(key)
+        yield key, members
+
+
+def _title(company: str, department: str, start: date, end: date) -> str:
+    if (start.year, start.month) == (end.year, end.month):
+        months = start.strftime("%B %Y")
+    else:
+        months = f"{start.strftime('%B %Y')} – {end.strftime('%B %Y')}"
+    return f"{company} · {department} · {months}"
+
+
+def _cover(company: str, department: str, members: list) -> PdfReader:
+    """
+    Render the cover, numbering member pages after it.
+
+    The cover of a large group can itself run over several pages, which
+    shifts every member; it is re-rendered until its page count is stable.
+    """
+    start = min(member.start_date for member in members)
+    end = max(member.end_date for member in members)
+    title = _title(company, department, start, end)
+    period = f"{start.strftime('%d/%m/%Y')} – {end.strftime('%d/%m/%Y')}"
+
+    cover_pages = 1
+    while True:
+        first_page = cover_pages + 1
+        for member in members:
+            member.first_page = first_page
+            first_page += member.pages
+        cover = PdfReader(io.BytesIO(render_cover_pdf(company, title, period, members)))
+        if len(cover.pages) == cover_pages:
+            return cover
+        cover_pages = len(cover.pages)
+
+
+def consolidate(invoices, target, pool=None, chunk_size: int = None) -> list:
+    """
+    Render invoices and merge them, behind a cover page, into one PDF.
+
+    Members are rendered ``chunk_size`` at a time by the batch render pool
+    and appended in order as they finish, so only the merged document
+    (which holds one copy of the shared logo and fonts) and the renders in
+    flight are held in memory.
+
+    Args:
+        invoices: Iterable of Invoice, merged in order; the cover uses the
+            branding of the first one
+        target: Output file path or writable binary file-like object
+        pool: ProcessPoolExecutor (default: app.batch.get_render_pool())
+        chunk_size: Renders in flight (default: Config.BATCH_CHUNK_SIZE)
+
+    Returns:
+        list: ConsolidatedMember per invoice
+
+    Raises:
+        ValueError: If there are no invoices
+    """
+    writer = PdfWriter()
+    shared = SharedResources()
+    members = []
+    company = department = None
+
+    for invoice, pdf in render_batch(invoices, pool, chunk_size):
+        if company is None:
+            company, department = invoice.company, invoice.department
+        reader = PdfReader(io.BytesIO(pdf))
+        members.append(ConsolidatedMember(
+            prepared_by=invoice.prepared_by,
+            employee_id=invoice.employee_id,
+            start_date=invoice.start_date,
+            end_date=invoice.end_date,
+            expenses=len(invoice.expenses),
+            total=invoice.totals.total,
+            pages=len(reader.pages),
+        ))
+        shared.share(reader)
+        writer.append(reader, import_outline=False)
+
+    if not members:
+        raise ValueError("No invoices to consolidate")
+
+    cover = _cover(company, department, members)
+    shared.share(cover)
+    for index, page in enumerate(cover.pages):
+        writer.insert_page(page, index)
+
+    writer.add_outline_item("Summary", 0)
+    for member in members:
+        writer.add_outline_item(f"{member.prepared_by} ({member.employee_id})", member.first_page - 1)
+
+    if isinstance(target, str):
+        with open(target, "wb") as pdf_file:
+            writer.write(pdf_file)
+    else:
+        writer.write(target)
+    return members
+
+
+def consolidate_groups(invoices, output_dir: str, pool=None, chunk_size: int = None) -> list:
+    """
+    Write one consolidated PDF per company, department and month, plus a
+    manifest.json, into a directory.
+
+    Returns:
+        list: Manifest entries (filename, group, total and members)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    for key, members in group_invoices(invoices):
+        filename = consolidated_filename(key)
+        members = consolidate(members, os.path.join(output_dir, filename), pool, chunk_size)
+        company, department, month = key
+        manifest.append({
+            "filename": filename,
+            "company": company,
+            "department": department,
+            "month": month,
+            "total": sum(member.total for member in members) / 100,
+            "members": [member.to_dict() for member in members],
+        })
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
@@ -0,0 +1,301 @@
+"""
+Fast-path expense table for very large invoices.
+Draws rows straight onto the canvas with precomputed column geometry and
+plain greedy text wrapping instead of a platypus Table of Paragraphs,
+while reproducing the same visual design (header background, repeated
+header row, padding, wrapping and row separators).
+"""
+
+from bisect import bisect_right
+from collections import deque
+from decimal import Decimal
+from itertools import accumulate
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Flowable, Paragraph
+from app.aggregation import to_paisa
+
+
+# Characters that the Paragraph mini-markup parser would interpret
+MARKUP_CHARS = ("<", "&")
+
+
+class TableLayout:
+    """Column geometry and row measurement for a template's expense table."""
+
+    def __init__(self, template):
+        cell_style = template.table_cell_style
+        header_style = template.table_header_style
+
+        self.template = template
+        self.col_widths = list(template.EXPENSE_COL_WIDTHS)
+        self.col_positions = [0] + list(accumulate(self.col_widths))
+        self.width = self.col_positions[-1]
+        self.padding = template.EXPENSE_CELL_PADDING
+        self.side_padding = template.EXPENSE_CELL_SIDE_PADDING
+        self.font_name = cell_style.fontName
+        self.header_font_name = header_style.fontName
+        self.font_size = cell_style.fontSize
+        self.leading = cell_style.leading
+        self.text_color = cell_style.textColor
+
+        self.header = [[label] for label in template.EXPENSE_HEADERS]
+        self.header_height = self.leading + 2 * self.padding
+
+    def layout_row(self, item) -> tuple:
+        """
+        Measure one expense row.
+
+        Returns:
+            tuple: (cells, row height) where each cell is a list of lines
+            or a pre-wrapped Paragraph
+        """
+        cells = [
+            self._layout_cell(text, col)
+            for col, text in enumerate(self.template.expense_row_text(item))
+        ]
+        return cells, max(self._cell_height(cell) for cell in cells) + 2 * self.padding
+
+    def _layout_cell(self, text: str, col: int):
+        """
+        Return the cell's wrapped lines, or a Paragraph when plain wrapping
+        cannot reproduce it (markup or a word wider than the column).
+        """
+        max_width = self.col_widths[col] - 2 * self.side_padding
+        font_name, font_size = self.font_name, self.font_size
+
+        if not any(char in text for char in MARKUP_CHARS):
+            if stringWidth(text, font_name, font_size) <= max_width and text == " ".join(text.split()):
+                return [text] if text else []
+
+            words = text.split()
+            word_widths = [stringWidth(word, font_name, font_size) for word in words]
+            if all(width <= max_width for width in word_widths):
+                space_width = stringWidth(" ", font_name, font_size)
+                lines, line, line_width = [], [], 0
+                for word, width in zip(words, word_widths):
+                    if line and line_width + space_width + width > max_width:
+                        lines.append(" ".join(line))
+                        line, line_width = [word], width
+                    else:
+                        line_width = line_width + space_width + width if line else width
+                        line.append(word)
+                if line:
+                    lines.append(" ".join(line))
+                return lines
+
+        paragraph = Paragraph(text, self.template.table_cell_style)
+        paragraph.wrap(max_width, 1e9)
+        return paragraph
+
+    def _cell_height(self, cell) -> float:
+        if isinstance(cell, Paragraph):
+            return cell.height
+        return len(cell) * self.leading
+
+
+class FastExpenseTable(Flowable):
+    """
+    Splittable flowable drawing a range of expense rows plus the header.
+
+    Splitting only slices the shared row list, so a 10k row table never
+    creates per-cell flowables or re-measures rows.
+    """
+
+    def __init__(self, template, expenses=None, _rows=None, _offsets=None, _start=0, _end=None):
+        Flowable.__init__(self)
+        self.hAlign = "CENTER"
+        self._layout = template.table_layout
+        if _rows is None:
+            _rows, heights = [], []
+            for item in expenses:
+                cells, height = self._layout.layout_row(item)
+                _rows.append(cells)
+                heights.append(height)
+            # offsets[i] is the height of rows[:i], so any slice's height is O(1)
+            _offsets = [0] + list(accumulate(heights))
+        self._rows = _rows
+        self._offsets = _offsets
+        self._start = _start
+        self._end = len(_rows) if _end is None else _end
+
+    def _part(self, start: int, end: int) -> "FastExpenseTable":
+        return FastExpenseTable(
+            self._layout.template, _rows=self._rows, _offsets=self._offsets, _start=start, _end=end
+        )
+
+    def wrap(self, availWidth, availHeight):
+        self.width = self._layout.width
+        self.height = self._layout.header_height + self._offsets[self._end] - self._offsets[self._start]
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        limit = availHeight - self._layout.header_height + self._offsets[self._start]
+        end = bisect_right(self._offsets, limit, self._start, self._end + 1) - 1
+        if end <= self._start or end >= self._end:
+            return []  # Not even one row fits (or everything does)
+        return [self._part(self._start, end), self._part(end, self._end)]
+
+    def draw(self):
+        layout = self._layout
+        template = layout.template
+        canv = self.canv
+        padding = layout.padding
+        col_x = [x + layout.side_padding for x in layout.col_positions[:-1]]
+
+        canv.saveState()
+
+        # Header background
+        top = self.height
+        canv.setFillColor(template.header_background)
+        canv.rect(0, top - layout.header_height, layout.width, layout.header_height, stroke=0, fill=1)
+
+        # Cell text: one text object for the whole page part
+        canv.setFillColor(layout.text_color)
+        text = canv.beginText()
+        text.setFont(layout.header_font_name, layout.font_size, layout.leading)
+        self._draw_row(text, layout.header, col_x, top - padding)
+
+        text.setFont(layout.font_name, layout.font_size, layout.leading)
+        row_tops = []
+        paragraphs = []
+        y = top - layout.header_height
+        for index in range(self._start, self._end):
+            row_tops.append(y)
+            cells = self._rows[index]
+            for x, cell in zip(col_x, cells):
+                if isinstance(cell, Paragraph):
+                    paragraphs.append((cell, x, y - padding - cell.height))
+            self._draw_row(text, cells, col_x, y - padding)
+            y -= self._offsets[index + 1] - self._offsets[index]
+        canv.drawText(text)
+
+        for paragraph, x, y_cell in paragraphs:
+            paragraph.drawOn(canv, x, y_cell)
+
+        # Row separators: heavier line under the header, hairlines under rows
+        canv.setStrokeColor(template.border_color)
+        canv.setLineCap(1)
+        canv.setLineJoin(1)
+        canv.setLineWidth(1)
+        canv.line(0, top - layout.header_height, layout.width, top - layout.header_height)
+        canv.setLineWidth(0.5)
+        for row_top in row_tops[1:] + [y]:
+            canv.line(0, row_top, layout.width, row_top)
+
+        canv.restoreState()
+
+    def _draw_row(self, text, cells, col_x, cell_top) -> None:
+        """Write each cell's lines, first baseline one font size below the padding."""
+        layout = self._layout
+        for x, cell in zip(col_x, cells):
+            if isinstance(cell, Paragraph):
+                continue
+            baseline = cell_top - layout.font_size
+            for line in cell:
+                text.setTextOrigin(x, baseline)
+                text.textOut(line)
+                baseline -= layout.leading
+
+
+class RunningTotal:
+    """Exact sum, in integer paisa, of the expense amounts seen so far by a streaming table."""
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, amount) -> None:
+        self.total += to_paisa(amount)
+        self.count += 1
+
+    @property
+    def total_decimal(self) -> Decimal:
+        return Decimal(self.total) / 100
+
+
+class StreamingExpenseTable(Flowable):
+    """
+    Expense table that pulls rows from an iterator one page at a time.
+
+    Only the rows needed to fill the current frame are read and measured;
+    each page part is emitted as a FastExpenseTable and the rows are then
+    released, so memory does not grow with the number of expenses. Amounts
+    are accumulated into ``totals`` as rows are consumed.
+    """
+
+    def __init__(self, template, expenses, totals: RunningTotal):
+        Flowable.__init__(self)
+        self.hAlign = "CENTER"
+        self._layout = template.table_layout
+        self._expenses = iter(expenses)
+        self._pending = deque()  # (cells, height) read but not yet placed
+        self._pending_height = 0
+        self._exhausted = False
+        self.totals = totals
+
+    def _fill(self, availHeight) -> None:
+        """Read rows until they overflow availHeight or the iterator ends."""
+        limit = availHeight - self._layout.header_height
+        while not self._exhausted and self._pending_height <= limit:
+            item = next(self._expenses, None)
+            if item is None:
+                self._exhausted = True
+                break
+            cells, height = self._layout.layout_row(item)
+            self.totals.add(item.amount)
+            self._pending.append((cells, height))
+            self._pending_height += height
+
+    def _take(self, max_height: float) -> FastExpenseTable:
+        """Remove the leading pending rows that fit in max_height."""
+        rows, offsets = [], [0]
+        while self._pending and offsets[-1] + self._pending[0][1] <= max_height:
+            cells, height = self._pending.popleft()
+            self._pending_height -= height
+            rows.append(cells)
+            offsets.append(offsets[-1] + height)
+        return FastExpenseTable(self._layout.template, _rows=rows, _offsets=offsets)
+
+    def wrap(self, availWidth, availHeight):
+        self._fill(availHeight)
+        self.width = self._layout.width
+        self.height = self._layout.header_height + self._pending_height
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        self._fill(availHeight)
+        max_height = availHeight - self._layout.header_height
+        if not self._pending or self._pending[0][1] > max_height:
+            return []  # Not even one row fits on this page
+        part = self._take(max_height)
+        if self._exhausted and not self._pending:
+            return [part]
+        # The remainder goes back to platypus as a new flowable; drop the
+        # flag it sets on flowables already moved to a new page once
+        self.__dict__.pop("_postponed", None)
+        return [part, self]
+
+    def draw(self):
+        # Everything left fits in the frame: draw it as a final page part
+        part = self._take(float("inf"))
+        part.canv = self.canv
+        part.wrap(self.width, self.height)
+        part.draw()
+
+
+class DeferredParagraph(Flowable):
+    """Paragraph whose text is produced at layout time (e.g. a running total)."""
+
+    def __init__(self, text_func, style):
+        Flowable.__init__(self)
+        self._text_func = text_func
+        self._style = style
+        self._paragraph = None
+
+    def wrap(self, availWidth, availHeight):
+        self._paragraph = Paragraph(self._text_func(), self._style)
+        return self._paragraph.wrap(availWidth, availHeight)
+
+    def draw(self):
+        self._paragraph.canv = self.canv
+        self._paragraph.draw()
@@ -4,10 +4,14 @@ Handles user input validation and dynamic expense entry management.
 """
 
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import (
     StringField, DecimalField, FieldList, FormField, SelectField, DateField, Form
 )
 from wtforms.validators import DataRequired, NumberRange
+from app.models import EXPENSE_CATEGORIES
+from app.profiles import PROFILE_CHOICES
+from config import Config
 
 
 class ExpenseForm(Form):
@@ -16,32 +20,7 @@ class ExpenseForm(Form):
     date = DateField("Date", validators=[DataRequired()])
     category = SelectField(
         "Category",
-        choices = [
-            ("Ama Tea Coffee", "Ama Tea Coffee"),
-            ("Courier Service", "Courier Service"),
-            ("Electricity bill", "Electricity bill"),
-            ("Electronic item", "Electronic item"),
-            ("Expense from employee", "Expense from employee"),
-            ("Internet Bill", "Internet Bill"),
-            ("Mobile Recharge", "Mobile Recharge"),
-            ("Office Equipment", "Office Equipment"),
-            ("Office Event", "Office Event"),
-            ("Office Tour", "Office Tour"),
-            ("Others", "Others"),
-            ("Others bill", "Others bill"),
-            ("PiHR", "PiHR"),
-            ("Rent", "Rent"),
-            ("Servicing", "Servicing"),
-            ("Snacks", "Snacks"),
-            ("Sports", "Sports"),
-            ("Stationary", "Stationary"),
-            ("Tax (TDS/VDS)", "Tax (TDS/VDS)"),
-            ("Trade License", "Trade License"),
-            ("Transportation", "Transportation"),
-            ("Travel", "Travel"),
-        ]
-
-,
+        choices=[(category, category) for category in EXPENSE_CATEGORIES],
         validators=[DataRequired()],
     )
     description = StringField("Description", validators=[DataRequired()])
@@ -50,14 +29,18 @@ class ExpenseForm(Form):
         "Amount", 
         validators=[
             DataRequired(),
-            NumberRange(min=0.01, message="Amount must be greater than 0")
+            NumberRange(min=0.01, message="Amount must be greater than 0"),
+            NumberRange(
+                max=Config.MAX_EXPENSE_AMOUNT,
+                message=f"Amount must be at most {Config.MAX_EXPENSE_AMOUNT:,.2f}",
+            ),
         ],
         places=2
     )
 
 
-class InvoiceForm(FlaskForm):
-    """Main invoice form with company details and expense entries."""
+class InvoiceHeaderForm(FlaskForm):
+    """Company details and invoice period shared by the invoice forms."""
     
     company = SelectField(
         "Company",
@@ -79,9 +62,27 @@ class InvoiceForm(FlaskForm):
     )
     start_date = DateField("Start Date", validators=[DataRequired()])
     end_date = DateField("End Date", validators=[DataRequired()])
+    profile = SelectField("Output", choices=PROFILE_CHOICES, default=Config.PDF_PROFILE)
+
+
+class InvoiceForm(InvoiceHeaderForm):
+    """Main invoice form with company details and expense entries."""
+
     expenses = FieldList(FormField(ExpenseForm), min_entries=1)
 
 
+class ExpenseImportForm(InvoiceHeaderForm):
+    """Invoice details with the expenses uploaded as a CSV or XLSX file."""
+
+    expenses_file = FileField(
+        "Expenses File",
+        validators=[
+            FileRequired(message="Choose a CSV or XLSX file to import."),
+            FileAllowed(["csv", "xlsx"], "Upload a .csv or .xlsx file"),
+        ],
+    )
+
+
 
 
 
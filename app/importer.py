@@ -0,0 +1,164 @@
+"""
+Bulk expense import from CSV and XLSX uploads.
+Rows are read one at a time and checked with ExpenseForm's rules (see
+app.validation) plus the invoice period, without building a WTForms form
+per row. Valid rows go straight into an ExpenseTable for PDF generation;
+invalid rows are reported by line number.
+"""
+
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import date
+from config import Config
+from app.models import EXPENSE_FIELDS, ExpenseTable
+from app.validation import ExpenseRowValidator
+
+
+REQUIRED_COLUMNS = ("date", "category", "description", "amount")
+
+
+@dataclass
+class RowError:
+    """A validation error for one field of an imported row."""
+
+    line: int  # Spreadsheet row number; the header is line 1
+    field: str
+    message: str
+
+    def to_dict(self) -> dict:
+        return {"line": self.line, "field": self.field, "message": self.message}
+
+
+@dataclass
+class ImportResult:
+    """
+    Outcome of an import.
+
+    Attributes:
+        expenses: ExpenseTable of the rows (only filled while no row has failed)
+        errors: The first Config.IMPORT_MAX_ERRORS errors, in file order
+        error_count: Total number of errors, including unrecorded ones
+        rows: Number of non-blank rows read
+    """
+
+    expenses: ExpenseTable = field(default_factory=ExpenseTable)
+    errors: list = field(default_factory=list)
+    error_count: int = 0
+    rows: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error_count == 0 and self.rows > 0
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _header(names) -> list:
+    header = [_text(name).lower() for name in names]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return header
+
+
+def read_csv_rows(fp):
+    """
+    Yield (line, row dict) for each row of a CSV file with a header row.
+
+    Column names are case-insensitive; extra columns are ignored.
+
+    Raises:
+        ValueError: If a required column is missing or the file is not
+            valid UTF-8 CSV
+    """
+    reader = csv.reader(fp)
+    try:
+        header = _header(next(reader, ()))
+        for line, values in enumerate(reader, start=2):
+            yield line, dict(zip(header, values))
+    except csv.Error as e:
+        raise ValueError(f"CSV line {reader.line_num}: {e}") from None
+
+
+def read_xlsx_rows(fp):
+    """
+    Yield (line, row dict) for each row of the first sheet of an XLSX file.
+
+    The workbook is opened read-only, so rows are streamed from the file
+    rather than loaded into memory. Requires openpyxl.
+
+    Raises:
+        ValueError: If openpyxl is not installed, the file is not a valid
+            workbook or a required column is missing
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("XLSX import requires openpyxl (pip install openpyxl)") from None
+
+    try:
+        workbook = load_workbook(fp, read_only=True, data_only=True)
+    except Exception as e:  # openpyxl raises zipfile/XML errors for bad files
+        raise ValueError(f"Not a valid XLSX file: {e}") from None
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _header(next(rows, ()))
+        for line, values in enumerate(rows, start=2):
+            yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_upload_rows(stream, filename: str):
+    """
+    Yield (line, row dict) from an uploaded file, chosen by its extension.
+
+    Args:
+        stream: Binary file object of the upload
+        filename: Uploaded file name (.csv or .xlsx)
+    """
+    if filename.lower().endswith(".xlsx"):
+        return read_xlsx_rows(stream)
+    if filename.lower().endswith(".csv"):
+        return read_csv_rows(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    raise ValueError("Upload a .csv or .xlsx file")
+
+
+def import_expenses(rows, start_date: date, end_date: date, max_errors: int = None) -> ImportResult:
+    """
+    Validate rows and collect the valid ones into an ExpenseTable.
+
+    Blank rows are skipped. Every row is validated even after errors, so
+    the report covers the whole file, but only the first ``max_errors``
+    errors are kept.
+
+    Args:
+        rows: Iterable of (line, row dict), e.g. from read_upload_rows
+        start_date, end_date: Invoice period the expense dates must fall in
+        max_errors: Errors to record (default: Config.IMPORT_MAX_ERRORS)
+
+    Raises:
+        ValueError: If the file cannot be read
+    """
+    if max_errors is None:
+        max_errors = Config.IMPORT_MAX_ERRORS
+    validator = ExpenseRowValidator(start_date, end_date)
+    result = ImportResult()
+
+    for line, row in rows:
+        if all(not _text(row.get(name)) for name in EXPENSE_FIELDS):
+            continue
+        result.rows += 1
+        item, errors = validator.validate(row)
+        if item is not None:
+            if not result.error_count:  # The file is rejected once a row fails
+                result.expenses.append(item)
+            continue
+        result.error_count += len(errors)
+        for field_name, message in errors[:max(0, max_errors - len(result.errors))]:
+            result.errors.append(RowError(line, field_name, message))
+
+    return result
@@ -0,0 +1,437 @@
+"""
+Asynchronous render queue for invoice PDFs.
+The form POST enqueues a job and redirects immediately; a pool of render
+workers claims jobs from a SQLite-backed queue shared by all gunicorn
+workers and renders them in separate processes. Batch uploads to /batch
+are queued the same way and rendered into a ZIP.
+
+Run a dedicated render worker (when RENDER_QUEUE_INPROCESS is off):
+    python -m app.jobs --concurrency 4
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from config import Config
+from app.archive import archive_invoice
+from app.metrics import registry
+from app.models import Invoice
+from app.render_cache import get_render_cache
+from app.utils import process_pool
+
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Job kinds: one invoice to a PDF, or a batch upload to a ZIP (app.batch)
+INVOICE = "invoice"
+BATCH = "batch"
+
+# Identifies this host's workers as job owners
+HOST = socket.gethostname()
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at RENDER_QUEUE_MAX_DEPTH (backpressure)."""
+
+
+class JobQueue:
+    """SQLite-backed render job queue, safe to share between processes."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+    """
+    # Columns added after the first release: name -> definition
+    COLUMNS = {
+        "kind": f"TEXT NOT NULL DEFAULT '{INVOICE}'",
+        "owner_host": "TEXT",
+        "owner_pid": "INTEGER",
+        "heartbeat_at": "REAL",
+    }
+
+    def __init__(self, path: str, max_depth: int):
+        self.path = path
+        self.max_depth = max_depth
+        self._local = threading.local()
+        # Wakes in-process workers as soon as a job is enqueued
+        self.new_job = threading.Event()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in self.COLUMNS.items():
+            if name not in existing:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+                except sqlite3.OperationalError:
+                    pass  # Added by another process meanwhile
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are per-thread)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def enqueue(self, invoice, filename: str) -> str:
+        """
+        Add a render job for the invoice.
+
+        Returns:
+            str: Job ID
+
+        Raises:
+            QueueFullError: If queued + running jobs reach max_depth
+        """
+        return self._enqueue(INVOICE, filename, json.dumps(invoice.to_dict()))
+
+    def enqueue_batch(self, data: str, fmt: str, profile: str, filename: str) -> str:
+        """
+        Add a job rendering a batch upload (see app.batch.load_invoices) to a ZIP.
+
+        Returns:
+            str: Job ID
+
+        Raises:
+            QueueFullError: If queued + running jobs reach max_depth
+        """
+        return self._enqueue(BATCH, filename, json.dumps({"format": fmt, "profile": profile, "data": data}))
+
+    def _enqueue(self, kind: str, filename: str, payload: str) -> str:
+        job_id = uuid.uuid4().hex
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Identical invoice already pending: share its job
+            pending = conn.execute(
+                "SELECT id FROM jobs WHERE filename = ? AND status IN (?, ?)", (filename, QUEUED, RUNNING)
+            ).fetchone()
+            if pending is not None:
+                conn.execute("COMMIT")
+                return pending["id"]
+            (depth,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()
+            if depth >= self.max_depth:
+                raise QueueFullError(f"Render queue is full ({depth} jobs)")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, filename, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, filename, payload, time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.new_job.set()
+        return job_id
+
+    def claim(self):
+        """
+        Atomically take the oldest queued job.
+
+        The job is owned by this process (host and pid) until it finishes;
+        the owner keeps its heartbeat fresh with heartbeat().
+
+        Returns:
+            sqlite3.Row | None: The claimed job, or None if the queue is empty
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if job is not None:
+                now = time.time()
+                conn.execute(
+                    """
+                    UPDATE jobs SET status = ?, started_at = ?, owner_host = ?, owner_pid = ?, heartbeat_at = ?
+                    WHERE id = ?
+                    """,
+                    (RUNNING, now, HOST, os.getpid(), now, job["id"]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return job
+
+    def heartbeat(self) -> None:
+        """Mark the running jobs owned by this process as still in progress."""
+        self._connection().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner_host = ? AND owner_pid = ?",
+            (time.time(), RUNNING, HOST, os.getpid()),
+        )
+
+    def complete(self, job_id: str) -> None:
+        """Mark a job done, dropping its payload (a batch upload can be megabytes)."""
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, payload = '', finished_at = ? WHERE id = ?", (DONE, time.time(), job_id)
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        """Mark a job failed with an error message, dropping its payload."""
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, payload = '', error = ?, finished_at = ? WHERE id = ?",
+            (FAILED, error, time.time(), job_id),
+        )
+
+    def get(self, job_id: str):
+        """Return the job status as a dict, or None for an unknown ID."""
+        job = self._connection().execute(
+            "SELECT id, kind, status, filename, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return dict(job) if job is not None else None
+
+    def purge(self, max_age_seconds: int, job_timeout: int) -> None:
+        """
+        Drop finished jobs older than max_age and requeue jobs whose worker died.
+
+        A running job is requeued when its owner process on this host has
+        exited, or when no heartbeat arrived for job_timeout seconds (an
+        owner on another host, or one that hung). Slow renders of a live
+        worker keep their heartbeat fresh and are left alone.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, now - max_age_seconds),
+        )
+        requeue = """
+            UPDATE jobs SET status = ?, started_at = NULL, owner_host = NULL, owner_pid = NULL, heartbeat_at = NULL
+            WHERE status = ? AND {}
+        """
+        # Jobs claimed before heartbeats were recorded fall back to started_at
+        conn.execute(
+            requeue.format("COALESCE(heartbeat_at, started_at) < ?"), (QUEUED, RUNNING, now - job_timeout)
+        )
+        owners = conn.execute(
+            "SELECT DISTINCT owner_pid FROM jobs WHERE status = ? AND owner_host = ?", (RUNNING, HOST)
+        ).fetchall()
+        for (pid,) in owners:
+            if not _pid_alive(pid):
+                conn.execute(
+                    requeue.format("owner_host = ? AND owner_pid = ?"), (QUEUED, RUNNING, HOST, pid)
+                )
+
+    def stats(self) -> dict:
+        """
+        Queue depth and latency across all processes sharing the queue.
+
+        Latencies are averaged over finished jobs still in the table
+        (i.e. roughly the last CLEANUP_MAX_AGE seconds).
+        """
+        conn = self._connection()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        latency = conn.execute(
+            """
+            SELECT AVG(started_at - created_at), MAX(started_at - created_at),
+                   AVG(finished_at - started_at), MAX(finished_at - started_at)
+            FROM jobs WHERE status = ?
+            """,
+            (DONE,),
+        ).fetchone()
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "wait_seconds_avg": latency[0] or 0.0,
+            "wait_seconds_max": latency[1] or 0.0,
+            "render_seconds_avg": latency[2] or 0.0,
+            "render_seconds_max": latency[3] or 0.0,
+        }
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this ID is running on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+
+def _render_batch(store, job, pool) -> None:
+    """Render a batch job's upload into a ZIP in the store, its invoices on the worker pool."""
+    from app.batch import build_batch_zip, load_invoices
+
+    batch = json.loads(job["payload"])
+    invoices = load_invoices(io.StringIO(batch["data"], newline=""), batch["format"], batch["profile"])
+    with build_batch_zip(invoices, pool) as archive:
+        store.put(job["filename"], archive)
+
+
+def _render(payload: str) -> bytes:
+    """Process pool entry point: render a JSON invoice payload to PDF bytes."""
+    from app.pdf_generator import render_invoice_pdf
+    pdf = render_invoice_pdf(Invoice.from_dict(json.loads(payload)))
+    registry.flush()
+    return pdf
+
+
+class RenderWorkerPool:
+    """
+    Threads that claim queued jobs and render them in worker processes.
+
+    ``concurrency`` bounds both the number of jobs in progress and the
+    number of render processes, so web request threads are never blocked
+    by ReportLab.
+    """
+
+    def __init__(self, queue: JobQueue, store, concurrency: int, poll_interval: float = 0.5,
+                 heartbeat_interval: float = None):
+        self.queue = queue
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval or Config.RENDER_QUEUE_HEARTBEAT_INTERVAL
+        self.pid = os.getpid()
+        self._executor = process_pool(concurrency)
+        self._stop_event = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._work_loop, name=f"render-worker-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="render-heartbeat", daemon=True)
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+        self._heartbeat_thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop_event.set()
+        self.queue.new_job.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            self._heartbeat_thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def is_alive(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop_event.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat()
+            except sqlite3.Error:
+                logger.warning("Render job heartbeat failed", exc_info=True)
+
+    def _work_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                # Wake early for jobs enqueued by this process; poll for others
+                self.queue.new_job.wait(self.poll_interval)
+                self.queue.new_job.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job) -> None:
+        try:
+            if job["kind"] == BATCH:
+                _render_batch(self.store, job, self._executor)
+            else:
+                self._render_invoice(job)
+        except Exception as e:
+            logger.exception("Render job %s failed", job["id"])
+            self.queue.fail(job["id"], str(e) or e.__class__.__name__)
+        else:
+            self.queue.complete(job["id"])
+        registry.flush()
+
+    def _render_invoice(self, job) -> None:
+        pdf = self._executor.submit(_render, job["payload"]).result()
+        self.store.put(job["filename"], pdf)
+        get_render_cache().remember(job["filename"], len(pdf))
+        archive_invoice(Invoice.from_dict(json.loads(job["payload"])), pdf, job["filename"][:-len(".pdf")])
+
+
+_queue = None
+_workers = None
+_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue."""
+    global _queue
+    with _lock:
+        if _queue is None:
+            _queue = JobQueue(Config.RENDER_QUEUE_DB, Config.RENDER_QUEUE_MAX_DEPTH)
+        return _queue
+
+
+def start_render_workers(concurrency: int = None) -> RenderWorkerPool:
+    """
+    Start the render worker pool for this process if it is not running.
+
+    Like the cleanup scheduler this is fork-aware: a pool inherited from
+    the gunicorn master is replaced by a fresh one in each worker.
+    """
+    global _workers
+    from app.storage import get_invoice_store
+
+    queue = get_job_queue()
+    with _lock:
+        if _workers is None or _workers.pid != os.getpid() or not _workers.is_alive():
+            _workers = RenderWorkerPool(
+                queue,
+                get_invoice_store(),
+                concurrency or Config.RENDER_QUEUE_CONCURRENCY,
+            )
+            _workers.start()
+        return _workers
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.jobs", description="Run a dedicated render worker.")
+    parser.add_argument("--concurrency", type=int, default=Config.RENDER_QUEUE_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    workers = start_render_workers(args.concurrency)
+    print(f"Render worker running with concurrency {args.concurrency} on {Config.RENDER_QUEUE_DB}")
+    try:
+        while True:
+            time.sleep(60)
+            get_job_queue().purge(Config.CLEANUP_MAX_AGE, Config.RENDER_QUEUE_JOB_TIMEOUT)
+    except KeyboardInterrupt:
+        workers.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
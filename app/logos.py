@@ -0,0 +1,82 @@
+"""
+Process-wide registry of company watermark logos.
+Each logo is decoded once, with the watermark opacity already applied to
+its alpha channel, and the resulting ImageReader is shared by every page
+of every invoice rendered by the process.
+"""
+
+import os
+import threading
+from typing import Optional
+from PIL import Image as PILImage
+from reportlab.lib.utils import ImageReader
+from config import Config
+
+
+LOGO_DIR = os.path.join(Config.BASE_DIR, "static", "assets", "logos")
+WATERMARK_OPACITY = 0.1  # Logo watermark at 10% opacity
+
+_logos = {}
+_lock = threading.Lock()
+
+
+def logo_path(company: str) -> str:
+    """Return the expected logo file path for a company."""
+    return os.path.join(LOGO_DIR, f"{company}.png")
+
+
+def _decode_watermark(path: str, max_width: int = None) -> ImageReader:
+    """
+    Decode a logo and scale its alpha channel to the watermark opacity.
+
+    Logos wider than ``max_width`` pixels are downsampled first.
+    """
+    with PILImage.open(path) as image:
+        image = image.convert("RGBA")
+    if max_width and image.width > max_width:
+        height = max(1, round(image.height * max_width / image.width))
+        image = image.resize((max_width, height), PILImage.LANCZOS)
+    alpha = image.getchannel("A").point(lambda a: round(a * WATERMARK_OPACITY))
+    image.putalpha(alpha)
+
+    reader = ImageReader(image)
+    # Decode pixel and soft-mask data now so pages never touch the PNG again
+    reader.getRGBData()
+    if reader._dataA is not None:
+        reader._dataA.getRGBData()
+    return reader
+
+
+def get_watermark_logo(company: str, max_width: int = None) -> Optional[ImageReader]:
+    """
+    Return the decoded watermark logo for a company.
+
+    The logo file is only stat'ed and decoded on first use; later calls,
+    including those for companies without a logo, are dictionary lookups.
+
+    Args:
+        company: Company name (the logo file is <company>.png)
+        max_width: Downsample the logo to at most this many pixels wide
+            (e.g. for the compact output profile); each size is decoded
+            once
+
+    Returns:
+        ImageReader | None: Shared watermark image, or None if no logo exists
+    """
+    key = (company, max_width)
+    try:
+        return _logos[key]
+    except KeyError:
+        pass
+
+    with _lock:
+        if key not in _logos:
+            path = logo_path(company)
+            _logos[key] = _decode_watermark(path, max_width) if os.path.exists(path) else None
+        return _logos[key]
+
+
+def clear_logo_cache() -> None:
+    """Forget decoded logos (e.g. after replacing files in LOGO_DIR)."""
+    with _lock:
+        _logos.clear()
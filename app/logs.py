@@ -0,0 +1,114 @@
+"""
+Logging setup for the application.
+Records are put on an in-memory queue by the calling thread and written to
+stderr by a QueueListener thread, so request handlers never block on the
+stream shared with gunicorn's access and error logs.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from config import Config
+
+
+LOGGER_NAME = "app"
+FORM_LOGGER_NAME = "app.form"  # Verbose form dumps, sampled by LOG_FORM_SAMPLE_RATE
+
+# Form fields whose values are personal data or secrets and never logged
+REDACTED_FORM_FIELDS = ("prepared_by", "employee_id", "description", "note", "csrf_token")
+
+
+class SampleFilter(logging.Filter):
+    """Let roughly ``rate`` of the records through (1.0 = all, 0 = none)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record) -> bool:
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class FormDump:
+    """
+    Redacted view of submitted form data for log messages.
+
+    Only formatted if the record is actually emitted, so dropped (sampled
+    out or below level) dumps cost nothing.
+    """
+
+    def __init__(self, form_data):
+        self.form_data = form_data
+
+    def __str__(self) -> str:
+        return str({
+            key: "***" if key.rsplit("-", 1)[-1] in REDACTED_FORM_FIELDS else value
+            for key, value in self.form_data.items()
+        })
+
+
+class _ProcessQueueHandler(QueueHandler):
+    """QueueHandler that starts a new listener when used in a forked child."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.pid = os.getpid()
+
+    def emit(self, record) -> None:
+        if self.pid != os.getpid():
+            # Inherited through fork (gunicorn worker, render process): the
+            # parent's listener thread does not exist here
+            configure_logging()
+            _handler.emit(record)
+            return
+        super().emit(record)
+
+
+_listener = None
+_handler = None
+_exit_hook_registered = False
+_lock = threading.Lock()
+
+
+def configure_logging() -> None:
+    """
+    Route the ``app`` loggers through a queue to a background listener.
+
+    Idempotent per process; after fork it builds a fresh queue and
+    listener for the child.
+    """
+    global _listener, _handler, _exit_hook_registered
+    with _lock:
+        if _handler is not None and _handler.pid == os.getpid():
+            return
+
+        log_queue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(logging.Formatter(Config.LOG_FORMAT))
+        _listener = QueueListener(log_queue, stream_handler)
+        _listener.start()
+        _handler = _ProcessQueueHandler(log_queue)
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(Config.LOG_LEVEL)
+        logger.handlers[:] = [_handler]
+        logger.propagate = False
+        logging.getLogger(FORM_LOGGER_NAME).filters[:] = [SampleFilter(Config.LOG_FORM_SAMPLE_RATE)]
+
+        if not _exit_hook_registered:
+            atexit.register(stop_logging)
+            _exit_hook_registered = True
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop this process's listener."""
+    global _listener
+    with _lock:
+        if _listener is not None and _handler.pid == os.getpid():
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,386 @@
+"""
+Prometheus-style metrics aggregated across gunicorn workers.
+Each process keeps its counters, gauges and histograms in memory and writes
+them to its own file in METRICS_DIR every METRICS_FLUSH_INTERVAL seconds
+(from the cleanup thread); /metrics merges the files of every process, so
+a scrape sees server-wide totals whichever worker answers it.
+
+Also provides opt-in cProfile capture of the slowest renders
+(PROFILE_SLOWEST_RENDERS).
+"""
+
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+# Histogram buckets in seconds, from fast form validation to huge reports
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name -> (type, help)
+METRICS = {
+    "invoice_stage_seconds": (
+        "histogram",
+        "Time spent per stage: form_validation, expense_import, story_build, layout, "
+        "page_emission, watermark, store_write, send_file, archive_write, archive_query, "
+        "pagination, parallel_render, stitch",
+    ),
+    "invoice_renders_total": ("counter", "Invoice PDFs rendered"),
+    "invoice_api_requests_total": ("counter", "JSON API invoice requests by result (rendered/cached/queued/HTTP status)"),
+    "invoice_render_pages_total": ("counter", "PDF pages emitted by renders"),
+    "invoice_parallel_renders_total": ("counter", "Invoices rendered as page ranges in parallel processes"),
+    "invoice_render_cache_requests_total": ("counter", "Render cache lookups by result (hit/miss)"),
+    "invoice_render_cache_evictions_total": ("counter", "PDFs evicted from the render cache"),
+    "invoice_render_cache_entries": ("gauge", "PDFs tracked by the render cache (largest worker)"),
+    "invoice_render_cache_bytes": ("gauge", "Bytes tracked by the render cache (largest worker)"),
+    "invoice_cleanup_sweeps_total": ("counter", "Background cleanup sweeps"),
+    "invoice_cleanup_errors_total": ("counter", "Background cleanup sweeps that failed"),
+    "invoice_cleanup_files_reclaimed_total": ("counter", "Expired PDFs removed"),
+    "invoice_cleanup_bytes_reclaimed_total": ("counter", "Bytes of expired PDFs removed"),
+    "invoice_cleanup_sweep_seconds": ("histogram", "Duration of background cleanup sweeps"),
+    "invoice_cleanup_last_sweep_timestamp_seconds": ("gauge", "Unix time of the latest cleanup sweep"),
+    "invoice_sessions_expired_total": ("counter", "Expired server-side sessions removed"),
+    "invoice_archive_writes_total": ("counter", "Invoices recorded in the archive by result (ok/error)"),
+    "invoice_archive_purged_total": ("counter", "Archived invoices removed by the retention policy"),
+    "invoice_archive_bytes_reclaimed_total": ("counter", "Bytes of archived PDFs removed by the retention policy"),
+    "invoice_render_queue_jobs": ("gauge", "Render queue jobs by status"),
+    "invoice_render_queue_wait_seconds_avg": ("gauge", "Average queue wait of recently finished jobs"),
+    "invoice_render_queue_render_seconds_avg": ("gauge", "Average render time of recently finished jobs"),
+    "invoice_warmup_seconds": ("gauge", "Start-up warm-up time by phase (imports, fonts, templates, render, pages, total)"),
+    "invoice_first_request_seconds": ("gauge", "Duration of a worker's first request (slowest live worker)"),
+}
+
+
+# Counters and histograms of exited processes, folded into one file
+RETIRED_FILE = "retired.json"
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """
+    In-memory metrics for one process, persisted to ``<directory>/<pid>.json``.
+
+    Counters and histograms from all files are summed when collected (so
+    totals survive worker restarts); gauges take the maximum over live
+    processes. Files of exited processes are folded into ``retired.json``
+    at collection, so the directory does not grow with every restart. The
+    registry resets itself after fork so a worker never re-reports samples
+    recorded by the gunicorn master.
+    """
+
+    def __init__(self, directory: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.directory = directory
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.pid = os.getpid()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}  # key -> per-bucket counts (+Inf last), then the sum
+        self._dirty = False
+
+    def _current(self) -> None:
+        """Drop samples inherited from the parent process (call with the lock held)."""
+        if self.pid != os.getpid():
+            self._reset()
+
+    def reset(self) -> None:
+        """Forget the samples recorded so far by this process."""
+        with self._lock:
+            self._reset()
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._current()
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._current()
+            self._gauges[_key(name, labels)] = value
+            self._dirty = True
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            self._current()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+            self._dirty = True
+
+    def flush(self) -> None:
+        """Write this process's samples to its metrics file if they changed."""
+        with self._lock:
+            self._current()
+            if not self._dirty:
+                return
+            data = {
+                "pid": self.pid,
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+                "histograms": [[name, dict(labels), list(values)] for (name, labels), values in self._histograms.items()],
+            }
+            self._dirty = False
+
+        self._write(f"{data['pid']}.json", data)
+
+    def collect(self) -> tuple:
+        """
+        Merge the metrics files of every process.
+
+        Returns:
+            tuple: (counters, gauges, histograms) dicts keyed by (name, labels)
+        """
+        self.flush()
+        self._retire_exited()
+        counters, gauges, histograms = {}, {}, {}
+        for name in self._files():
+            data = self._load(name)
+            if data is None:
+                continue  # Being replaced or removed concurrently
+            for metric, labels, value in data["counters"]:
+                key = _key(metric, labels)
+                counters[key] = counters.get(key, 0) + value
+            if data["pid"] is not None and _pid_alive(data["pid"]):
+                for metric, labels, value in data["gauges"]:
+                    key = _key(metric, labels)
+                    gauges[key] = max(gauges.get(key, value), value)
+            for metric, labels, values in data["histograms"]:
+                key = _key(metric, labels)
+                merged = histograms.get(key)
+                histograms[key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+        return counters, gauges, histograms
+
+    def _files(self) -> list:
+        try:
+            return [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def _load(self, name: str):
+        """Return a metrics file's data, or None if it is missing or being replaced."""
+        try:
+            with open(os.path.join(self.directory, name), encoding="utf-8") as metrics_file:
+                return json.load(metrics_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, name: str, data: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+            json.dump(data, metrics_file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def _retire_exited(self) -> None:
+        """Fold the files of exited processes into RETIRED_FILE and delete them."""
+        exited = [
+            name for name in self._files()
+            if name[:-len(".json")].isdigit() and not _pid_alive(int(name[:-len(".json")]))
+        ]
+        if not exited:
+            return
+
+        with _directory_lock(self.directory):
+            retired = self._load(RETIRED_FILE) or {"pid": None, "counters": [], "gauges": [], "histograms": []}
+            counters = {_key(metric, labels): value for metric, labels, value in retired["counters"]}
+            histograms = {_key(metric, labels): values for metric, labels, values in retired["histograms"]}
+            folded = []
+            for name in exited:
+                data = self._load(name)
+                if data is None:
+                    continue  # Retired by another process meanwhile
+                for metric, labels, value in data["counters"]:
+                    key = _key(metric, labels)
+                    counters[key] = counters.get(key, 0) + value
+                for metric, labels, values in data["histograms"]:
+                    key = _key(metric, labels)
+                    merged = histograms.get(key)
+                    histograms[key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+                folded.append(name)
+            if not folded:
+                return
+            # Write the totals before deleting, so a crash can only leave a file to fold again
+            self._write(RETIRED_FILE, {
+                "pid": None,
+                "counters": [[metric, dict(labels), value] for (metric, labels), value in counters.items()],
+                "gauges": [],
+                "histograms": [[metric, dict(labels), values] for (metric, labels), values in histograms.items()],
+            })
+            for name in folded:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def exposition(self, extra_gauges=()) -> str:
+        """
+        Render all processes' metrics in the Prometheus text format.
+
+        Args:
+            extra_gauges: Iterable of (name, labels, value) computed at scrape
+                time from shared state (e.g. the render queue database)
+        """
+        counters, gauges, histograms = self.collect()
+        for name, labels, value in extra_gauges:
+            gauges[_key(name, labels)] = value
+
+        samples = {}
+        for (name, labels), value in sorted({**counters, **gauges}.items()):
+            samples.setdefault(name, []).append(_sample(name, labels, value))
+        for (name, labels), values in sorted(histograms.items()):
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                lines.append(_sample(f"{name}_bucket", labels + (("le", str(bound)),), cumulative))
+            lines.append(_sample(f"{name}_sum", labels, values[-1]))
+            lines.append(_sample(f"{name}_count", labels, cumulative))
+
+        output = []
+        for name in sorted(samples):
+            kind, help_text = METRICS.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(samples[name])
+        return "\n".join(output) + "\n"
+
+
+def _sample(name: str, labels: tuple, value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{key}="{label_value}"' for key, label_value in labels)
+        name = f"{name}{{{rendered}}}"
+    return f"{name} {value}"
+
+
+@contextmanager
+def _directory_lock(directory: str):
+    """Serialize folding of exited processes' files across gunicorn workers."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = MetricsRegistry(Config.METRICS_DIR)
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of the enclosed block as an invoice stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe("invoice_stage_seconds", time.perf_counter() - started, stage=stage)
+
+
+def clear_metrics_dir() -> None:
+    """Remove metrics files from a previous server run (gunicorn on_starting)."""
+    try:
+        names = os.listdir(Config.METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        try:
+            os.remove(os.path.join(Config.METRICS_DIR, name))
+        except OSError:
+            pass
+
+
+class SlowestRenderProfiler:
+    """
+    Keep cProfile dumps of the ``keep`` slowest renders in ``directory``.
+
+    Dumps are named ``<milliseconds>-<pid>-<label>.prof`` with a zero-padded
+    duration, so the slowest sort last; after every dump the directory is
+    pruned to ``keep`` files, which works across worker processes. Inspect
+    them with ``python -m pstats <file>`` or snakeviz.
+
+    Only one render per process is profiled at a time: cProfile cannot
+    profile concurrent threads, so renders that start while another thread
+    is being profiled (threaded gunicorn workers) run unprofiled.
+    """
+
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, label: str):
+        if self.keep <= 0 or not self._lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self._save(profiler, time.perf_counter() - started, label)
+        finally:
+            self._lock.release()
+
+    def _dumps(self) -> list:
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.endswith(".prof"))
+        except FileNotFoundError:
+            return []
+
+    def _save(self, profiler, duration: float, label: str) -> None:
+        name = f"{duration * 1000:012.3f}-{os.getpid()}-{label}.prof"
+        dumps = self._dumps()
+        if len(dumps) >= self.keep and name <= dumps[-self.keep]:
+            return  # Faster than every kept render
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        profiler.dump_stats(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        for stale in self._dumps()[:-self.keep]:
+            try:
+                os.remove(os.path.join(self.directory, stale))
+            except OSError:
+                pass
+
+
+profiler = SlowestRenderProfiler(Config.PROFILE_DIR, Config.PROFILE_SLOWEST_RENDERS)
@@ -1,6 +1,55 @@
-from dataclasses import dataclass
+import sys
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass, field
 from datetime import date
-from typing import List
+from typing import List, Optional, Union
+from config import Config
+from app.profiles import get_profile
+
+
+# Expense categories offered by ExpenseForm; their positions are the
+# category codes used by app.aggregation
+EXPENSE_CATEGORIES = (
+    "Ama Tea Coffee",
+    "Courier Service",
+    "Electricity bill",
+    "Electronic item",
+    "Expense from employee",
+    "Internet Bill",
+    "Mobile Recharge",
+    "Office Equipment",
+    "Office Event",
+    "Office Tour",
+    "Others",
+    "Others bill",
+    "PiHR",
+    "Rent",
+    "Servicing",
+    "Snacks",
+    "Sports",
+    "Stationary",
+    "Tax (TDS/VDS)",
+    "Trade License",
+    "Transportation",
+    "Travel",
+)
+
+
+def _parse_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip())
+
+
+def _text(data: dict, name: str, required: bool = True) -> str:
+    """Return a text field of a JSON/CSV mapping, which must be a string (or absent if optional)."""
+    value = data[name] if required else data.get(name)
+    if value is None and not required:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"Field {name!r} must be a string")
+    return value
 
 
 @dataclass
@@ -11,6 +60,148 @@ class ExpenseItem:
     note: str
     amount: float
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "ExpenseItem":
+        """Build an ExpenseItem from a JSON/CSV mapping with ISO dates."""
+        try:
+            return cls(
+                date=_parse_date(data["date"]),
+                category=_text(data, "category"),
+                description=_text(data, "description"),
+                note=_text(data, "note", required=False),
+                amount=float(data["amount"]),
+            )
+        except KeyError as e:
+            raise ValueError(f"Expense is missing field {e.args[0]!r}") from None
+
+    def to_dict(self) -> dict:
+        return {
+            "date": self.date.isoformat(),
+            "category": self.category,
+            "description": self.description,
+            "note": self.note,
+            "amount": self.amount,
+        }
+
+
+EXPENSE_FIELDS = ("date", "category", "description", "note", "amount")
+
+
+class ExpenseRow:
+    """
+    Read-only view of one row of an ExpenseTable.
+
+    Has the attributes of ExpenseItem, so code reading expenses works on
+    either; values are decoded from the table's columns on access.
+    """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "ExpenseTable", index: int):
+        self._table = table
+        self._index = index
+
+    @property
+    def date(self) -> date:
+        return date.fromordinal(self._table.days[self._index])
+
+    @property
+    def category(self) -> str:
+        return self._table.category_names[self._table.categories[self._index]]
+
+    @property
+    def description(self) -> str:
+        return self._table.descriptions[self._index]
+
+    @property
+    def note(self) -> str:
+        return self._table.notes[self._index]
+
+    @property
+    def amount(self) -> float:
+        return self._table.amounts[self._index]
+
+    def to_item(self) -> ExpenseItem:
+        """Return a standalone ExpenseItem copy of this row."""
+        return ExpenseItem(*(getattr(self, name) for name in EXPENSE_FIELDS))
+
+    def to_dict(self) -> dict:
+        return self.to_item().to_dict()
+
+    def __eq__(self, other):
+        if not isinstance(other, (ExpenseRow, ExpenseItem)):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in EXPENSE_FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"ExpenseRow({self.to_item()!r})"
+
+
+class ExpenseTable(Sequence):
+    """
+    Compact, column-oriented list of expenses for large invoices.
+
+    Dates are stored as ordinals and amounts as doubles in ``array``
+    buffers, categories as codes into ``category_names`` (EXPENSE_CATEGORIES
+    first, then unknown categories in first-seen order) and notes are
+    interned, so a row costs a fraction of an ExpenseItem. Iterating or
+    indexing yields ExpenseRow views; slicing returns a new ExpenseTable.
+    """
+
+    def __init__(self, items=()):
+        self.days = array("i")
+        self.categories = array("H")
+        self.amounts = array("d")
+        self.descriptions = []
+        self.notes = []
+        self.category_names = list(EXPENSE_CATEGORIES)
+        self._category_codes = {name: code for code, name in enumerate(EXPENSE_CATEGORIES)}
+        self.extend(items)
+
+    def append(self, item) -> None:
+        """Append an ExpenseItem (or any object with its attributes)."""
+        code = self._category_codes.get(item.category)
+        if code is None:
+            code = self._category_codes[item.category] = len(self.category_names)
+            self.category_names.append(item.category)
+        self.days.append(item.date.toordinal())
+        self.categories.append(code)
+        self.amounts.append(item.amount)
+        self.descriptions.append(item.description)
+        self.notes.append(sys.intern(item.note or ""))
+
+    def extend(self, items) -> None:
+        for item in items:
+            self.append(item)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ExpenseTable(ExpenseRow(self, i) for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ExpenseTable index out of range")
+        return ExpenseRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ExpenseRow(self, index)
+
+    def __eq__(self, other):
+        if not isinstance(other, (ExpenseTable, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"<ExpenseTable of {len(self)} expenses>"
+
 
 @dataclass
 class Invoice:
@@ -20,8 +211,70 @@ class Invoice:
     department: str
     start_date: date
     end_date: date
-    expenses: List[ExpenseItem]
+    expenses: Union[List[ExpenseItem], ExpenseTable]
+    profile: Optional[str] = None  # Output profile name (app.profiles); None: Config.PDF_PROFILE
+    _totals: object = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def totals(self):
+        """
+        Exact aggregates of the expenses (see app.aggregation.InvoiceTotals).
+
+        Computed once and cached; recomputed if expenses are added or the
+        list is replaced, but not if an item is edited in place.
+        """
+        from app.aggregation import aggregate
+
+        cached = self._totals
+        if cached is None or cached.source is not self.expenses or cached.count != len(self.expenses):
+            cached = self._totals = aggregate(self.expenses, self.start_date, self.end_date)
+        return cached
 
     @property
     def total_amount(self) -> float:
-        return round(sum(item.amount for item in self.expenses), 2)
+        return self.totals.total_amount
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Invoice":
+        """
+        Build an Invoice (and its expenses) from a JSON mapping with ISO dates.
+
+        Invoices with at least Config.COMPACT_EXPENSES_MIN_ROWS expenses get
+        an ExpenseTable instead of a list. The optional "profile" must name
+        an output profile.
+        """
+        try:
+            expenses = (ExpenseItem.from_dict(item) for item in data["expenses"])
+            if len(data["expenses"]) >= Config.COMPACT_EXPENSES_MIN_ROWS:
+                expenses = ExpenseTable(expenses)
+            else:
+                expenses = list(expenses)
+            profile = data.get("profile") or None
+            if profile is not None:
+                profile = get_profile(str(profile)).name
+            return cls(
+                company=_text(data, "company"),
+                prepared_by=_text(data, "prepared_by"),
+                employee_id=_text(data, "employee_id"),
+                department=_text(data, "department"),
+                start_date=_parse_date(data["start_date"]),
+                end_date=_parse_date(data["end_date"]),
+                expenses=expenses,
+                profile=profile,
+            )
+        except KeyError as e:
+            raise ValueError(f"Invoice is missing field {e.args[0]!r}") from None
+
+    def to_dict(self) -> dict:
+        data = {
+            "company": self.company,
+            "prepared_by": self.prepared_by,
+            "employee_id": self.employee_id,
+            "department": self.department,
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "expenses": [item.to_dict() for item in self.expenses],
+        }
+        if self.profile is not None:
+            data["profile"] = self.profile
+        return data
@@ -0,0 +1,82 @@
+"""
+Pre-rendered page fragments.
+The invoice form is the same for every visitor apart from its CSRF token
+and flash messages. Its markup (select choices, the expense row template)
+is rendered once per process and only those two slots are filled in per
+request. Template fragments that never change are cached the same way.
+"""
+
+import re
+from flask import current_app, render_template
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+from app.models import EXPENSE_CATEGORIES
+
+CSRF_SLOT = "\x00csrf-token\x00"
+FLASH_SLOT = "\x00flash-messages\x00"
+_SLOTS = re.compile(f"({re.escape(CSRF_SLOT)}|{re.escape(FLASH_SLOT)})")
+
+# Context of the fragments rendered by cached_fragment()
+FRAGMENT_CONTEXT = {"categories": EXPENSE_CATEGORIES}
+
+
+def _enabled() -> bool:
+    """Templates are re-rendered on every request while they may be edited."""
+    app = current_app
+    return app.config["PAGE_CACHE_ENABLED"] and not (app.debug or app.config["TEMPLATES_AUTO_RELOAD"])
+
+
+def cached_fragment(name: str) -> Markup:
+    """
+    Render a static template fragment once per process.
+
+    Available in templates as ``{{ cached_fragment("fragments/...") }}``.
+    """
+    fragments = current_app.extensions["page_fragments"]
+    html = fragments.get(name)
+    if html is None:
+        html = Markup(render_template(name, **FRAGMENT_CONTEXT))
+        if _enabled():
+            fragments[name] = html
+    return html
+
+
+def render_form_page(template: str, form) -> str:
+    """
+    Render an unbound form page from its cached shell.
+
+    The first call renders ``template`` with placeholders for the CSRF token
+    and flash messages; later calls only render those. The form must not
+    carry per-request data (values or errors): re-rendered submissions go
+    through render_template as usual.
+
+    Args:
+        template: Template name, e.g. "invoice_form.html"
+        form: Unbound FlaskForm instance
+
+    Returns:
+        str: Page HTML for this request
+    """
+    if not _enabled():
+        return render_template(template, form=form)
+
+    pages = current_app.extensions["page_shells"]
+    parts = pages.get(template)
+    if parts is None:
+        html = render_template(template, form=form, flash_slot=Markup(FLASH_SLOT))
+        if "csrf_token" in form:
+            # hidden_tag() rendered this request's token: swap it for the slot
+            html = html.replace(form.csrf_token.current_token, CSRF_SLOT)
+        parts = pages[template] = _SLOTS.split(html)
+
+    slots = {FLASH_SLOT: render_template("_flashes.html")}
+    if CSRF_SLOT in parts:
+        slots[CSRF_SLOT] = generate_csrf()
+    return "".join(slots.get(part, part) for part in parts)
+
+
+def init_page_cache(app) -> None:
+    """Set up the per-process page caches and the ``cached_fragment()`` template global."""
+    app.extensions["page_shells"] = {}
+    app.extensions["page_fragments"] = {}
+    app.jinja_env.globals["cached_fragment"] = cached_fragment
@@ -0,0 +1,253 @@
+"""
+Intra-invoice parallel rendering for single very large reports.
+An invoice with tens of thousands of expenses is one long platypus story,
+so the serial render uses one core however many the host has. Instead:
+
+1. Measure: worker processes lay out chunks of rows and return their
+   heights; the parent accumulates them into the same row offsets the
+   serial FastExpenseTable computes.
+2. Paginate: the parent lays out the full story once with a table that
+   only records which rows land on each page (nothing is drawn), which
+   fixes every page break up front.
+3. Render: the pages are split into one contiguous range per worker and
+   each range is rendered as its own PDF on the normal page template:
+   the header block in the first, the total in the last, the repeated
+   header row and watermark on every page.
+4. Stitch: the parts are concatenated with pypdf, sharing the watermark
+   and fonts between them.
+
+Parts reuse the exact row offsets of the serial layout, so every page
+breaks where the serial render breaks. If the parts' page count ever
+differs from the paginated plan the invoice is rendered serially instead.
+"""
+
+import dataclasses
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from pypdf import PdfReader, PdfWriter
+from config import Config
+from app.consolidate import SharedResources
+from app.fast_table import FastExpenseTable
+from app.metrics import registry, timed
+from app.pdf_generator import (
+    NumberedCanvas,
+    _build_document,
+    _compact,
+    _document,
+    _document_info,
+    get_invoice_template,
+)
+from app.profiles import get_profile
+from app.utils import process_pool
+
+logger = logging.getLogger(__name__)
+
+
+def use_parallel_render(invoice, engine: str = None) -> bool:
+    """
+    Whether an invoice is rendered by render_parallel.
+
+    Needs PARALLEL_RENDER_WORKERS > 1, at least PARALLEL_RENDER_MIN_ROWS
+    expenses and the fast table engine. Never true inside a worker process,
+    so parallel renders do not nest.
+    """
+    if Config.PARALLEL_RENDER_WORKERS <= 1 or len(invoice.expenses) < Config.PARALLEL_RENDER_MIN_ROWS:
+        return False
+    engine = engine or get_profile(invoice.profile).engine or Config.TABLE_ENGINE
+    if engine == "auto":
+        engine = "fast" if len(invoice.expenses) >= Config.FAST_TABLE_MIN_ROWS else "platypus"
+    return engine == "fast" and multiprocessing.parent_process() is None
+
+
+class _PageRecorder(FastExpenseTable):
+    """FastExpenseTable over known row offsets that records each page's rows instead of drawing them."""
+
+    def __init__(self, template, offsets, pages: list, _start=0, _end=None):
+        FastExpenseTable.__init__(
+            self, template, _rows=range(len(offsets) - 1), _offsets=offsets, _start=_start, _end=_end
+        )
+        self._pages = pages
+
+    def _part(self, start: int, end: int) -> "_PageRecorder":
+        return _PageRecorder(self._layout.template, self._offsets, self._pages, _start=start, _end=end)
+
+    def draw(self):
+        self._pages.append((self._start, self._end))
+
+
+def paginate(invoice, offsets: list, profile) -> tuple:
+    """
+    Lay out the whole invoice without drawing the table.
+
+    Args:
+        invoice: Invoice to paginate
+        offsets: Row offsets of its expense table (offsets[i] = height of rows[:i])
+        profile: OutputProfile the invoice is rendered with
+
+    Returns:
+        tuple: (list of (start, end) expense row ranges, one per table page, total pages)
+    """
+    template = get_invoice_template(invoice.company)
+    pages = []
+    story = template.header_story(invoice, profile)
+    story.append(_PageRecorder(template, offsets, pages))
+    story.extend(template.totals_story(invoice.totals))
+
+    canvases = []
+
+    def canvasmaker(*args, **kwargs):
+        canv = NumberedCanvas(*args, **kwargs)
+        canvases.append(canv)
+        return canv
+
+    # Same page template as _build_document, but nothing heavy is drawn or kept
+    doc = _document(io.BytesIO(), dataclasses.replace(profile, page_compression=False))
+    doc.build(story, canvasmaker=canvasmaker)
+    return pages, canvases[-1].pages
+
+
+def split_pages(pages: list, parts: int) -> list:
+    """Split table pages into at most ``parts`` contiguous groups of near-equal size."""
+    parts = max(1, min(parts, len(pages)))
+    size, extra = divmod(len(pages), parts)
+    groups, start = [], 0
+    for index in range(parts):
+        end = start + size + (index < extra)
+        groups.append(pages[start:end])
+        start = end
+    return groups
+
+
+def _measure(company: str, expenses) -> list:
+    """Process pool entry point: heights of a chunk of expense rows."""
+    layout = get_invoice_template(company).table_layout
+    return [layout.layout_row(item)[1] for item in expenses]
+
+
+def _render_part(invoice, offsets: list, first: bool, totals, profile, info: dict) -> bytes:
+    """
+    Process pool entry point: render one contiguous page range to PDF bytes.
+
+    Args:
+        invoice: The invoice with only this range's expenses
+        offsets: The serial layout's offsets of those rows, not rebased, so
+            the table splits with exactly the serial arithmetic
+        first: Whether the range starts the invoice (header block)
+        totals: InvoiceTotals of the whole invoice for the last range, else None
+        profile: OutputProfile to render with
+        info: Document information for the first range
+    """
+    template = get_invoice_template(invoice.company)
+    layout = template.table_layout
+    rows = [layout.layout_row(item)[0] for item in invoice.expenses]
+
+    story = template.header_story(invoice, profile) if first else []
+    story.append(FastExpenseTable(template, _rows=rows, _offsets=offsets))
+    if totals is not None:
+        story.extend(template.totals_story(totals))
+
+    buffer = io.BytesIO()
+    _build_document(template, story, buffer, profile, info)
+    return buffer.getvalue()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_parallel_pool() -> ProcessPoolExecutor:
+    """
+    Return this process's pool of PARALLEL_RENDER_WORKERS processes, creating it on first use.
+
+    The workers come from a forkserver (app.utils.process_pool), so they see
+    Config as imported, not changes made to it at runtime.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited across fork (e.g. from the gunicorn master) is unusable
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = process_pool(Config.PARALLEL_RENDER_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def render_parallel(invoice, target, pool=None, workers: int = None) -> bool:
+    """
+    Render a large invoice across worker processes and write the PDF to ``target``.
+
+    Args:
+        invoice: Invoice object containing all expense data
+        target: Output file path or writable binary file-like object
+        pool: ProcessPoolExecutor (default: get_parallel_pool())
+        workers: Number of page ranges (default: Config.PARALLEL_RENDER_WORKERS)
+
+    Returns:
+        bool: False if the parts did not match the pagination and nothing
+        was written; the caller then renders serially
+    """
+    pool = pool or get_parallel_pool()
+    workers = workers or Config.PARALLEL_RENDER_WORKERS
+    profile = get_profile(invoice.profile)
+    expenses = invoice.expenses
+    totals = invoice.totals
+
+    with timed("story_build"):
+        size = -(-len(expenses) // workers)
+        chunks = [expenses[start:start + size] for start in range(0, len(expenses), size)]
+        heights = pool.map(_measure, [invoice.company] * len(chunks), chunks)
+        offsets = [0] + list(accumulate(height for chunk in heights for height in chunk))
+
+    with timed("pagination"):
+        pages, page_count = paginate(invoice, offsets, profile)
+    groups = split_pages(pages, workers)
+
+    # Compaction re-encodes the stitched document once, not every part
+    part_profile = dataclasses.replace(profile, compact_streams=False)
+    futures = []
+    for index, group in enumerate(groups):
+        start, end = group[0][0], group[-1][1]
+        last = index == len(groups) - 1
+        futures.append(pool.submit(
+            _render_part,
+            dataclasses.replace(invoice, expenses=expenses[start:end]),
+            offsets[start:end + 1],
+            index == 0,
+            dataclasses.replace(totals, source=None) if last else None,
+            part_profile,
+            _document_info(invoice, profile) if index == 0 else None,
+        ))
+    with timed("parallel_render"):
+        parts = [future.result() for future in futures]
+
+    with timed("stitch"):
+        writer = PdfWriter()
+        shared = SharedResources()
+        for index, part in enumerate(parts):
+            reader = PdfReader(io.BytesIO(part))
+            if index == 0:
+                metadata = reader.metadata
+            shared.share(reader)
+            writer.append(reader, import_outline=False)
+        if len(writer.pages) != page_count:
+            logger.warning(
+                "Parallel render of %d expenses produced %d pages instead of %d; rendering serially",
+                len(expenses), len(writer.pages), page_count,
+            )
+            return False
+        if metadata:
+            writer.add_metadata(metadata)
+    if profile.compact_streams:
+        with timed("compaction"):
+            _compact(writer)
+    writer.write(target)
+
+    registry.inc("invoice_renders_total")
+    registry.inc("invoice_render_pages_total", page_count)
+    registry.inc("invoice_parallel_renders_total")
+    return True
@@ -4,7 +4,13 @@ Uses ReportLab to create A4 portrait PDFs with Bit Apps design system.
 Matches Bangladesh-based company design with BDT currency.
 """
 
+import io
 import os
+import tempfile
+import time
+import zlib
+from functools import lru_cache
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.colors import HexColor
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -21,6 +27,10 @@ from reportlab.platypus import (
 from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
 from config import Config
+from app.fast_table import DeferredParagraph, FastExpenseTable, RunningTotal, StreamingExpenseTable, TableLayout
+from app.logos import get_watermark_logo
+from app.metrics import profiler, registry, timed
+from app.profiles import PROFILES, get_profile
 
 
 # Bit Apps Design System Colors (matching the provided design)
@@ -30,59 +40,710 @@ TEXT_DARK = HexColor("#1F2937")     # Dark gray for text
 TEXT_LIGHT = HexColor("#6B7280")    # Light gray for secondary text
 BORDER_GRAY = HexColor("#E5E7EB")   # Light gray for borders
 TOTAL_BLUE = HexColor("#2563EB")    # Blue for total amount
+TABLE_HEADER_BG = HexColor("#F9FAFB")  # Expense table header row
 
 
 class NumberedCanvas(canvas.Canvas):
-    """Custom canvas to add watermark on every page."""
+    """
+    Custom canvas to add watermark on every page.
+
+    Also accumulates the time spent watermarking and emitting finished
+    pages (page streams and the final PDF serialization) for metrics.
+    """
+
+    WATERMARK_FORM = "Watermark"
     
     def __init__(self, *args, **kwargs):
-        self.logo_path = kwargs.pop('logo_path', None)
+        self.logo = kwargs.pop('logo', None)
+        self._watermark_ready = False
+        self.pages = 0
+        self.watermark_seconds = 0.0
+        self.emit_seconds = 0.0
         canvas.Canvas.__init__(self, *args, **kwargs)
         
     def showPage(self):
         """Override to add watermark before showing page."""
+        started = time.perf_counter()
         self.add_watermark()
+        watermarked = time.perf_counter()
         canvas.Canvas.showPage(self)
+        self.pages += 1
+        self.watermark_seconds += watermarked - started
+        self.emit_seconds += time.perf_counter() - watermarked
+        
+    def save(self):
+        """Write the PDF, timing it as part of page emission."""
+        started = time.perf_counter()
+        canvas.Canvas.save(self)
+        self.emit_seconds += time.perf_counter() - started
         
     def add_watermark(self):
-        """Add centered logo watermark on the page."""
-        if self.logo_path and os.path.exists(self.logo_path):
-            try:
-                # Save the state
-                self.saveState()
-                
-                # Set transparency for watermark
-                self.setFillAlpha(0.1)
-                
-                # Calculate center position
-                page_width, page_height = A4
-                logo_size = 200  # Size of watermark logo
-                x = (page_width - logo_size) / 2
-                y = (page_height - logo_size) / 2
-                
-                # Draw the watermark image
-                self.drawImage(
-                    self.logo_path,
-                    x, y,
-                    width=logo_size,
-                    height=logo_size,
-                    preserveAspectRatio=True,
-                    mask='auto'
-                )
-                
-                # Restore the state
-                self.restoreState()
-            except Exception as e:
-                pass  # Silently fail if watermark can't be added
-
-
-def generate_invoice_pdf(invoice, filename: str) -> str:
+        """
+        Add centered logo watermark on the page.
+
+        The logo is embedded once per document as a form XObject on the
+        first page; every page then only references that form.
+        """
+        if self.logo is None:
+            return
+        try:
+            if not self._watermark_ready:
+                self._define_watermark()
+            self.doForm(self.WATERMARK_FORM)
+        except Exception as e:
+            pass  # Silently fail if watermark can't be added
+
+    def _define_watermark(self):
+        """Draw the pre-faded logo into the shared watermark form."""
+        # Calculate center position
+        page_width, page_height = A4
+        logo_size = 200  # Size of watermark logo
+        x = (page_width - logo_size) / 2
+        y = (page_height - logo_size) / 2
+
+        self.beginForm(self.WATERMARK_FORM)
+        # Opacity is already applied to the logo's alpha channel
+        self.drawImage(
+            self.logo,
+            x, y,
+            width=logo_size,
+            height=logo_size,
+            preserveAspectRatio=True,
+            mask='auto'
+        )
+        self.endForm()
+        self._watermark_ready = True
+
+
+class InvoiceTemplate:
+    """
+    Static, data-independent parts of an invoice for a single company.
+
+    Paragraph styles, TableStyles, the parsed fixed paragraphs (company
+    name, title, table headers, signature labels) and the decoded logo
+    never change between invoices, so they are built once per company and
+    shared by every render, including renders running concurrently in other
+    threads. Nothing shared is mutated after __init__: platypus records
+    layout state on the flowables it places, so every render gets its own
+    flowables, built cheaply from the shared parts.
+    """
+
+    EXPENSE_COL_WIDTHS = [28 * mm, 28 * mm, 52 * mm, 40 * mm, 22 * mm]
+    EXPENSE_HEADERS = ["Date", "Category", "Description", "Notes", "Amount"]
+    EXPENSE_CELL_PADDING = 8       # Top/bottom padding of expense table cells
+    EXPENSE_CELL_SIDE_PADDING = 5  # Left/right padding of expense table cells
+
+    def __init__(self, company: str):
+        self.company = company
+        self.header_background = TABLE_HEADER_BG
+        self.border_color = BORDER_GRAY
+
+        # Decoded watermark logo shared across pages and requests
+        self.logo = get_watermark_logo(company)
+
+        styles = getSampleStyleSheet()
+
+        self.company_style = ParagraphStyle(
+            'CompanyName',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=TEXT_DARK,
+            fontName='Helvetica',
+            alignment=TA_LEFT,
+        )
+        self.title_style = ParagraphStyle(
+            'Title',
+            parent=styles['Heading1'],
+            fontSize=18,
+            textColor=HEADER_NAVY,
+            fontName='Helvetica-Bold',
+            alignment=TA_LEFT,
+            spaceAfter=6,
+        )
+        self.date_style = ParagraphStyle(
+            'DateRange',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=TEXT_LIGHT,
+            fontName='Helvetica',
+            alignment=TA_LEFT,
+            spaceAfter=15,
+        )
+        self.meta_style = ParagraphStyle(
+            'MetaInfo',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=TEXT_DARK,
+            fontName='Helvetica',
+            alignment=TA_LEFT,
+            leading=14,
+        )
+        self.table_header_style = ParagraphStyle(
+            'TableHeader',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=TEXT_DARK,
+            fontName='Helvetica-Bold',
+            alignment=TA_LEFT,
+        )
+        self.table_cell_style = ParagraphStyle(
+            'TableCell',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=TEXT_DARK,
+            fontName='Helvetica',
+            alignment=TA_LEFT,
+        )
+        self.total_style = ParagraphStyle(
+            'TotalAmount',
+            parent=styles['Normal'],
+            fontSize=14,
+            textColor=TOTAL_BLUE,
+            fontName='Helvetica-Bold',
+            alignment=TA_RIGHT,
+        )
+        self.sig_style = ParagraphStyle(
+            'Signature',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=TEXT_DARK,
+            fontName='Helvetica',
+            alignment=TA_LEFT,
+        )
+
+        # ===== TOP BLUE LINE =====
+        self.top_line_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), PRIMARY_BLUE),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+        ])
+
+        # ===== COMPANY NAME =====
+        self.company_name = Paragraph(f"<b>{escape(company)}</b>", self.company_style)
+
+        # ===== HORIZONTAL LINE =====
+        self.line_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), BORDER_GRAY),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ])
+
+        # ===== TITLE =====
+        self.titles = {
+            profile.title: Paragraph(profile.title, self.title_style)
+            for profile in PROFILES.values()
+        }
+
+        self.meta_table_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ])
+
+        # ===== EXPENSE TABLE HEADER =====
+        self.header_row = [
+            Paragraph(f"<b>{label}</b>", self.table_header_style)
+            for label in self.EXPENSE_HEADERS
+        ]
+
+        self.expense_table_style = TableStyle([
+            # Header row
+            ('BACKGROUND', (0, 0), (-1, 0), TABLE_HEADER_BG),
+            ('TEXTCOLOR', (0, 0), (-1, 0), TEXT_DARK),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), self.EXPENSE_CELL_PADDING),
+            ('TOPPADDING', (0, 0), (-1, 0), self.EXPENSE_CELL_PADDING),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, BORDER_GRAY),
+
+            # Data rows
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('TOPPADDING', (0, 1), (-1, -1), self.EXPENSE_CELL_PADDING),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), self.EXPENSE_CELL_PADDING),
+            ('LEFTPADDING', (0, 0), (-1, -1), self.EXPENSE_CELL_SIDE_PADDING),
+            ('RIGHTPADDING', (0, 0), (-1, -1), self.EXPENSE_CELL_SIDE_PADDING),
+
+            # Amount column right-aligned
+            ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
+
+            # Grid lines
+            ('LINEBELOW', (0, 1), (-1, -1), 0.5, BORDER_GRAY),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ])
+
+        # ===== CATEGORY SUMMARY (optional) =====
+        self.summary_title = Paragraph("Summary by Category", self.table_header_style)
+        self.summary_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), TABLE_HEADER_BG),
+            ('TEXTCOLOR', (0, 0), (-1, -1), TEXT_DARK),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('LEFTPADDING', (0, 0), (-1, -1), self.EXPENSE_CELL_SIDE_PADDING),
+            ('RIGHTPADDING', (0, 0), (-1, -1), self.EXPENSE_CELL_SIDE_PADDING),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.5, BORDER_GRAY),
+        ])
+
+        # ===== SIGNATURE SECTION =====
+        self.signature_labels = [
+            Paragraph("<b>Signature:</b>", self.sig_style),
+            Paragraph("<b>Date:</b>", self.sig_style),
+        ]
+        self.signature_table_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ])
+
+        # Column geometry for the fast and streaming table engines
+        self.table_layout = TableLayout(self)
+
+    @staticmethod
+    def paragraph(prototype: Paragraph) -> Paragraph:
+        """
+        Return a per-render copy of one of the template's fixed paragraphs.
+
+        Platypus records layout state on the flowables it places (sizes,
+        line breaks, the canvas while wrapping, ``_postponed``), so template
+        paragraphs are never placed themselves. The copy reuses the parsed
+        fragments, which layout only reads, so nothing is parsed again.
+        """
+        return Paragraph(prototype.text, prototype.style, frags=prototype.frags)
+
+    def watermark(self, profile):
+        """Return the watermark logo for an output profile, or None for no watermark."""
+        if not profile.watermark:
+            return None
+        if profile.watermark_max_width:
+            return get_watermark_logo(self.company, profile.watermark_max_width)
+        return self.logo
+
+    @staticmethod
+    def _rule(height: float, style: TableStyle) -> Table:
+        rule = Table([[""]], colWidths=[170 * mm], rowHeights=[height])
+        rule.setStyle(style)
+        return rule
+
+    def top_line(self) -> Table:
+        """The blue line at the top of the first page."""
+        return self._rule(3, self.top_line_style)
+
+    def line(self) -> Table:
+        """The thin gray line under the company name."""
+        return self._rule(0.5, self.line_style)
+
+    def signature_table(self) -> Table:
+        """The signature and date labels at the end of the invoice."""
+        table = Table([[self.paragraph(label) for label in self.signature_labels]], colWidths=[85 * mm, 85 * mm])
+        table.setStyle(self.signature_table_style)
+        return table
+
+    @staticmethod
+    def expense_row_text(item) -> list:
+        """
+        Return the text of each expense table cell for an expense item.
+
+        User text is escaped, so it is printed as entered rather than
+        parsed as Paragraph markup.
+        """
+        return [
+            item.date.strftime("%d-%b-%Y"),
+            escape(item.category),
+            escape(item.description),
+            escape(item.note or ""),
+            f"BDT {item.amount:,.2f}",
+        ]
+
+    def expense_row(self, item) -> list:
+        """Build the table cells for a single expense item."""
+        cell_style = self.table_cell_style
+        return [Paragraph(text, cell_style) for text in self.expense_row_text(item)]
+
+    def expense_table(self, expenses, engine: str = None):
+        """
+        Build the expense table flowable.
+
+        Args:
+            expenses: Sequence of ExpenseItem
+            engine: 'platypus' (Table of Paragraphs), 'fast' (rows drawn
+                directly on the canvas) or 'auto'/None to pick 'fast' for
+                invoices with at least Config.FAST_TABLE_MIN_ROWS rows
+        """
+        engine = engine or Config.TABLE_ENGINE
+        if engine == "auto":
+            engine = "fast" if len(expenses) >= Config.FAST_TABLE_MIN_ROWS else "platypus"
+
+        if engine == "fast":
+            return FastExpenseTable(self, expenses)
+        if engine != "platypus":
+            raise ValueError(f"Unknown table engine: {engine!r}")
+
+        table_data = [[self.paragraph(label) for label in self.header_row]]
+        table_data.extend(self.expense_row(item) for item in expenses)
+
+        expense_table = Table(
+            table_data,
+            colWidths=self.EXPENSE_COL_WIDTHS,
+            repeatRows=1,
+        )
+        expense_table.setStyle(self.expense_table_style)
+        return expense_table
+
+    def header_story(self, invoice, profile) -> list:
+        """
+        Flowables above the expense table: branding, date range and metadata.
+
+        Profiles without decorations leave out the rules but keep their
+        spacing, so pages break in the same places.
+        """
+        story = [self.top_line() if profile.decorations else Spacer(1, 3)]
+        story.extend([Spacer(1, 8), self.paragraph(self.company_name), Spacer(1, 10)])
+        story.append(self.line() if profile.decorations else Spacer(1, 0.5))
+        story.append(Spacer(1, 15))
+        story.append(self.paragraph(self.titles[profile.title]))
+
+        # ===== DATE RANGE =====
+        date_range = f"{invoice.start_date.strftime('%d/%m/%Y')} – {invoice.end_date.strftime('%d/%m/%Y')}"
+        story.append(Paragraph(date_range, self.date_style))
+        story.append(Spacer(1, 10))
+
+        # ===== METADATA (3 COLUMNS) =====
+        meta_data = [[
+            Paragraph(f"<b>Prepared By:</b><br/>{escape(invoice.prepared_by)}", self.meta_style),
+            Paragraph(f"<b>Employee ID:</b><br/>{escape(invoice.employee_id)}", self.meta_style),
+            Paragraph(f"<b>Department:</b><br/>{escape(invoice.department)}", self.meta_style),
+        ]]
+        meta_table = Table(meta_data, colWidths=[56 * mm, 56 * mm, 56 * mm])
+        meta_table.setStyle(self.meta_table_style)
+        story.append(meta_table)
+        story.append(Spacer(1, 20))
+        return story
+
+    def footer_story(self, total, summary: list = None) -> list:
+        """
+        Flowables below the expense table.
+
+        Args:
+            total: Paragraph (or deferred flowable) showing the total amount
+            summary: Optional flowables placed between the total and the signatures
+        """
+        return [Spacer(1, 20), total, *(summary or ()), Spacer(1, 40), self.signature_table()]
+
+    def category_summary(self, totals) -> list:
+        """
+        Flowables for the per-category subtotal table.
+
+        Args:
+            totals: app.aggregation.InvoiceTotals of the invoice
+        """
+        rows = [["Category", "Items", "Subtotal"]]
+        for category, paisa in totals.by_category.items():
+            rows.append([category, str(totals.category_counts[category]), self.paisa_text(paisa)])
+        table = Table(rows, colWidths=[70 * mm, 25 * mm, 45 * mm], repeatRows=1, hAlign='RIGHT')
+        table.setStyle(self.summary_table_style)
+        return [Spacer(1, 20), self.paragraph(self.summary_title), Spacer(1, 6), table]
+
+    COVER_HEADERS = ["#", "Prepared By", "Employee ID", "Period", "Items", "Total", "Page"]
+    COVER_COL_WIDTHS = [9 * mm, 44 * mm, 26 * mm, 38 * mm, 13 * mm, 28 * mm, 12 * mm]
+
+    def cover_story(self, title: str, period: str, members: list) -> list:
+        """
+        Flowables for the cover page of a consolidated PDF.
+
+        Args:
+            title: Heading, e.g. "HR – January 2026"
+            period: Date range covered by the members
+            members: Objects with prepared_by, employee_id, start_date,
+                end_date, expenses (count), total (paisa) and first_page
+        """
+        story = [self.top_line(), Spacer(1, 8), self.paragraph(self.company_name), Spacer(1, 10)]
+        story.append(self.line())
+        story.append(Spacer(1, 15))
+        story.append(Paragraph("Consolidated Expense Report", self.title_style))
+        story.append(Paragraph(f"{escape(title)}<br/>{escape(period)}", self.date_style))
+
+        rows = [self.COVER_HEADERS]
+        grand_total = expenses = 0
+        for number, member in enumerate(members, start=1):
+            rows.append([
+                str(number),
+                Paragraph(escape(member.prepared_by), self.table_cell_style),
+                Paragraph(escape(member.employee_id), self.table_cell_style),
+                f"{member.start_date.strftime('%d/%m/%Y')} – {member.end_date.strftime('%d/%m/%Y')}",
+                str(member.expenses),
+                self.paisa_text(member.total),
+                str(member.first_page),
+            ])
+            grand_total += member.total
+            expenses += member.expenses
+        rows.append(["", f"{len(members)} reports", "", "", str(expenses), self.paisa_text(grand_total), ""])
+
+        table = Table(rows, colWidths=self.COVER_COL_WIDTHS, repeatRows=1)
+        table.setStyle(self.summary_table_style)
+        table.setStyle(TableStyle([
+            ('ALIGN', (1, 0), (3, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('LINEABOVE', (0, -1), (-1, -1), 1, BORDER_GRAY),
+        ]))
+        story.append(table)
+        story.append(Spacer(1, 20))
+        story.append(Paragraph(self.paisa_text(grand_total), self.total_style))
+        return story
+
+    @staticmethod
+    def paisa_text(paisa: int) -> str:
+        """Format an exact paisa amount as BDT, without going through float."""
+        taka, cents = divmod(abs(paisa), 100)
+        return f"{'-' if paisa < 0 else ''}BDT {taka:,}.{cents:02d}"
+
+    def build_story(self, invoice, engine: str = None, profile=None) -> list:
+        """
+        Assemble the flowables for an invoice.
+
+        Fixed paragraphs are copied from the template without re-parsing;
+        the date range, metadata, expense rows and total are created here,
+        plus the category summary when Config.PDF_CATEGORY_SUMMARY is set.
+
+        Args:
+            invoice: Invoice to lay out
+            engine: Expense table engine (default: the profile's, then
+                Config.TABLE_ENGINE)
+            profile: OutputProfile (default: the invoice's)
+        """
+        profile = profile or get_profile(invoice.profile)
+        story = self.header_story(invoice, profile)
+
+        # ===== EXPENSE TABLE =====
+        story.append(self.expense_table(invoice.expenses, engine or profile.engine))
+
+        # ===== TOTAL AMOUNT =====
+        story.extend(self.totals_story(invoice.totals))
+        return story
+
+    def totals_story(self, totals) -> list:
+        """
+        Footer flowables showing the exact total (and category summary).
+
+        Args:
+            totals: app.aggregation.InvoiceTotals of the invoice
+        """
+        total = Paragraph(self.paisa_text(totals.total), self.total_style)
+        summary = self.category_summary(totals) if Config.PDF_CATEGORY_SUMMARY else None
+        return self.footer_story(total, summary)
+
+    def build_streaming_story(self, invoice, expenses, totals: RunningTotal) -> list:
+        """
+        Assemble the flowables for an invoice whose rows come from an iterator.
+
+        The expense table reads rows one page at a time and the total is
+        only formatted once the table has consumed the last row.
+        """
+        story = self.header_story(invoice, get_profile(invoice.profile))
+        story.append(StreamingExpenseTable(self, expenses, totals))
+        total = DeferredParagraph(lambda: self.paisa_text(totals.total), self.total_style)
+        story.extend(self.footer_story(total))
+        return story
+
+
+@lru_cache(maxsize=None)
+def get_invoice_template(company: str) -> InvoiceTemplate:
+    """
+    Return the memoized InvoiceTemplate for a company, building it on first use.
+
+    Safe to call from any thread: templates are immutable once built, so
+    threads racing on a company's first render at worst build it twice.
+    """
+    return InvoiceTemplate(company)
+
+
+def _document(target, profile, info: dict = None) -> SimpleDocTemplate:
+    """Return the A4 invoice page template writing to ``target`` for an output profile."""
+    return SimpleDocTemplate(
+        target,
+        pagesize=A4,
+        rightMargin=20 * mm,
+        leftMargin=20 * mm,
+        topMargin=15 * mm,
+        bottomMargin=15 * mm,
+        invariant=1 if profile.invariant else None,
+        pageCompression=None if profile.page_compression else 0,
+        **(info or {}),
+    )
+
+
+def _build_document(template, story: list, target, profile=None, info: dict = None) -> None:
+    """
+    Lay out a story on the invoice page template and write the PDF to ``target``.
+
+    Args:
+        template: InvoiceTemplate the story was built from
+        story: List of flowables
+        target: Output file path or writable binary file-like object
+        profile: OutputProfile (default: Config.PDF_PROFILE)
+        info: Document information (title, author, subject, creator)
+    """
+    profile = profile or get_profile()
+    logo = template.watermark(profile)
+    # Compact PDFs are re-encoded once ReportLab is done with them
+    output = io.BytesIO() if profile.compact_streams else target
+
+    # Create PDF document with custom canvas for watermark
+    doc = _document(output, profile, info)
+
+    canvases = []
+
+    def canvasmaker(*args, **kwargs):
+        canv = NumberedCanvas(*args, logo=logo, **kwargs)
+        canvases.append(canv)
+        return canv
+
+    # Build the PDF with watermark canvas
+    started = time.perf_counter()
+    doc.build(story, canvasmaker=canvasmaker)
+    elapsed = time.perf_counter() - started
+
+    # Layout is whatever doc.build spent outside watermarking and emission
+    canv = canvases[-1]
+    registry.observe("invoice_stage_seconds", elapsed - canv.watermark_seconds - canv.emit_seconds, stage="layout")
+    registry.observe("invoice_stage_seconds", canv.emit_seconds, stage="page_emission")
+    if logo is not None:
+        registry.observe("invoice_stage_seconds", canv.watermark_seconds, stage="watermark")
+    registry.inc("invoice_renders_total")
+    registry.inc("invoice_render_pages_total", canv.pages)
+
+    if profile.compact_streams:
+        with timed("compaction"):
+            pdf = compact_pdf(output.getvalue())
+        if isinstance(target, str):
+            with open(target, "wb") as pdf_file:
+                pdf_file.write(pdf)
+        else:
+            target.write(pdf)
+
+
+def compact_pdf(pdf: bytes) -> bytes:
+    """
+    Re-encode a PDF as small as ReportLab's output allows without losing content.
+
+    ReportLab wraps every stream in ASCII85 on top of Flate, which costs a
+    quarter more bytes, and deflates at zlib's default level. Each stream
+    is re-deflated at level 9 without ASCII85, and the document
+    information dictionary is dropped.
+
+    Args:
+        pdf: PDF document
+
+    Returns:
+        bytes: The compacted PDF document
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(pdf)))
+    _compact(writer)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _compact(writer) -> None:
+    """Re-deflate every stream of a pypdf PdfWriter in place and drop its metadata (see compact_pdf)."""
+    from pypdf.generic import DictionaryObject, ArrayObject, IndirectObject, NameObject, StreamObject
+
+    seen = set()
+
+    def visit(obj):
+        if isinstance(obj, IndirectObject):
+            if obj.idnum in seen:
+                return
+            seen.add(obj.idnum)
+            obj = obj.get_object()
+        if isinstance(obj, StreamObject):
+            data = obj.get_data()  # Decoded through all filters
+            obj.pop("/DecodeParms", None)
+            obj[NameObject("/Filter")] = NameObject("/FlateDecode")
+            # The base class stores the bytes as given; subclasses would re-encode them
+            StreamObject.set_data(obj, zlib.compress(data, 9))
+            obj.decoded_self = None
+        if isinstance(obj, DictionaryObject):
+            for key in obj:
+                if key != "/Parent":
+                    visit(obj.raw_get(key))
+        elif isinstance(obj, ArrayObject):
+            for item in obj:
+                visit(item)
+
+    for page in writer.pages:
+        visit(page)
+    writer.metadata = None
+
+
+def _build_invoice(invoice, target, engine: str = None) -> None:
+    """
+    Lay out the invoice and write the PDF to ``target``.
+
+    Args:
+        invoice: Invoice object containing all expense data
+        target: Output file path or writable binary file-like object
+        engine: Expense table engine (see InvoiceTemplate.expense_table)
+    """
+    template = get_invoice_template(invoice.company)
+    profile = get_profile(invoice.profile)
+    with profiler.profile(f"{len(invoice.expenses)}rows"):
+        # Very large invoices: page ranges rendered in worker processes
+        from app.parallel_render import render_parallel, use_parallel_render
+
+        if use_parallel_render(invoice, engine) and render_parallel(invoice, target):
+            return
+        with timed("story_build"):
+            story = template.build_story(invoice, engine, profile)
+        _build_document(template, story, target, profile, _document_info(invoice, profile))
+
+
+def _document_info(invoice, profile) -> dict:
+    """PDF document information for profiles that describe the document."""
+    if not profile.document_info:
+        return None
+    period = f"{invoice.start_date.isoformat()} – {invoice.end_date.isoformat()}"
+    return {
+        "title": f"Expense Report {period}",
+        "author": invoice.prepared_by,
+        "subject": f"{invoice.company} · {invoice.department} · {invoice.employee_id}",
+        "creator": "Expense Invoice Generator",
+    }
+
+
+def render_cover_pdf(company: str, title: str, period: str, members: list) -> bytes:
+    """
+    Render the cover page(s) of a consolidated PDF in memory.
+
+    Args:
+        company: Company whose branding and watermark are used
+        title, period, members: See InvoiceTemplate.cover_story
+
+    Returns:
+        bytes: The cover as a PDF document
+    """
+    template = get_invoice_template(company)
+    buffer = io.BytesIO()
+    _build_document(template, template.cover_story(title, period, members), buffer)
+    return buffer.getvalue()
+
+
+def generate_invoice_pdf(invoice, filename: str, engine: str = None) -> str:
     """
     Generate a professional A4 PDF invoice matching Bangladesh design.
     
     Args:
         invoice: Invoice object containing all expense data
         filename: Output PDF filename
+        engine: Expense table engine (default: Config.TABLE_ENGINE)
         
     Returns:
         str: Full path to generated PDF file
@@ -91,238 +752,79 @@ def generate_invoice_pdf(invoice, filename: str) -> str:
 
     # Ensure output directory exists
     os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
-    
-    # Get logo path for watermark
-    logo_path = os.path.join(
-        Config.BASE_DIR,
-        "static",
-        "assets",
-        "logos",
-        f"{invoice.company}.png",
-    )
-    
-    # Create PDF document with custom canvas for watermark
-    doc = SimpleDocTemplate(
-        output_path,
-        pagesize=A4,
-        rightMargin=20 * mm,
-        leftMargin=20 * mm,
-        topMargin=15 * mm,
-        bottomMargin=15 * mm,
-    )
 
-    # Build styles
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # ===== TOP BLUE LINE =====
-    top_line_data = [[""]]
-    top_line = Table(top_line_data, colWidths=[170 * mm], rowHeights=[3])
-    top_line.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), PRIMARY_BLUE),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    story.append(top_line)
-    story.append(Spacer(1, 8))
-    
-    # ===== COMPANY NAME =====
-    company_style = ParagraphStyle(
-        'CompanyName',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=TEXT_DARK,
-        fontName='Helvetica',
-        alignment=TA_LEFT,
-    )
-    story.append(Paragraph(f"<b>{invoice.company}</b>", company_style))
+    # Render under a unique temporary name, so concurrent renders of the
+    # same filename never write into one file and readers never see a
+    # partial PDF
+    fd, temp_path = tempfile.mkstemp(dir=Config.OUTPUT_DIR, prefix=f"{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as pdf_file:
+            _build_invoice(invoice, pdf_file, engine)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
 
-    story.append(Spacer(1, 10))
-    
-    # ===== HORIZONTAL LINE =====
-    line_data = [[""]]
-    line = Table(line_data, colWidths=[170 * mm], rowHeights=[0.5])
-    line.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), BORDER_GRAY),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    story.append(line)
-    story.append(Spacer(1, 15))
-    
-    # ===== TITLE =====
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=HEADER_NAVY,
-        fontName='Helvetica-Bold',
-        alignment=TA_LEFT,
-        spaceAfter=6,
-    )
-    story.append(Paragraph("Expense Report", title_style))
-    
-    # ===== DATE RANGE =====
-    date_style = ParagraphStyle(
-        'DateRange',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=TEXT_LIGHT,
-        fontName='Helvetica',
-        alignment=TA_LEFT,
-        spaceAfter=15,
-    )
-    date_range = f"{invoice.start_date.strftime('%d/%m/%Y')} – {invoice.end_date.strftime('%d/%m/%Y')}"
-    story.append(Paragraph(date_range, date_style))
-    story.append(Spacer(1, 10))
-    
-    # ===== METADATA (3 COLUMNS) =====
-    meta_style = ParagraphStyle(
-        'MetaInfo',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=TEXT_DARK,
-        fontName='Helvetica',
-        alignment=TA_LEFT,
-        leading=14,
-    )
-    
-    meta_data = [[
-        Paragraph(f"<b>Prepared By:</b><br/>{invoice.prepared_by}", meta_style),
-        Paragraph(f"<b>Employee ID:</b><br/>{invoice.employee_id}", meta_style),
-        Paragraph(f"<b>Department:</b><br/>{invoice.department}", meta_style),
-    ]]
-    
-    meta_table = Table(meta_data, colWidths=[56 * mm, 56 * mm, 56 * mm])
-    meta_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    story.append(meta_table)
-    story.append(Spacer(1, 20))
-    
-    # ===== EXPENSE TABLE =====
-    table_header_style = ParagraphStyle(
-        'TableHeader',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=TEXT_DARK,
-        fontName='Helvetica-Bold',
-        alignment=TA_LEFT,
-    )
-    
-    table_cell_style = ParagraphStyle(
-        'TableCell',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=TEXT_DARK,
-        fontName='Helvetica',
-        alignment=TA_LEFT,
-    )
-    
-    # Build table data
-    table_data = [
-        [
-            Paragraph("<b>Date</b>", table_header_style),
-            Paragraph("<b>Category</b>", table_header_style),
-            Paragraph("<b>Description</b>", table_header_style),
-            Paragraph("<b>Notes</b>", table_header_style),
-            Paragraph("<b>Amount</b>", table_header_style),
-        ]
-    ]
-    
-    # Add expense items
-    for item in invoice.expenses:
-        table_data.append([
-            Paragraph(item.date.strftime("%d-%b-%Y"), table_cell_style),
-            Paragraph(item.category, table_cell_style),
-            Paragraph(item.description, table_cell_style),
-            Paragraph(item.note or "", table_cell_style),
-            Paragraph(f"BDT {item.amount:,.2f}", table_cell_style),
-        ])
-    
-    # Create the table
-    expense_table = Table(
-        table_data,
-        colWidths=[28 * mm, 28 * mm, 52 * mm, 40 * mm, 22 * mm],
-        repeatRows=1,
-    )
-    
-    expense_table.setStyle(TableStyle([
-        # Header row
-        ('BACKGROUND', (0, 0), (-1, 0), HexColor("#F9FAFB")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), TEXT_DARK),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('TOPPADDING', (0, 0), (-1, 0), 8),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, BORDER_GRAY),
-        
-        # Data rows
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 5),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-        
-        # Amount column right-aligned
-        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
-        
-        # Grid lines
-        ('LINEBELOW', (0, 1), (-1, -1), 0.5, BORDER_GRAY),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
-    
-    story.append(expense_table)
-    story.append(Spacer(1, 20))
-    
-    # ===== TOTAL AMOUNT =====
-    total_style = ParagraphStyle(
-        'TotalAmount',
-        parent=styles['Normal'],
-        fontSize=14,
-        textColor=TOTAL_BLUE,
-        fontName='Helvetica-Bold',
-        alignment=TA_RIGHT,
-    )
-    
-    total_text = f"BDT {invoice.total_amount:,.2f}"
-    story.append(Paragraph(total_text, total_style))
-    story.append(Spacer(1, 40))
-    
-    # ===== SIGNATURE SECTION =====
-    sig_style = ParagraphStyle(
-        'Signature',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=TEXT_DARK,
-        fontName='Helvetica',
-        alignment=TA_LEFT,
-    )
-    
-    signature_data = [[
-        Paragraph("<b>Signature:</b>", sig_style),
-        Paragraph("<b>Date:</b>", sig_style),
-    ]]
-    
-    signature_table = Table(signature_data, colWidths=[85 * mm, 85 * mm])
-    signature_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    
-    story.append(signature_table)
-    
-    # Build the PDF with watermark canvas
-    if logo_path and os.path.exists(logo_path):
-        doc.build(story, canvasmaker=lambda *args, **kwargs: NumberedCanvas(*args, logo_path=logo_path, **kwargs))
-    else:
-        doc.build(story)
-    
     return output_path
 
+
+def render_invoice_pdf(invoice, engine: str = None) -> bytes:
+    """
+    Render the invoice entirely in memory without touching OUTPUT_DIR.
+
+    Args:
+        invoice: Invoice object containing all expense data
+        engine: Expense table engine (default: Config.TABLE_ENGINE)
+
+    Returns:
+        bytes: The complete PDF document
+    """
+    buffer = io.BytesIO()
+    _build_invoice(invoice, buffer, engine)
+    return buffer.getvalue()
+
+
+def stream_invoice_pdf(invoice, engine: str = None):
+    """
+    Render the invoice into a bounded spooled buffer.
+
+    The PDF stays in memory up to ``Config.PDF_SPOOL_MAX_SIZE`` bytes and
+    spills to an anonymous temporary file beyond that.
+
+    Args:
+        invoice: Invoice object containing all expense data
+        engine: Expense table engine (default: Config.TABLE_ENGINE)
+
+    Returns:
+        SpooledTemporaryFile: Binary stream positioned at the start of the PDF
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=Config.PDF_SPOOL_MAX_SIZE)
+    _build_invoice(invoice, buffer, engine)
+    buffer.seek(0)
+    return buffer
+
+
+def generate_invoice_pdf_streaming(invoice, expenses, target) -> RunningTotal:
+    """
+    Render an invoice whose expense rows are pulled from an iterator.
+
+    Rows are read lazily (e.g. from a CSV reader or a DB cursor), laid out
+    one page at a time with the fast table engine and released once the
+    page is drawn, so the rows are never held in a list. ``invoice.expenses``
+    is ignored; only its header fields are used.
+
+    Args:
+        invoice: Invoice providing the company, preparer and date range
+        expenses: Iterable of ExpenseItem, consumed once
+        target: Output file path or writable binary file-like object
+
+    Returns:
+        RunningTotal: Row count and exact total (paisa) of the rendered expenses
+    """
+    template = get_invoice_template(invoice.company)
+    totals = RunningTotal()
+    with profiler.profile("streamed"):
+        profile = get_profile(invoice.profile)
+        story = template.build_streaming_story(invoice, expenses, totals)
+        _build_document(template, story, target, profile, _document_info(invoice, profile))
+    return totals
@@ -0,0 +1,72 @@
+"""
+Output profiles: rendering modes that trade PDF size, fidelity and render time.
+An invoice's ``profile`` names one of PROFILES; None means Config.PDF_PROFILE.
+The profile is part of the render cache key, so each profile of an invoice
+is stored separately.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+from config import Config
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """How to render an invoice; see PROFILES."""
+
+    name: str
+    label: str
+    watermark: bool = True
+    watermark_max_width: Optional[int] = None  # Downsample the logo to this many pixels wide
+    decorations: bool = True  # Blue top rule and the line under the company name
+    engine: Optional[str] = None  # Table engine unless one is requested (default: TABLE_ENGINE)
+    page_compression: bool = True
+    compact_streams: bool = False  # Re-deflate streams at level 9 without ASCII85, drop metadata
+    invariant: bool = False  # Fixed timestamps and document ID: same invoice, same bytes
+    document_info: bool = False  # Title, author and subject from the invoice
+    title: str = "Expense Report"
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in (
+        # The original output
+        OutputProfile("standard", "Standard"),
+        # Slow links: smallest file, watermark at about 90 dpi
+        OutputProfile(
+            "compact",
+            "Compact (smallest download)",
+            watermark_max_width=256,
+            compact_streams=True,
+        ),
+        # Fastest render for previews: no watermark, rules or compression
+        OutputProfile(
+            "draft",
+            "Draft (fastest)",
+            watermark=False,
+            decorations=False,
+            engine="fast",
+            page_compression=False,
+            title="Expense Report (Draft)",
+        ),
+        # Long-term archive: full fidelity, reproducible bytes, described document
+        OutputProfile("archival", "Archival", invariant=True, document_info=True),
+    )
+}
+
+PROFILE_CHOICES = [(profile.name, profile.label) for profile in PROFILES.values()]
+PROFILE_MESSAGE = f"Output profile must be one of: {', '.join(PROFILES)}."
+
+
+def get_profile(name: str = None) -> OutputProfile:
+    """
+    Return the named output profile (default: Config.PDF_PROFILE).
+
+    Raises:
+        ValueError: If no profile has that name
+    """
+    name = name or Config.PDF_PROFILE
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown output profile: {name!r}") from None
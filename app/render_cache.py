@@ -0,0 +1,179 @@
+"""
+Content-addressed cache of rendered invoice PDFs.
+Identical invoices hash to the same key, so a resubmitted form is served
+from the stored PDF instead of being rendered again. The key also names
+the stored file, which makes stored filenames collision-free.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from config import Config
+from app.metrics import registry
+from app.profiles import get_profile
+from app.sessions import get_session_store
+
+
+# Bump when the PDF layout changes so stale renders are not served
+CACHE_VERSION = 1
+
+
+def invoice_key(invoice) -> str:
+    """
+    Return a canonical SHA-256 hex digest of the invoice contents.
+
+    Header fields and expense text are whitespace-normalized and amounts
+    are fixed to two decimals, matching how they appear in the PDF.
+    """
+    data = {
+        "v": CACHE_VERSION,
+        "company": invoice.company.strip(),
+        "prepared_by": invoice.prepared_by.strip(),
+        "employee_id": invoice.employee_id.strip(),
+        "department": invoice.department.strip(),
+        "start_date": invoice.start_date.isoformat(),
+        "end_date": invoice.end_date.isoformat(),
+        "category_summary": Config.PDF_CATEGORY_SUMMARY,
+        "profile": get_profile(invoice.profile).name,
+        "expenses": [
+            [
+                item.date.isoformat(),
+                item.category.strip(),
+                item.description.strip(),
+                (item.note or "").strip(),
+                f"{item.amount:.2f}",
+            ]
+            for item in invoice.expenses
+        ],
+    }
+    blob = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def stored_filename(invoice) -> str:
+    """Return the collision-free storage name for an invoice's PDF."""
+    return f"{invoice_key(invoice)}.pdf"
+
+
+class RenderCache:
+    """
+    LRU, size-bounded view over an invoice store keyed by invoice contents.
+
+    Entries expire with the store (CLEANUP_MAX_AGE); a hit restarts the
+    entry's expiry clock. Entries beyond max_items/max_bytes are evicted
+    least recently used first and deleted from the store, unless a live
+    session still references the PDF: the same content has the same name,
+    so another session may be about to download it. Those (and, with
+    cookie sessions, which cannot be searched, every evicted PDF) are left
+    for the expiry sweep. The budget is per process, like the index.
+    """
+
+    def __init__(self, store, max_items: int, max_bytes: int):
+        self.store = store
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # stored filename -> size
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, filename: str) -> bool:
+        """Return True (and refresh the entry) if the PDF is already stored."""
+        size = self.store.size(filename)
+        with self._lock:
+            if size is None:
+                self._forget(filename)
+                self.misses += 1
+                registry.inc("invoice_render_cache_requests_total", result="miss")
+                return False
+            self.hits += 1
+        registry.inc("invoice_render_cache_requests_total", result="hit")
+        self.store.touch(filename)
+        self.remember(filename, size)
+        return True
+
+    def remember(self, filename: str, size: int) -> None:
+        """Record a stored PDF as most recently used, evicting if over budget."""
+        evicted = []
+        with self._lock:
+            self._forget(filename)
+            self._entries[filename] = size
+            self._size += size
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_items or self._size > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._forget(oldest)
+                evicted.append(oldest)
+            self.evictions += len(evicted)
+            entries, total_bytes = len(self._entries), self._size
+        registry.set("invoice_render_cache_entries", entries)
+        registry.set("invoice_render_cache_bytes", total_bytes)
+        if evicted:
+            registry.inc("invoice_render_cache_evictions_total", len(evicted))
+        for name in evicted:
+            if not _referenced_by_session(name):
+                self.store.delete(name)
+
+    def get_or_render(self, invoice) -> tuple:
+        """
+        Store the invoice's PDF unless an identical one is already stored.
+
+        Fresh renders are also recorded in the invoice archive (if enabled).
+
+        Returns:
+            tuple: (stored filename, True if served from cache)
+        """
+        from app.archive import archive_invoice
+
+        key = invoice_key(invoice)
+        filename = f"{key}.pdf"
+        if self.lookup(filename):
+            return filename, True
+        pdf = self.store.save(filename, invoice)
+        self.remember(filename, len(pdf))
+        archive_invoice(invoice, pdf, key)
+        return filename, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def _forget(self, filename: str) -> None:
+        size = self._entries.pop(filename, None)
+        if size is not None:
+            self._size -= size
+
+
+def _referenced_by_session(filename: str) -> bool:
+    """Whether a live session may still download the stored PDF (assumed when sessions are cookies)."""
+    store = get_session_store()
+    return store is None or store.references(filename)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> RenderCache:
+    """Return the process-wide render cache over the configured invoice store."""
+    global _cache
+    from app.storage import get_invoice_store
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache(
+                get_invoice_store(),
+                Config.RENDER_CACHE_MAX_ITEMS,
+                Config.RENDER_CACHE_MAX_BYTES,
+            )
+        return _cache
@@ -4,115 +4,219 @@ Manages form submission, PDF generation, downloads, and cleanup.
 """
 
 import uuid
+import io
+import logging
 import os
 from flask import (
     Blueprint, render_template, redirect, url_for, 
-    send_file, session, flash, request
+    send_file, session, flash, request, jsonify, Response
 )
-from app.forms import InvoiceForm
-from app.models import Invoice, ExpenseItem
-from app.pdf_generator import generate_invoice_pdf
-from app.utils import cleanup_old_invoices, cleanup_session_invoice
+from app.batch import batch_errors, load_invoices
+from app.forms import ExpenseImportForm, InvoiceForm, InvoiceHeaderForm
+from app.importer import import_expenses, read_upload_rows
+from app.jobs import get_job_queue, start_render_workers, QueueFullError, BATCH, QUEUED, RUNNING, DONE, FAILED
+from app.logs import FORM_LOGGER_NAME, FormDump
+from app.metrics import registry, timed
+from app.models import Invoice
+from app.page_cache import render_form_page
+from app.render_cache import get_render_cache, stored_filename
+from app.storage import get_invoice_store
+from app.utils import bearer_token_matches, cleanup_session_invoice, invoice_filename
+from app.validation import PERIOD_MESSAGE, validate_form_expenses
+from config import Config
 
 invoice_bp = Blueprint("invoice", __name__)
 
+logger = logging.getLogger(__name__)
+form_logger = logging.getLogger(FORM_LOGGER_NAME)
+
 
 @invoice_bp.before_request
 def cleanup_before_request():
-    """Clean up old invoices and session data before each request."""
-    cleanup_old_invoices()
-    
+    """Clean up session data before each request.
+
+    Expired invoices are removed by the background cleanup scheduler
+    (app.cleanup), not in the request path.
+    """
     # Clean up previous invoice on page refresh
     if request.path == "/" and request.method == "GET":
         cleanup_session_invoice()
 
 
+def _submit_invoice(invoice):
+    """
+    Render (or queue) a validated invoice and redirect to the preview.
+
+    Shared by the form and file import submissions; the submitted form is
+    re-rendered if the render queue is full.
+    """
+    # Download name: startdate_enddate_preparedby_company.pdf
+    filename = invoice_filename(invoice)
+    # Stored under a content hash, so identical invoices share one PDF
+    stored_name = stored_filename(invoice)
+    cache = get_render_cache()
+
+    if not Config.RENDER_QUEUE_ENABLED:
+        # Generate PDF into the configured store unless already cached
+        stored_name, cached = cache.get_or_render(invoice)
+        session.pop('invoice_job', None)
+
+        logger.info("PDF %s: %s", "served from cache" if cached else "generated", stored_name)
+    elif cache.lookup(stored_name):
+        session.pop('invoice_job', None)
+        logger.info("PDF served from cache: %s", stored_name)
+    else:
+        # Render in the background; /preview polls until it is ready
+        try:
+            session['invoice_job'] = get_job_queue().enqueue(invoice, stored_name)
+        except QueueFullError:
+            flash("The server is busy generating other invoices. Please try again shortly.", "error")
+            return render_template("invoice_form.html", form=InvoiceForm()), 503
+
+        logger.info("PDF queued: %s", stored_name)
+
+    # Store filename in session for download
+    session['invoice_filename'] = filename
+    session['invoice_key'] = stored_name
+    session['invoice_data'] = {
+        'company': invoice.company,
+        'prepared_by': invoice.prepared_by,
+        'date_range': f"{invoice.start_date.strftime('%d/%m/%Y')} - {invoice.end_date.strftime('%d/%m/%Y')}",
+        'total': invoice.total_amount
+    }
+
+    flash("Invoice generated successfully!", "success")
+    return redirect(url_for("invoice.invoice_preview"))
+
+
+def _invoice_form_with_errors(header, expense_errors):
+    """
+    Build the full InvoiceForm to re-render a rejected submission.
+
+    The errors found by the header form and the compiled expense validator
+    are copied onto its fields, so the template and ``form.errors`` look
+    as if InvoiceForm had validated the submission itself.
+    """
+    form = InvoiceForm()
+    for name, errors in header.errors.items():
+        if name is not None:
+            form[name].errors = list(errors)
+    if expense_errors:
+        for entry, errors in zip(form.expenses.entries, expense_errors):
+            for name, messages in errors.items():
+                entry.form[name].errors = messages
+        form.expenses.errors = [entry.errors for entry in form.expenses.entries]
+    return form
+
+
 @invoice_bp.route("/", methods=["GET", "POST"])
 def invoice_form():
     """Display invoice form and handle submission."""
+    logger.debug("Request method: %s", request.method)
+    if request.method != "POST":
+        return render_form_page("invoice_form.html", InvoiceForm())
+
+    # Debug: Log a sampled, redacted form dump
+    form_logger.debug("Form data: %s", FormDump(request.form))
+
+    # Header fields (and CSRF) go through WTForms; expense rows through the
+    # compiled validator, which builds the ExpenseItems in the same pass
+    header = InvoiceHeaderForm()
+    with timed("form_validation"):
+        header_valid = header.validate()
+        expenses, expense_errors = validate_form_expenses(request.form)
+
+    if not header_valid or expense_errors:
+        form = _invoice_form_with_errors(header, expense_errors)
+        logger.info("Form validation failed for fields: %s", ", ".join(form.errors))
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(f"{field}: {error}", "error")
+        return render_template("invoice_form.html", form=form)
+
+    try:
+        logger.debug("Form validation passed: %d expenses", len(expenses))
+
+        # Create invoice object
+        invoice = Invoice(
+            company=header.company.data,
+            prepared_by=header.prepared_by.data,
+            employee_id=header.employee_id.data,
+            department=header.department.data,
+            start_date=header.start_date.data,
+            end_date=header.end_date.data,
+            profile=header.profile.data,
+            expenses=expenses,
+        )
+
+        out_of_range = len(invoice.totals.out_of_range)
+        if out_of_range:
+            flash(f"{out_of_range} expense(s) are dated outside the invoice period.", "warning")
+
+        return _submit_invoice(invoice)
+
+    except Exception as e:
+        logger.exception("Error during invoice generation")
+        flash(f"Error generating invoice: {str(e)}", "error")
+        return render_template("invoice_form.html", form=InvoiceForm())
+
+
+@invoice_bp.route("/import", methods=["POST"])
+def import_invoice():
+    """Generate an invoice from the form's header fields and an uploaded CSV/XLSX of expenses."""
+    import_form = ExpenseImportForm()
+    # The invoice form is re-rendered with the submitted header fields
     form = InvoiceForm()
-    
-    # Debug: Print request method and form data
-    print(f"Request method: {request.method}")
-    print(f"Form data: {request.form}")
-    print(f"Form expenses count: {len(form.expenses)}")
 
-    if form.validate_on_submit():
-        try:
-            print("Form validation passed!")
-            
-            # Build expense items from form data
-            expenses = [
-                ExpenseItem(
-                    date=item.form.date.data,
-                    category=item.form.category.data,
-                    description=item.form.description.data,
-                    note=item.form.note.data or "",
-                    amount=float(item.form.amount.data),
-                )
-                for item in form.expenses
-            ]
-            
-            print(f"Expenses built: {len(expenses)} items")
-
-            # Validate at least one expense exists
-            if not expenses:
-                flash("Please add at least one expense item.", "error")
-                return render_template("invoice_form.html", form=form)
-
-            # Create invoice object
-            invoice = Invoice(
-                company=form.company.data,
-                prepared_by=form.prepared_by.data,
-                employee_id=form.employee_id.data,
-                department=form.department.data,
-                start_date=form.start_date.data,
-                end_date=form.end_date.data,
-                expenses=expenses,
+    with timed("form_validation"):
+        valid = import_form.validate()
+    if not valid:
+        logger.info("Import form validation failed for fields: %s", ", ".join(import_form.errors))
+        for field, errors in import_form.errors.items():
+            for error in errors:
+                flash(f"{field}: {error}", "error")
+        return render_template("invoice_form.html", form=form), 400
+
+    if import_form.end_date.data < import_form.start_date.data:
+        flash(PERIOD_MESSAGE, "error")
+        return render_template("invoice_form.html", form=form), 400
+
+    upload = import_form.expenses_file.data
+    try:
+        with timed("expense_import"):
+            result = import_expenses(
+                read_upload_rows(upload.stream, upload.filename),
+                import_form.start_date.data,
+                import_form.end_date.data,
             )
+    except ValueError as e:
+        flash(f"Could not read {upload.filename}: {e}", "error")
+        return render_template("invoice_form.html", form=form), 400
 
-            # Generate custom filename: startdate_enddate_preparedby_company
-            start_str = invoice.start_date.strftime('%m%d%Y')
-            end_str = invoice.end_date.strftime('%m%d%Y')
-            prepared_by_clean = invoice.prepared_by.replace(' ', '')
-            company_clean = invoice.company.replace(' ', '')
-            filename = f"{start_str}_{end_str}_{prepared_by_clean}_{company_clean}.pdf"
-            
-            print(f"Generating PDF: {filename}")
-            
-            # Generate PDF
-            pdf_path = generate_invoice_pdf(invoice, filename)
-            
-            print(f"PDF generated at: {pdf_path}")
-            
-            # Store filename in session for download
-            session['invoice_filename'] = filename
-            session['invoice_data'] = {
-                'company': invoice.company,
-                'prepared_by': invoice.prepared_by,
-                'date_range': f"{invoice.start_date.strftime('%d/%m/%Y')} - {invoice.end_date.strftime('%d/%m/%Y')}",
-                'total': invoice.total_amount
-            }
-
-            flash("Invoice generated successfully!", "success")
-            return redirect(url_for("invoice.invoice_preview"))
-            
-        except Exception as e:
-            print(f"Error during invoice generation: {e}")
-            import traceback
-            traceback.print_exc()
-            flash(f"Error generating invoice: {str(e)}", "error")
-            return render_template("invoice_form.html", form=form)
-    
-    # Show form validation errors
-    if request.method == "POST":
-        print(f"Form validation failed. Errors: {form.errors}")
-        if form.errors:
-            for field, errors in form.errors.items():
-                for error in errors:
-                    flash(f"{field}: {error}", "error")
-
-    return render_template("invoice_form.html", form=form)
+    logger.info("Imported %s: %d rows, %d errors", upload.filename, result.rows, result.error_count)
+    if not result.rows:
+        flash(f"{upload.filename} has no expense rows.", "error")
+        return render_template("invoice_form.html", form=form), 400
+    if not result.ok:
+        flash(f"{upload.filename} was not imported: {result.error_count} error(s) found.", "error")
+        return render_template("invoice_form.html", form=form, import_result=result), 422
+
+    try:
+        invoice = Invoice(
+            company=import_form.company.data,
+            prepared_by=import_form.prepared_by.data,
+            employee_id=import_form.employee_id.data,
+            department=import_form.department.data,
+            start_date=import_form.start_date.data,
+            end_date=import_form.end_date.data,
+            profile=import_form.profile.data,
+            expenses=result.expenses,
+        )
+        return _submit_invoice(invoice)
+    except Exception as e:
+        logger.exception("Error during invoice generation")
+        flash(f"Error generating invoice: {str(e)}", "error")
+        return render_template("invoice_form.html", form=form)
 
 
 @invoice_bp.route("/preview")
@@ -125,13 +229,64 @@ def invoice_preview():
         flash("No invoice generated. Please create a new invoice.", "warning")
         return redirect(url_for("invoice.invoice_form"))
     
+    job_id = session.get('invoice_job')
+    job = get_job_queue().get(job_id) if job_id else None
+    
+    if job and job['status'] == FAILED:
+        flash(f"Error generating invoice: {job['error']}", "error")
+        session.pop('invoice_job', None)
+        session.pop('invoice_filename', None)
+        return redirect(url_for("invoice.invoice_form"))
+    
     return render_template(
         "invoice_preview.html", 
         filename=filename,
-        invoice_data=invoice_data
+        invoice_data=invoice_data,
+        job_id=job_id,
+        pending=bool(job and job['status'] in (QUEUED, RUNNING))
     )
 
 
+@invoice_bp.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Return render job status as JSON (polled by the preview page)."""
+    # Security: Only expose the session's own job
+    job = get_job_queue().get(job_id) if session.get('invoice_job') == job_id else None
+    
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    
+    return jsonify(id=job['id'], status=job['status'], error=job['error'])
+
+
+@invoice_bp.route("/jobs/stats")
+def job_stats():
+    """Return render queue depth and latency."""
+    return jsonify(get_job_queue().stats())
+
+
+@invoice_bp.route("/cache/stats")
+def cache_stats():
+    """Return render cache hit/miss counters for this process."""
+    return jsonify(get_render_cache().stats())
+
+
+@invoice_bp.route("/metrics")
+def metrics():
+    """Expose render, cache, cleanup and queue metrics for all workers (Prometheus text format)."""
+    queue_gauges = []
+    if Config.RENDER_QUEUE_ENABLED:
+        stats = get_job_queue().stats()
+        queue_gauges = [
+            ("invoice_render_queue_jobs", {"status": status}, stats[status])
+            for status in (QUEUED, RUNNING, DONE, FAILED)
+        ]
+        queue_gauges.append(("invoice_render_queue_wait_seconds_avg", {}, stats["wait_seconds_avg"]))
+        queue_gauges.append(("invoice_render_queue_render_seconds_avg", {}, stats["render_seconds_avg"]))
+    
+    return Response(registry.exposition(queue_gauges), mimetype="text/plain; version=0.0.4")
+
+
 @invoice_bp.route("/download/<filename>")
 def download_invoice(filename):
     """Download the generated invoice PDF."""
@@ -140,15 +295,132 @@ def download_invoice(filename):
         flash("Invalid download request.", "error")
         return redirect(url_for("invoice.invoice_form"))
     
-    from config import Config
-    pdf_path = os.path.join(Config.OUTPUT_DIR, filename)
+    job_id = session.get('invoice_job')
+    job = get_job_queue().get(job_id) if job_id else None
+    if job and job['status'] in (QUEUED, RUNNING):
+        return redirect(url_for("invoice.invoice_preview"))
     
-    if not os.path.exists(pdf_path):
+    pdf = get_invoice_store().open(session.get('invoice_key', filename))
+    
+    if pdf is None:
         flash("Invoice file not found.", "error")
         return redirect(url_for("invoice.invoice_form"))
     
+    with timed("send_file"):
+        return send_file(
+            pdf,
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=filename
+        )
+
+
+def _batch_auth():
+    """
+    Refuse batch requests without the BATCH_API_TOKEN bearer token.
+
+    Batches carry many employees' data, so /batch is off (404) unless the
+    token is configured, and each request must send it.
+
+    Returns:
+        The error response, or None if the request is authorized
+    """
+    if not Config.BATCH_API_TOKEN:
+        return jsonify(error="Batch rendering is not enabled"), 404
+    if not bearer_token_matches(Config.BATCH_API_TOKEN):
+        return jsonify(error="A valid batch API token is required"), 401, {"WWW-Authenticate": "Bearer"}
+    return None
+
+
+@invoice_bp.route("/batch", methods=["POST"])
+def batch_invoices():
+    """
+    Queue a batch of invoices for rendering into a ZIP of PDFs plus manifest.json.
+
+    Accepts a JSON list of invoices as the request body, a text/csv body,
+    or a multipart upload in the ``file`` field (.json or .csv). A
+    ``profile`` query or form parameter sets every invoice's output profile.
+
+    Every invoice is validated first: 400 for unreadable input, 422 with
+    per-invoice errors. Valid batches are rendered by the render workers,
+    not in the request: 202 with a status URL that links the ZIP when done.
+    """
+    denied = _batch_auth()
+    if denied:
+        return denied
+    
+    upload = request.files.get("file")
+    profile = request.values.get("profile") or None
+    
+    try:
+        if upload:
+            fmt = "csv" if upload.filename.lower().endswith(".csv") else "json"
+            data = upload.read().decode("utf-8")
+        else:
+            fmt = "csv" if request.mimetype == "text/csv" else "json"
+            data = request.get_data(as_text=True)
+        
+        with timed("form_validation"):
+            errors = batch_errors(
+                load_invoices(io.StringIO(data, newline=""), fmt, profile), Config.IMPORT_MAX_ERRORS
+            )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if errors:
+        return jsonify(error="Batch validation failed", errors=errors), 422
+    
+    try:
+        job_id = get_job_queue().enqueue_batch(data, fmt, profile, f"batch-{uuid.uuid4().hex}.zip")
+    except QueueFullError:
+        return jsonify(error="The render queue is full. Please retry shortly."), 503
+    # Without a dedicated render worker process, this worker renders it
+    if not Config.RENDER_QUEUE_ENABLED or Config.RENDER_QUEUE_INPROCESS:
+        start_render_workers()
+    
+    logger.info("Batch queued: job %s", job_id)
+    status_url = url_for("invoice.batch_status", job_id=job_id)
+    response = jsonify(job_id=job_id, status=QUEUED, status_url=status_url)
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+
+def _batch_job(job_id: str):
+    job = get_job_queue().get(job_id)
+    return job if job is not None and job["kind"] == BATCH else None
+
+
+@invoice_bp.route("/batch/<job_id>")
+def batch_status(job_id):
+    """Return the status of a queued batch, with the ZIP's URL once it is rendered."""
+    denied = _batch_auth()
+    if denied:
+        return denied
+    
+    job = _batch_job(job_id)
+    if job is None:
+        return jsonify(error="Unknown batch"), 404
+    body = {"id": job["id"], "status": job["status"], "error": job["error"]}
+    if job["status"] == DONE:
+        body["download_url"] = url_for("invoice.batch_download", job_id=job_id)
+    return jsonify(body)
+
+
+@invoice_bp.route("/batch/<job_id>/invoices.zip")
+def batch_download(job_id):
+    """Download a rendered batch."""
+    denied = _batch_auth()
+    if denied:
+        return denied
+    
+    job = _batch_job(job_id)
+    archive = get_invoice_store().open(job["filename"]) if job and job["status"] == DONE else None
+    if archive is None:
+        return jsonify(error="Unknown or unfinished batch"), 404
+    
     return send_file(
-        pdf_path,
+        archive,
+        mimetype="application/zip",
         as_attachment=True,
-        download_name=filename
+        download_name="invoices.zip"
     )
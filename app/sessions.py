@@ -0,0 +1,237 @@
+"""
+Server-side session storage.
+The session cookie only carries a random session ID; session data lives in
+a SQLite database shared by all gunicorn workers (or an in-process dict for
+single-process development), so invoice preview data is no longer
+serialized, signed and sent with every request.
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from config import Config
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that records modifications, identified by ``sid``."""
+
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+
+class SqliteSessionStore:
+    """Sessions in a SQLite database, safe to share between processes."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are per-thread)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, sid: str):
+        """Return the serialized session, or None if unknown or expired."""
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, sid: str, data: str, expires_at: float) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+            (sid, data, expires_at),
+        )
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        self._connection().execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, sid))
+
+    def delete(self, sid: str) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def references(self, value: str) -> bool:
+        """Whether any live session's data contains value (e.g. a stored PDF's name)."""
+        row = self._connection().execute(
+            "SELECT 1 FROM sessions WHERE expires_at > ? AND instr(data, ?) > 0 LIMIT 1", (time.time(), value)
+        ).fetchone()
+        return row is not None
+
+    def purge_expired(self) -> int:
+        """Delete all expired sessions in one statement. Returns the count."""
+        return self._connection().execute(
+            "DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+
+
+class MemorySessionStore:
+    """
+    Sessions in a per-process dict.
+
+    Not shared between gunicorn workers: use it with a single worker
+    process or sticky routing, like the memory PDF store.
+    """
+
+    def __init__(self):
+        self._sessions = {}  # sid -> (expires_at, data)
+        self._lock = threading.Lock()
+
+    def get(self, sid: str):
+        entry = self._sessions.get(sid)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def set(self, sid: str, data: str, expires_at: float) -> None:
+        with self._lock:
+            self._sessions[sid] = (expires_at, data)
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (expires_at, entry[1])
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def references(self, value: str) -> bool:
+        """Whether any live session's data contains value (e.g. a stored PDF's name)."""
+        now = time.time()
+        with self._lock:
+            return any(expires_at > now and value in data for expires_at, data in self._sessions.values())
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface keeping session data in a session store.
+
+    Sessions expire PERMANENT_SESSION_LIFETIME after they were last written
+    (or last used, for permanent sessions refreshed on each request).
+    Unknown or expired IDs get a fresh ID, so clients cannot choose theirs.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                try:
+                    return ServerSideSession(self.serializer.loads(data), sid=sid)
+                except ValueError:
+                    pass
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.modified and session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite)
+                response.vary.add("Cookie")
+            return
+
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        new_sid = session.sid is None
+        if new_sid:
+            session.sid = secrets.token_urlsafe(32)
+        if session.modified or new_sid:
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        elif self.should_set_cookie(app, session):
+            self.store.touch(session.sid, expires_at)
+
+        if new_sid or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+            response.vary.add("Cookie")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """
+    Return the process-wide session store for Config.SESSION_TYPE.
+
+    Returns:
+        SqliteSessionStore | MemorySessionStore | None: None for 'cookie'
+        (Flask's signed cookie sessions)
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if Config.SESSION_TYPE == "sqlite":
+                _store = SqliteSessionStore(Config.SESSION_DB)
+            elif Config.SESSION_TYPE == "memory":
+                _store = MemorySessionStore()
+            elif Config.SESSION_TYPE != "cookie":
+                raise ValueError(f"Unknown SESSION_TYPE: {Config.SESSION_TYPE!r}")
+        return _store
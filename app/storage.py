@@ -0,0 +1,245 @@
+"""
+Storage backends for rendered invoice PDFs.
+Keeps generated documents between the form POST and the download request.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from app.cleanup import ExpiryIndex
+from app.metrics import timed
+from app.pdf_generator import render_invoice_pdf
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Write a file so readers never see it partially written.
+
+    The data goes to a uniquely named temporary file next to ``path`` first,
+    so concurrent writers of the same path (threads or processes) never
+    share a temporary file; the last complete write wins. ``data`` is bytes
+    or a binary file object, which is copied from its current position.
+    """
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            if hasattr(data, "read"):
+                shutil.copyfileobj(data, temp_file)
+            else:
+                temp_file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class FileInvoiceStore:
+    """Store PDFs as files in Config.OUTPUT_DIR (the original behaviour)."""
+
+    def __init__(self):
+        self.index = ExpiryIndex(Config.CLEANUP_INDEX_FILE)
+        self._seeded = False
+
+    def save(self, filename: str, invoice) -> bytes:
+        """Render the invoice to OUTPUT_DIR under the given filename; return the PDF."""
+        pdf = render_invoice_pdf(invoice)
+        self.put(filename, pdf)
+        return pdf
+
+    def put(self, filename: str, data) -> None:
+        """Store an already rendered document (bytes or a binary file) in OUTPUT_DIR."""
+        with timed("store_write"):
+            os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
+            write_atomic(os.path.join(Config.OUTPUT_DIR, filename), data)
+            self.index.add(filename)
+
+    def open(self, filename: str):
+        """
+        Return something send_file can serve for the filename.
+
+        Returns:
+            str | None: Path to the PDF, or None if it no longer exists
+        """
+        pdf_path = os.path.join(Config.OUTPUT_DIR, filename)
+        if not os.path.exists(pdf_path):
+            return None
+        return pdf_path
+
+    def size(self, filename: str):
+        """Return the stored PDF's size in bytes, or None if it does not exist."""
+        try:
+            return os.path.getsize(os.path.join(Config.OUTPUT_DIR, filename))
+        except OSError:
+            return None
+
+    def touch(self, filename: str) -> None:
+        """Restart the PDF's expiry clock (e.g. when it is served from cache)."""
+        try:
+            os.utime(os.path.join(Config.OUTPUT_DIR, filename))
+        except OSError:
+            return
+        self.index.add(filename)
+
+    def delete(self, filename: str) -> None:
+        """Remove the stored PDF if present."""
+        file_path = os.path.join(Config.OUTPUT_DIR, filename)
+        if os.path.exists(file_path):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    def purge_expired(self, max_age_seconds: int) -> tuple:
+        """
+        Remove PDFs older than max_age_seconds using the expiry index.
+
+        Returns:
+            tuple: (files removed, bytes reclaimed)
+        """
+        if not self._seeded:
+            # Pick up files written before the index existed
+            self.index.seed(Config.OUTPUT_DIR)
+            self._seeded = True
+
+        cutoff = time.time() - max_age_seconds
+        removed, reclaimed = 0, 0
+        for filename in self.index.pop_expired(cutoff):
+            file_path = os.path.join(Config.OUTPUT_DIR, filename)
+            try:
+                stat = os.stat(file_path)
+                # Re-generated under the same name: its newer entry handles it
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(file_path)
+            except OSError:
+                continue  # Already deleted by session cleanup or in use
+            removed += 1
+            reclaimed += stat.st_size
+        return removed, reclaimed
+
+
+class MemoryInvoiceStore:
+    """
+    Keep rendered PDFs in process memory without any filesystem round trip.
+
+    Entries are bounded by count and total size (oldest evicted first) and
+    expire after Config.CLEANUP_MAX_AGE seconds.
+    """
+
+    def __init__(self, max_items: int, max_bytes: int, max_age_seconds: int):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._entries = OrderedDict()  # filename -> (created_at, pdf bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def save(self, filename: str, invoice) -> bytes:
+        """Render the invoice in memory and keep it under the given filename; return the PDF."""
+        pdf = render_invoice_pdf(invoice)
+        self.put(filename, pdf)
+        return pdf
+
+    def put(self, filename: str, data) -> None:
+        """Store an already rendered document (bytes or a binary file)."""
+        if hasattr(data, "read"):
+            data = data.read()
+        with timed("store_write"), self._lock:
+            self._discard(filename)
+            self._entries[filename] = (time.time(), data)
+            self._size += len(data)
+            while self._entries and (
+                len(self._entries) > self.max_items or self._size > self.max_bytes
+            ):
+                self._discard(next(iter(self._entries)))
+
+    def open(self, filename: str):
+        """
+        Return a fresh in-memory stream for the filename.
+
+        Returns:
+            io.BytesIO | None: PDF stream, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return None
+            created_at, data = entry
+            if time.time() - created_at > self.max_age_seconds:
+                self._discard(filename)
+                return None
+        return io.BytesIO(data)
+
+    def size(self, filename: str):
+        """Return the stored PDF's size in bytes, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None or time.time() - entry[0] > self.max_age_seconds:
+                return None
+            return len(entry[1])
+
+    def touch(self, filename: str) -> None:
+        """Restart the PDF's expiry clock and mark it most recently used."""
+        with self._lock:
+            entry = self._entries.pop(filename, None)
+            if entry is not None:
+                self._entries[filename] = (time.time(), entry[1])
+
+    def delete(self, filename: str) -> None:
+        """Drop the stored PDF if present."""
+        with self._lock:
+            self._discard(filename)
+
+    def purge_expired(self, max_age_seconds: int) -> tuple:
+        """
+        Drop PDFs older than max_age_seconds.
+
+        Returns:
+            tuple: (entries dropped, bytes reclaimed)
+        """
+        cutoff = time.time() - max_age_seconds
+        removed, reclaimed = 0, 0
+        with self._lock:
+            # Entries are kept in insertion order, so stop at the first fresh one
+            while self._entries:
+                filename, (created_at, data) = next(iter(self._entries.items()))
+                if created_at > cutoff:
+                    break
+                self._discard(filename)
+                removed += 1
+                reclaimed += len(data)
+        return removed, reclaimed
+
+    def _discard(self, filename: str) -> None:
+        entry = self._entries.pop(filename, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_invoice_store():
+    """Return the process-wide invoice store selected by Config.PDF_STORAGE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if Config.PDF_STORAGE == "memory":
+                    _store = MemoryInvoiceStore(
+                        Config.MEMORY_STORE_MAX_ITEMS,
+                        Config.MEMORY_STORE_MAX_BYTES,
+                        Config.CLEANUP_MAX_AGE,
+                    )
+                elif Config.PDF_STORAGE == "file":
+                    _store = FileInvoiceStore()
+                else:
+                    raise ValueError(f"Unknown PDF_STORAGE: {Config.PDF_STORAGE!r}")
+    return _store
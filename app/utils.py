@@ -3,10 +3,12 @@ Utility functions for invoice management.
 Handles date formatting, file cleanup, and session management.
 """
 
+import hmac
+import multiprocessing
 import os
-import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
-from flask import session
+from flask import request, session
 from config import Config
 
 
@@ -15,54 +17,54 @@ def format_date(value: date) -> str:
     return value.strftime("%d/%m/%Y")
 
 
-def cleanup_old_invoices(max_age_seconds: int = 3600):
+def invoice_filename(invoice) -> str:
+    """Build the download filename: startdate_enddate_preparedby_company.pdf"""
+    start_str = invoice.start_date.strftime('%m%d%Y')
+    end_str = invoice.end_date.strftime('%m%d%Y')
+    prepared_by_clean = invoice.prepared_by.replace(' ', '')
+    company_clean = invoice.company.replace(' ', '')
+    return f"{start_str}_{end_str}_{prepared_by_clean}_{company_clean}.pdf"
+
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor:
     """
-    Remove invoice PDFs older than specified age.
-    
-    Args:
-        max_age_seconds: Maximum age of files to keep (default: 1 hour)
+    Create a process pool whose workers are started by a forkserver.
+
+    Pools are created in threaded processes (gthread workers, render and
+    scheduler threads). Forking those directly can copy a lock held by
+    another thread into a child, which then hangs; the forkserver forks
+    from a clean single-threaded process instead. It imports the PDF
+    pipeline once, so its children start with ReportLab loaded.
     """
-    try:
-        if not os.path.exists(Config.OUTPUT_DIR):
-            return
-        
-        current_time = time.time()
-        
-        for filename in os.listdir(Config.OUTPUT_DIR):
-            if filename.endswith('.pdf'):
-                file_path = os.path.join(Config.OUTPUT_DIR, filename)
-                
-                # Check file age
-                file_age = current_time - os.path.getmtime(file_path)
-                
-                if file_age > max_age_seconds:
-                    try:
-                        os.remove(file_path)
-                    except OSError:
-                        pass  # Skip if file is in use or can't be deleted
-    except Exception:
-        pass  # Silently fail to avoid breaking the app
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["app.pdf_generator"])  # No effect once the forkserver runs
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def bearer_token_matches(expected: str) -> bool:
+    """Whether the request carries ``Authorization: Bearer <expected>`` (compared in constant time)."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), expected.encode())
 
 
 def cleanup_session_invoice():
     """
-    Clean up invoice file associated with current session.
+    Clear the invoice associated with current session.
     Called when user navigates back to form or refreshes.
+    
+    The PDF itself is content-addressed and may be shared with identical
+    submissions, so it stays in the render cache until it expires.
     """
     try:
         filename = session.get('invoice_filename')
         
         if filename:
-            file_path = os.path.join(Config.OUTPUT_DIR, filename)
-            
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except OSError:
-                    pass
-            
             # Clear session data
             session.pop('invoice_filename', None)
+            session.pop('invoice_key', None)
+            session.pop('invoice_job', None)
             session.pop('invoice_data', None)
     except Exception:
         pass
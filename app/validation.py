@@ -0,0 +1,294 @@
+"""
+Fast, schema-driven validation of expense rows.
+The rules (required fields, category choices, minimum amount and their
+messages) are read once from ExpenseForm's field definitions and compiled
+into one check per field, so rows from a form submission or an uploaded
+file are validated and turned into ExpenseItems in a single pass without
+instantiating a WTForms sub-form per row.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from wtforms import DateField, DecimalField, SelectField
+from wtforms.validators import DataRequired, NumberRange
+from app.forms import ExpenseForm, InvoiceHeaderForm
+from app.models import EXPENSE_FIELDS, ExpenseItem
+
+
+# Messages of the WTForms validators and fields used by ExpenseForm
+REQUIRED_MESSAGE = "This field is required."
+CHOICE_MESSAGE = "Not a valid choice."
+DATE_MESSAGE = "Not a valid date value."
+DECIMAL_MESSAGE = "Not a valid decimal value."
+PERIOD_MESSAGE = "End date must be on or after the start date."
+
+HEADER_FIELDS = ("company", "prepared_by", "employee_id", "department", "start_date", "end_date")
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _parse_date(value):
+    """Parse a %Y-%m-%d string (DateField's format) or pass a date through."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str):
+        return None
+    if len(value) == 10 and value[4] == "-" and value[7] == "-":
+        try:
+            return date.fromisoformat(value)  # Fast path for the HTML date input
+        except ValueError:
+            return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _parse_decimal(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        amount = Decimal(value if isinstance(value, str) else str(value))
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+def compile_check(unbound, lenient: bool = False, invalid_as_required: bool = False):
+    """
+    Build the check for one form field from its definition.
+
+    Args:
+        unbound: The form's UnboundField (field class plus constructor arguments)
+        lenient: Trim strings and accept thousands separators in amounts
+        invalid_as_required: Report unparseable dates and amounts of
+            required fields as missing, like WTForms' DataRequired
+
+    Returns:
+        callable: value -> (converted value, error message or None)
+    """
+    validators = unbound.kwargs.get("validators") or ()
+    required = any(isinstance(validator, DataRequired) for validator in validators)
+
+    if issubclass(unbound.field_class, DateField):
+        invalid = REQUIRED_MESSAGE if required and invalid_as_required else DATE_MESSAGE
+
+        def check(value):
+            if _blank(value):
+                return None, REQUIRED_MESSAGE if required else None
+            parsed = _parse_date(value.strip() if lenient and isinstance(value, str) else value)
+            return parsed, invalid if parsed is None else None
+        return check
+
+    if issubclass(unbound.field_class, DecimalField):
+        invalid = REQUIRED_MESSAGE if required and invalid_as_required else DECIMAL_MESSAGE
+        ranges = [
+            (Decimal(str(v.min)) if v.min is not None else None,
+             Decimal(str(v.max)) if v.max is not None else None,
+             v.message)
+            for v in validators if isinstance(v, NumberRange)
+        ]
+
+        def check(value):
+            if _blank(value):
+                return None, REQUIRED_MESSAGE if required else None
+            if lenient and isinstance(value, str):
+                value = value.strip().replace(",", "")
+            amount = _parse_decimal(value)
+            if amount is None:
+                return None, invalid
+            if required and not amount:
+                return None, REQUIRED_MESSAGE
+            for low, high, message in ranges:
+                if (low is not None and amount < low) or (high is not None and amount > high):
+                    return None, message or f"Number must be between {low} and {high}."
+            return float(amount), None
+        return check
+
+    if issubclass(unbound.field_class, SelectField):
+        choices = frozenset(str(value) for value, _ in unbound.kwargs["choices"])
+
+        def check(value):
+            text = "" if value is None else str(value)
+            if lenient:
+                text = text.strip()
+            if required and not text.strip():
+                return None, REQUIRED_MESSAGE
+            return text, None if text in choices else CHOICE_MESSAGE
+        return check
+
+    def check(value):
+        text = "" if value is None else str(value)
+        if lenient:
+            text = text.strip()
+        if required and not text.strip():
+            return None, REQUIRED_MESSAGE
+        return text, None
+    return check
+
+
+class ExpenseRowValidator:
+    """
+    Convert raw row values into ExpenseItems using ExpenseForm's rules.
+
+    Values may be strings (form data, CSV) or native cell values (XLSX
+    dates and numbers). When an invoice period is given, expense dates
+    must also fall within it.
+
+    This base class is lenient, for uploaded files: values are trimmed,
+    thousands separators are accepted and unparseable dates and amounts
+    get specific messages. StrictExpenseValidator uses values exactly as
+    given and FormExpenseValidator also matches WTForms' messages.
+    """
+
+    lenient = True
+    # DataRequired reports unparseable values as missing in WTForms
+    invalid_as_required = False
+
+    def __init__(self, start_date: date = None, end_date: date = None, form_class=ExpenseForm):
+        self.checks = [(name, self._compile(getattr(form_class, name))) for name in EXPENSE_FIELDS]
+        self.start_date = start_date
+        self.end_date = end_date
+        if start_date is not None and end_date is not None:
+            self.range_message = (
+                f"Date must be between {start_date.strftime('%d/%m/%Y')} "
+                f"and {end_date.strftime('%d/%m/%Y')}."
+            )
+        else:
+            self.start_date = self.end_date = None
+
+    def _compile(self, unbound):
+        return compile_check(unbound, self.lenient, self.invalid_as_required)
+
+    def validate(self, row) -> tuple:
+        """
+        Validate one row.
+
+        Args:
+            row: Mapping of field name (date, category, description, note,
+                amount) to raw value
+
+        Returns:
+            tuple: (ExpenseItem or None, list of (field, message) errors)
+        """
+        values, errors = [], []
+        for name, check in self.checks:
+            value, message = check(row.get(name))
+            if message is not None:
+                errors.append((name, message))
+            values.append(value)
+
+        if self.start_date is not None and values[0] is not None:
+            if not self.start_date <= values[0] <= self.end_date:
+                errors.insert(0, ("date", self.range_message))
+
+        if errors:
+            return None, errors
+        return ExpenseItem(*values), errors
+
+
+class StrictExpenseValidator(ExpenseRowValidator):
+    """ExpenseRowValidator that takes values as given, for Invoices built from JSON."""
+
+    lenient = False
+
+
+class FormExpenseValidator(StrictExpenseValidator):
+    """ExpenseRowValidator with WTForms' exact behaviour, for form submissions."""
+
+    invalid_as_required = True
+
+
+def invoice_errors(invoice, max_errors: int = None, within_period: bool = False) -> list:
+    """
+    Check an Invoice built from untrusted data (e.g. the JSON API) against
+    the rules of InvoiceHeaderForm and ExpenseForm.
+
+    Args:
+        invoice: Invoice, e.g. from Invoice.from_dict; its expenses may be
+            any iterable, which is consumed once
+        max_errors: Stop after this many errors (default: no limit)
+        within_period: Also require expense dates within the invoice
+            period, like file imports
+
+    Returns:
+        list: ``{"field": ..., "message": ...}`` dicts with fields such as
+        ``company`` or ``expenses[3].amount``; empty if the invoice is valid
+    """
+    errors = []
+    for name in HEADER_FIELDS:
+        check = compile_check(getattr(InvoiceHeaderForm, name))
+        _, message = check(getattr(invoice, name))
+        if message is not None:
+            errors.append({"field": name, "message": message})
+    period_valid = invoice.end_date >= invoice.start_date
+    if not period_valid:
+        errors.append({"field": "end_date", "message": PERIOD_MESSAGE})
+
+    if within_period and period_valid:
+        validator = StrictExpenseValidator(invoice.start_date, invoice.end_date)
+    else:
+        validator = StrictExpenseValidator()
+    count = 0
+    for index, item in enumerate(invoice.expenses):
+        count += 1
+        if max_errors is not None and len(errors) >= max_errors:
+            break
+        _, row_errors = validator.validate({name: getattr(item, name) for name in EXPENSE_FIELDS})
+        for name, message in row_errors:
+            errors.append({"field": f"expenses[{index}].{name}", "message": message})
+    if not count:
+        errors.append({"field": "expenses", "message": "At least one expense is required."})
+    return errors[:max_errors]
+
+
+def read_form_rows(formdata, prefix: str = "expenses") -> list:
+    """
+    Group ``<prefix>-<index>-<field>`` values of a submitted form into rows.
+
+    Rows are ordered by index, as FieldList orders its entries; like
+    ``FieldList(min_entries=1)`` a submission without rows yields one
+    empty row.
+
+    Returns:
+        list: Row dicts of field name to submitted value
+    """
+    rows = {}
+    start = len(prefix) + 1
+    fields = frozenset(EXPENSE_FIELDS)
+    for key, value in formdata.items():
+        if key.startswith(prefix) and key[start - 1:start] == "-":
+            index, _, name = key[start:].partition("-")
+            if index.isdigit():
+                row = rows.setdefault(int(index), {})
+                if name in fields:
+                    row[name] = value
+    return [rows[index] for index in sorted(rows)] or [{}]
+
+
+def validate_form_expenses(formdata, prefix: str = "expenses") -> tuple:
+    """
+    Validate the expense rows of a submitted InvoiceForm without building it.
+
+    Returns:
+        tuple: (list of ExpenseItem, errors) where errors is empty when all
+        rows are valid, and otherwise has one ``{field: [messages]}`` dict
+        per row, matching ``form.expenses.errors``
+    """
+    validator = FormExpenseValidator()
+    expenses, errors, failed = [], [], False
+    for row in read_form_rows(formdata, prefix):
+        item, row_errors = validator.validate(row)
+        row_error_map = {}
+        for name, message in row_errors:
+            row_error_map.setdefault(name, []).append(message)
+        errors.append(row_error_map)
+        if item is None:
+            failed = True
+        else:
+            expenses.append(item)
+    return expenses, errors if failed else []
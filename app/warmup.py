@@ -0,0 +1,135 @@
+"""
+Start-up warm-up of the PDF pipeline.
+ReportLab, font metrics, paragraph styles, company logos and the render
+code paths are all initialized lazily, so without a warm-up the first
+invoice in each worker pays for them. Under gunicorn the app is preloaded,
+so warming up in create_app does this work once in the master and every
+forked worker shares the result copy-on-write.
+"""
+
+import logging
+import os
+import time
+from datetime import date
+from flask import g
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Fonts used by the invoice styles, table styles and page numbers
+WARMUP_FONTS = ("Helvetica", "Helvetica-Bold")
+
+_report = None
+_first_request_pid = None
+
+
+def _sample_invoice(company: str):
+    """Return a small throwaway invoice touching every table column."""
+    from app.models import ExpenseItem, Invoice
+
+    day = date(2026, 1, 1)
+    return Invoice(
+        company=company,
+        prepared_by="Warm-up",
+        employee_id="WARMUP",
+        department="HR",
+        start_date=day,
+        end_date=day,
+        expenses=[
+            ExpenseItem(day, "Travel", "Warm-up expense with a description long enough to wrap", "Note", 1234.5),
+            ExpenseItem(day, "Meals", "Lunch", "", 99.0),
+        ],
+    )
+
+
+def warm_up(app=None) -> dict:
+    """
+    Initialize the PDF pipeline once per process.
+
+    Imports ReportLab and the PDF modules, loads the font metrics, builds
+    the InvoiceTemplate (styles and decoded logo) of every company offered
+    by the form and renders one throwaway invoice per table engine. The
+    warm-up render is not counted in the render metrics.
+
+    Args:
+        app: Flask app whose Jinja templates are compiled as well
+
+    Returns:
+        dict: Seconds spent per phase (imports, fonts, templates, render,
+        pages, total)
+    """
+    global _report
+    if _report is not None:
+        return _report
+
+    report = {}
+    started = phase_started = time.perf_counter()
+
+    def phase(name):
+        nonlocal phase_started
+        now = time.perf_counter()
+        report[name] = now - phase_started
+        phase_started = now
+
+    from reportlab.pdfbase import pdfmetrics
+    from app.forms import InvoiceHeaderForm
+    from app.pdf_generator import get_invoice_template, render_invoice_pdf
+    phase("imports")
+
+    for font in WARMUP_FONTS:
+        pdfmetrics.getFont(font)
+        pdfmetrics.stringWidth("0123456789 Warm-up", font, 10)
+    phase("fonts")
+
+    companies = [value for value, _ in InvoiceHeaderForm.company.kwargs["choices"]]
+    for company in companies:
+        get_invoice_template(company)
+    phase("templates")
+
+    for engine in ("platypus", "fast"):
+        render_invoice_pdf(_sample_invoice(companies[0]), engine)
+    # The throwaway renders are not real traffic
+    registry.reset()
+    phase("render")
+
+    if app is not None:
+        for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith(".html")):
+            app.jinja_env.get_template(name)
+        phase("pages")
+
+    report["total"] = time.perf_counter() - started
+    for name, seconds in report.items():
+        registry.set("invoice_warmup_seconds", seconds, phase=name)
+    logger.info(
+        "Warm-up done in %.0f ms (%s)",
+        report["total"] * 1000,
+        ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in report.items() if name != "total"),
+    )
+    _report = report
+    return report
+
+
+def record_first_request(app) -> None:
+    """
+    Report how long the first request of each process takes.
+
+    Sets the ``invoice_first_request_seconds`` gauge (the slowest live
+    worker's first request) and logs it, to check that warm-up worked.
+    """
+    def start_timer():
+        if _first_request_pid != os.getpid():
+            g.first_request_started = time.perf_counter()
+
+    def stop_timer(response):
+        global _first_request_pid
+        started = g.pop("first_request_started", None)
+        if started is not None and _first_request_pid != os.getpid():
+            _first_request_pid = os.getpid()
+            seconds = time.perf_counter() - started
+            registry.set("invoice_first_request_seconds", seconds)
+            registry.flush()
+            logger.info("First request in this worker took %.1f ms", seconds * 1000)
+        return response
+
+    app.before_request(start_timer)
+    app.after_request(stop_timer)
@@ -0,0 +1 @@
+"""Performance benchmarks for the invoice generator (run with ``python -m benchmarks.<name>``)."""
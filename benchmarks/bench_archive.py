@@ -0,0 +1,97 @@
+"""
+Benchmark invoice archive lookups at scale.
+
+Fills a temporary archive with synthetic invoices (monthly periods over
+several years, a few thousand employees, both companies and departments,
+5-15 expenses each) through InvoiceArchive.add, then times typical
+auditor queries: first and deep pages with totals, by employee, company,
+department, period and category. Reports p50/p95 latency per query.
+
+Usage:
+    python -m benchmarks.bench_archive [invoices] [employees]   (default: 100000 invoices, 2000 employees)
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+from app.models import Invoice
+from benchmarks.sample_data import CATEGORIES, make_expenses
+
+ITERATIONS = 50
+FIRST_YEAR = 2020
+
+
+def make_archive_invoice(index: int, employees: int) -> Invoice:
+    """Return the index-th synthetic invoice: one month of one employee's expenses."""
+    month = index // employees
+    start = date(FIRST_YEAR + month // 12 % 10, month % 12 + 1, 1)
+    next_month = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    end = date.fromordinal(next_month.toordinal() - 1)
+    employee = index % employees
+    return Invoice(
+        company=("BitApps", "BitCode")[employee % 2],
+        prepared_by=f"Employee {employee}",
+        employee_id=f"EMP{employee:05d}",
+        department=("Private", "HR")[employee // 2 % 2],
+        start_date=start,
+        end_date=end,
+        expenses=make_expenses(5 + index % 11, start=start),
+    )
+
+
+def fill(archive, invoices: int, employees: int) -> float:
+    """Archive ``invoices`` synthetic invoices; return the seconds taken."""
+    started = time.perf_counter()
+    for index in range(invoices):
+        invoice = make_archive_invoice(index, employees)
+        # Small distinct stand-ins for the PDFs: blob handling without rendering
+        archive.add(invoice, b"%%PDF-1.4 synthetic %d" % index, key=f"{index:064x}")
+    return time.perf_counter() - started
+
+
+def measure(query) -> tuple:
+    """Return (p50 ms, p95 ms, result) of a query callable."""
+    timings = []
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        result = query()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)], result
+
+
+def main(invoices: int = 100000, employees: int = 2000):
+    from app.archive import InvoiceArchive
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = InvoiceArchive(f"{directory}/archive.sqlite3", f"{directory}/blobs")
+        elapsed = fill(archive, invoices, employees)
+        print(f"Archived {invoices} invoices in {elapsed:.1f} s ({invoices / elapsed:.0f}/s)")
+
+        deep = archive.query()
+        for _ in range(20):
+            deep = archive.query(cursor=deep["next_cursor"])
+        cases = [
+            ("all, first page", {}),
+            ("all, page 21", {"cursor": deep["next_cursor"]}),
+            ("employee", {"employee_id": f"EMP{employees // 2:05d}"}),
+            ("company", {"company": "BitCode"}),
+            ("department + period", {"department": "HR", "period_from": f"{FIRST_YEAR + 1}-03-01",
+                                     "period_to": f"{FIRST_YEAR + 1}-05-31"}),
+            ("employee + period", {"employee_id": "EMP00007", "period_from": f"{FIRST_YEAR}-01-01",
+                                   "period_to": f"{FIRST_YEAR}-12-31"}),
+            ("category", {"category": CATEGORIES[3]}),
+            ("category + company", {"category": CATEGORIES[3], "company": "BitApps"}),
+        ]
+
+        print(f"{'query':<22}{'matches':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for label, filters in cases:
+            p50, p95, result = measure(lambda: archive.query(**filters))
+            print(f"{label:<22}{result['totals']['invoices']:>9}{p50:>9.2f}{p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
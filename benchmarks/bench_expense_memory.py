@@ -0,0 +1,83 @@
+"""
+Benchmark the memory held by an invoice's expenses: a list of ExpenseItem
+against a column-oriented ExpenseTable.
+
+Rows are parsed from an in-memory CSV, as in a batch import, so every row
+gets its own string objects. Memory is measured with tracemalloc; each case
+runs in a fresh process.
+
+Usage:
+    python -m benchmarks.bench_expense_memory [rows ...]   (default: 1000 10000 100000)
+"""
+
+import csv
+import gc
+import io
+import multiprocessing
+import sys
+import time
+import tracemalloc
+
+from benchmarks.sample_data import make_expenses
+
+
+def _csv_text(rows: int) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["date", "category", "description", "note", "amount"])
+    writer.writeheader()
+    for item in make_expenses(rows, description_words=4):
+        writer.writerow(item.to_dict())
+    return buffer.getvalue()
+
+
+def _run_case(container: str, rows: int, results) -> None:
+    import app.aggregation  # noqa: F401  (keep the NumPy import out of the timings)
+    from app.models import ExpenseItem, ExpenseTable
+    from benchmarks.sample_data import make_invoice
+
+    text = _csv_text(rows)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = (ExpenseItem.from_dict(row) for row in csv.DictReader(io.StringIO(text)))
+    expenses = ExpenseTable(items) if container == "table" else list(items)
+    load_seconds = time.perf_counter() - start
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    invoice = make_invoice(0)
+    invoice.expenses = expenses
+    start = time.perf_counter()
+    invoice.total_amount
+    total_seconds = time.perf_counter() - start
+    results.put((held, load_seconds, total_seconds))
+
+
+def measure(container: str, rows: int) -> tuple:
+    """Return (bytes held, load seconds, first total_amount seconds)."""
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(container, rows, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main(row_counts=(1000, 10000, 100000)):
+    print(f"{'rows':>7} {'container':>9} {'MB':>8} {'bytes/row':>10} {'load s':>8} {'total ms':>9}")
+    for rows in row_counts:
+        held = {}
+        for container in ("list", "table"):
+            held[container], load_seconds, total_seconds = measure(container, rows)
+            print(
+                f"{rows:>7} {container:>9} {held[container] / 1024 / 1024:>8.2f} "
+                f"{held[container] / rows:>10.0f} {load_seconds:>8.3f} {total_seconds * 1000:>9.2f}"
+            )
+        print(f"{'':>7} {'saving':>9} {held['list'] / held['table']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]]
+    main(counts or (1000, 10000, 100000))
@@ -0,0 +1,101 @@
+"""
+Benchmark POST validation of the invoice form: WTForms InvoiceForm (one
+ExpenseForm per row) against the header form plus the compiled expense
+validator used by routes.invoice_form.
+
+Both paths include building the ExpenseItems from the validated data.
+
+Usage:
+    python -m benchmarks.bench_form_validation [rows ...]   (default: 10 100 1000)
+"""
+
+import statistics
+import sys
+import time
+
+from werkzeug.datastructures import MultiDict
+
+
+def form_data(rows: int) -> MultiDict:
+    """Return a valid submission with ``rows`` expense rows."""
+    data = {
+        "company": "BitApps",
+        "prepared_by": "John Doe",
+        "employee_id": "EMP001",
+        "department": "HR",
+        "start_date": "2026-01-01",
+        "end_date": "2026-12-31",
+    }
+    for i in range(rows):
+        data.update({
+            f"expenses-{i}-date": f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            f"expenses-{i}-category": "Travel",
+            f"expenses-{i}-description": "Flight booking",
+            f"expenses-{i}-note": "HR meeting" if i % 3 == 0 else "",
+            f"expenses-{i}-amount": f"{1000 + (i * 37) % 9000}.50",
+        })
+    return MultiDict(data)
+
+
+def validate_wtforms():
+    from app.forms import InvoiceForm
+    from app.models import ExpenseItem
+
+    form = InvoiceForm()
+    assert form.validate_on_submit(), form.errors
+    return [
+        ExpenseItem(
+            date=item.form.date.data,
+            category=item.form.category.data,
+            description=item.form.description.data,
+            note=item.form.note.data or "",
+            amount=float(item.form.amount.data),
+        )
+        for item in form.expenses
+    ]
+
+
+def validate_compiled():
+    from flask import request
+    from app.forms import InvoiceHeaderForm
+    from app.validation import validate_form_expenses
+
+    header = InvoiceHeaderForm()
+    assert header.validate(), header.errors
+    expenses, errors = validate_form_expenses(request.form)
+    assert not errors, errors
+    return expenses
+
+
+def measure(app, data: MultiDict, validate, iterations: int) -> float:
+    """Return the median milliseconds of ``validate`` on a POST of ``data``."""
+    timings = []
+    for _ in range(iterations):
+        with app.test_request_context("/", method="POST", data=data):
+            start = time.perf_counter()
+            validate()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main(row_counts=(10, 100, 1000)):
+    from app import create_app
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+
+    print(f"{'rows':>6} {'wtforms ms':>11} {'compiled ms':>12} {'speedup':>8}")
+    for rows in row_counts:
+        data = form_data(rows)
+        with app.test_request_context("/", method="POST", data=data):
+            assert validate_wtforms() == validate_compiled()
+
+        iterations = max(5, 2000 // rows)
+        wtforms_ms = measure(app, data, validate_wtforms, iterations)
+        compiled_ms = measure(app, data, validate_compiled, iterations)
+        print(f"{rows:>6} {wtforms_ms:>11.2f} {compiled_ms:>12.2f} {wtforms_ms / compiled_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]]
+    main(counts or (10, 100, 1000))
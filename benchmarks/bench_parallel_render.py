@@ -0,0 +1,113 @@
+"""
+Benchmark intra-invoice parallel rendering against the serial render.
+
+Renders one very large invoice (BitCode, so every page is watermarked)
+serially and with app.parallel_render at several worker counts, and
+reports the wall-clock time and speedup next to the number of CPU cores:
+with more workers than cores the parts only take turns.
+
+Each parallel PDF is checked against the serial one: same page count and
+the same text on every page, plus pixel-identical rasterized pages at the
+start, the part boundaries and the end when PyMuPDF is installed (it is
+not a dependency of the app).
+
+Usage:
+    python -m benchmarks.bench_parallel_render [rows ...]   (default: 5000 20000; 2, 4 and one worker per core)
+"""
+
+import io
+import os
+import sys
+import time
+from pypdf import PdfReader
+
+from benchmarks.sample_data import make_invoice
+
+try:
+    import pymupdf
+except ImportError:  # Text comparison only
+    pymupdf = None
+
+ITERATIONS = 3
+
+
+def _best(render) -> tuple:
+    """Return (best seconds, PDF bytes) of a render callable over ITERATIONS runs."""
+    best = None
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        pdf = render()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, pdf
+
+
+def _sample_pages(page_count: int, parts: int) -> list:
+    """First and last page plus both pages around each part boundary."""
+    pages = {0, page_count - 1}
+    for part in range(1, parts):
+        boundary = page_count * part // parts
+        pages.update((boundary - 1, boundary))
+    return sorted(page for page in pages if 0 <= page < page_count)
+
+
+def compare(serial: bytes, parallel: bytes, parts: int) -> str:
+    """Describe how a parallel PDF differs from the serial one ('identical' if it does not)."""
+    if pymupdf is None:
+        expected, actual = PdfReader(io.BytesIO(serial)).pages, PdfReader(io.BytesIO(parallel)).pages
+        if len(expected) != len(actual):
+            return f"{len(actual)} pages, expected {len(expected)}"
+        for index in _sample_pages(len(expected), parts):
+            if expected[index].extract_text() != actual[index].extract_text():
+                return f"text differs on page {index + 1}"
+        return "identical (sampled text)"
+
+    expected, actual = pymupdf.open(stream=serial), pymupdf.open(stream=parallel)
+    if expected.page_count != actual.page_count:
+        return f"{actual.page_count} pages, expected {expected.page_count}"
+    for index in range(expected.page_count):
+        if expected[index].get_text() != actual[index].get_text():
+            return f"text differs on page {index + 1}"
+    for index in _sample_pages(expected.page_count, parts):
+        if expected[index].get_pixmap(dpi=72).samples != actual[index].get_pixmap(dpi=72).samples:
+            return f"pixels differ on page {index + 1}"
+    return "identical"
+
+
+def main(row_counts=(5000, 20000), worker_counts=None):
+    from app.pdf_generator import render_invoice_pdf
+    from app.parallel_render import render_parallel
+    from app.utils import process_pool
+
+    cores = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({2, 4, cores})
+    print(f"{cores} CPU cores")
+    print(f"{'rows':>6} {'pages':>6} {'workers':>8} {'seconds':>8} {'speedup':>8}  output")
+
+    for rows in row_counts:
+        invoice = make_invoice(rows, company="BitCode", description_words=6)
+        render_invoice_pdf(make_invoice(25, company="BitCode"))  # Warm fonts and the watermark
+        serial_seconds, serial = _best(lambda: render_invoice_pdf(invoice))
+        pages = len(PdfReader(io.BytesIO(serial)).pages)
+        print(f"{rows:>6} {pages:>6} {'serial':>8} {serial_seconds:>8.2f} {1:>7.2f}x")
+
+        for workers in worker_counts:
+            with process_pool(workers) as pool:
+                list(pool.map(abs, range(workers)))  # Start the workers before timing
+
+                def render():
+                    buffer = io.BytesIO()
+                    if not render_parallel(invoice, buffer, pool, workers):
+                        raise RuntimeError("parallel render fell back to serial")
+                    return buffer.getvalue()
+
+                seconds, pdf = _best(render)
+            print(
+                f"{rows:>6} {pages:>6} {workers:>8} {seconds:>8.2f} {serial_seconds / seconds:>7.2f}x"
+                f"  {compare(serial, pdf, workers)}"
+            )
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]]
+    main(counts or (5000, 20000))
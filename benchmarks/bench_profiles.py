@@ -0,0 +1,54 @@
+"""
+Compare the PDF output profiles: file size and render time per profile.
+
+Renders the same invoices (BitCode, so the watermark is drawn) with each
+profile in app.profiles and reports the p50 render time over a few
+iterations, the PDF size, and both relative to the standard profile.
+
+Usage:
+    python -m benchmarks.bench_profiles [rows ...]   (default: 25 200 1000)
+"""
+
+import statistics
+import sys
+import time
+
+from benchmarks.sample_data import make_invoice
+
+ITERATIONS = 7
+
+
+def measure(rows: int, profile: str) -> tuple:
+    """Return (p50 seconds, PDF bytes) for rendering ``rows`` expenses with a profile."""
+    from app.pdf_generator import render_invoice_pdf
+
+    invoice = make_invoice(rows, company="BitCode", description_words=6)
+    invoice.profile = profile
+    pdf = render_invoice_pdf(invoice)  # warm the profile's watermark and fonts
+
+    timings = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        pdf = render_invoice_pdf(invoice)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(pdf)
+
+
+def main(row_counts=(25, 200, 1000)):
+    from app.profiles import PROFILES
+
+    print(f"{'rows':>6} {'profile':>9} {'p50 ms':>9} {'vs std':>7} {'PDF KB':>8} {'vs std':>7}")
+    for rows in row_counts:
+        baseline = None
+        for name in PROFILES:
+            elapsed, size = measure(rows, name)
+            baseline = baseline or (elapsed, size)
+            print(
+                f"{rows:>6} {name:>9} {elapsed * 1000:>9.1f} {elapsed / baseline[0]:>6.2f}x"
+                f" {size / 1024:>8.1f} {size / baseline[1]:>6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]]
+    main(counts or (25, 200, 1000))
@@ -0,0 +1,91 @@
+"""
+Benchmark start-up warm-up: app start-up time in the (gunicorn-like)
+master and the latency of the first requests served by a forked worker,
+with and without WARMUP_ENABLED.
+
+Each run starts a fresh process that creates the app, then forks a
+"worker" that serves the form page and renders an invoice through the
+JSON API, as the first requests after a deploy would.
+
+Usage:
+    python -m benchmarks.bench_startup [runs]   (default: 5)
+"""
+
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+
+def _first_requests(app) -> dict:
+    """Serve the form page and one API render; return their latencies in ms."""
+    from benchmarks.sample_data import make_invoice
+
+    client = app.test_client()
+    timings = {}
+
+    start = time.perf_counter()
+    response = client.get("/")
+    timings["first_get_ms"] = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.status_code
+
+    payload = make_invoice(25, company="BitCode").to_dict()
+    start = time.perf_counter()
+    response = client.post("/api/v1/invoices", json=payload)
+    timings["first_render_ms"] = (time.perf_counter() - start) * 1000
+    assert response.mimetype == "application/pdf", response.status_code
+    return timings
+
+
+def _run(warmup: bool, results) -> None:
+    """Child process: time create_app, then the first requests of a forked worker."""
+    os.environ["WARMUP_ENABLED"] = "true" if warmup else "false"
+    start = time.perf_counter()
+    from config import Config
+    from app import create_app
+
+    # Keep benchmark renders out of OUTPUT_DIR and away from earlier runs
+    Config.PDF_STORAGE = "memory"
+    app = create_app()
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        with os.fdopen(write_end, "w") as pipe:
+            json.dump(_first_requests(app), pipe)
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        timings = json.load(pipe)
+    os.waitpid(pid, 0)
+    results.put(dict(timings, startup_ms=startup_ms))
+
+
+def run(warmup: bool) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run, args=(warmup, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Start-up benchmark failed (exit code {process.exitcode})")
+    return results.get()
+
+
+def main(runs: int = 5):
+    print(f"{'warm-up':<8} {'startup ms':>11} {'first GET ms':>13} {'first render ms':>16}")
+    for warmup in (False, True):
+        samples = [run(warmup) for _ in range(runs)]
+        median = {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+        print(
+            f"{'on' if warmup else 'off':<8} {median['startup_ms']:>11.1f} "
+            f"{median['first_get_ms']:>13.1f} {median['first_render_ms']:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
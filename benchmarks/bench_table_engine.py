@@ -0,0 +1,56 @@
+"""
+Benchmark the platypus Table engine against the fast-path canvas engine.
+
+Each case runs in a fresh process so peak RSS is attributable to it.
+
+Usage:
+    python -m benchmarks.bench_table_engine [rows ...]   (default: 25 1000 10000)
+"""
+
+import multiprocessing
+import resource
+import sys
+import time
+
+from benchmarks.sample_data import make_invoice
+
+
+def _run_case(engine: str, rows: int, results) -> None:
+    from app.pdf_generator import render_invoice_pdf
+
+    invoice = make_invoice(rows, description_words=6)
+    render_invoice_pdf(make_invoice(1), engine)  # warm fonts and template
+
+    start = time.perf_counter()
+    pdf = render_invoice_pdf(invoice, engine)
+    elapsed = time.perf_counter() - start
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((elapsed, peak_kb, len(pdf)))
+
+
+def measure(engine: str, rows: int) -> tuple:
+    """Return (seconds, peak RSS in MB, PDF bytes) for one render."""
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(engine, rows, results))
+    process.start()
+    elapsed, peak_kb, size = results.get()
+    process.join()
+    return elapsed, peak_kb / 1024, size
+
+
+def main(row_counts=(25, 1000, 10000)):
+    print(f"{'rows':>7} {'engine':>9} {'seconds':>9} {'rows/s':>9} {'peak MB':>8} {'PDF KB':>8}")
+    for rows in row_counts:
+        timings = {}
+        for engine in ("platypus", "fast"):
+            elapsed, peak_mb, size = measure(engine, rows)
+            timings[engine] = elapsed
+            print(f"{rows:>7} {engine:>9} {elapsed:>9.3f} {rows / elapsed:>9.0f} {peak_mb:>8.1f} {size / 1024:>8.1f}")
+        print(f"{'':>7} {'speedup':>9} {timings['platypus'] / timings['fast']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]]
+    main(counts or (25, 1000, 10000))
@@ -0,0 +1,54 @@
+"""
+Micro-benchmark for the memoized InvoiceTemplate.
+
+Compares per-invoice CPU time when the template (styles, decorative tables,
+header row and expense TableStyle) is rebuilt for every invoice, which is
+what generate_invoice_pdf used to do, against reusing the cached template.
+
+Usage:
+    python -m benchmarks.bench_template [rows] [iterations]
+"""
+
+import sys
+import time
+import timeit
+
+from app.pdf_generator import InvoiceTemplate, get_invoice_template, generate_invoice_pdf
+from benchmarks.sample_data import make_invoice
+
+
+def _cpu_ms(func, iterations: int, repeat: int = 5) -> float:
+    """Best-of-``repeat`` CPU milliseconds per call."""
+    timer = timeit.Timer(func, timer=time.process_time)
+    return min(timer.repeat(repeat=repeat, number=iterations)) * 1000 / iterations
+
+
+def main(rows: int = 25, iterations: int = 200):
+    invoice = make_invoice(rows)
+
+    template_build = _cpu_ms(lambda: InvoiceTemplate(invoice.company), iterations)
+
+    setup_rebuilt = _cpu_ms(lambda: InvoiceTemplate(invoice.company).build_story(invoice), iterations)
+    setup_cached = _cpu_ms(lambda: get_invoice_template(invoice.company).build_story(invoice), iterations)
+
+    def render_rebuilt():
+        get_invoice_template.cache_clear()
+        generate_invoice_pdf(invoice, "bench_template.pdf")
+
+    def render_cached():
+        generate_invoice_pdf(invoice, "bench_template.pdf")
+
+    render_iterations = max(1, iterations // 10)
+    full_rebuilt = _cpu_ms(render_rebuilt, render_iterations)
+    full_cached = _cpu_ms(render_cached, render_iterations)
+
+    print(f"Rows per invoice: {rows}")
+    print(f"Template build (now once per company): {template_build:8.3f} ms")
+    print(f"Story setup  rebuilt: {setup_rebuilt:8.3f} ms   cached: {setup_cached:8.3f} ms")
+    print(f"Full render  rebuilt: {full_rebuilt:8.3f} ms   cached: {full_cached:8.3f} ms")
+    print(f"Saved per invoice:    {full_rebuilt - full_cached:8.3f} ms CPU")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,137 @@
+"""
+Benchmark gunicorn's sync worker against the threaded (gthread) worker
+with the same number of worker processes.
+
+For each worker class a gunicorn server is started with gunicorn_config.py
+and driven by concurrent clients over keep-alive connections. Each client
+cycles through a fixed mix of requests: a fresh render through the JSON API,
+a render cache hit (same invoice again, served from the stored PDF) and the
+form page. Reports throughput and p50/p95 latency per request type.
+
+Usage:
+    python -m benchmarks.bench_workers [seconds] [clients] [threads]
+    (default: 10 s per worker class, 8 clients, 4 threads per gthread worker)
+"""
+
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.sample_data import make_invoice
+
+# Request mix each client cycles through
+MIX = ("render", "cached", "page", "cached", "page")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(worker_class: str, workers: int, threads: int, port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_THREADS=str(threads),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_config.py", "app:create_app()"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not start")
+
+
+def _client(port: int, client_id: int, deadline: float, latencies: dict) -> None:
+    """Send the request mix over one keep-alive connection until the deadline."""
+    base = make_invoice(25, company="BitCode").to_dict()
+    cached = json.dumps(dict(base, employee_id=f"CACHED{client_id}"))
+    headers = {"Content-Type": "application/json"}
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    sequence = 0
+
+    while time.monotonic() < deadline:
+        kind = MIX[sequence % len(MIX)]
+        sequence += 1
+        started = time.perf_counter()
+        if kind == "page":
+            conn.request("GET", "/")
+        else:
+            body = cached if kind == "cached" else json.dumps(dict(base, employee_id=f"C{client_id}-{sequence}"))
+            conn.request("POST", "/api/v1/invoices", body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{kind} request failed with {response.status}")
+        latencies[kind].append((time.perf_counter() - started) * 1000)
+    conn.close()
+
+
+def run(worker_class: str, workers: int, threads: int, seconds: float, clients: int) -> dict:
+    """Load one gunicorn configuration; return per-request-type latencies in ms."""
+    port = _free_port()
+    server = _start_server(worker_class, workers, threads, port)
+    latencies = {kind: [] for kind in MIX}
+    try:
+        deadline = time.monotonic() + seconds
+        client_threads = [
+            threading.Thread(target=_client, args=(port, client_id, deadline, latencies))
+            for client_id in range(clients)
+        ]
+        for thread in client_threads:
+            thread.start()
+        for thread in client_threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return latencies
+
+
+def _percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def main(seconds: float = 10, clients: int = 8, threads: int = 4):
+    workers = os.cpu_count() or 1
+    configs = [("sync", 1), ("gthread", threads)]
+    print(f"{workers} workers, {clients} clients, {seconds:g} s per configuration")
+    print(f"{'worker':<14}{'type':<8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}")
+
+    for worker_class, worker_threads in configs:
+        latencies = run(worker_class, workers, worker_threads, seconds, clients)
+        label = f"{worker_class} x{worker_threads}"
+        total = sum(len(values) for values in latencies.values())
+        for kind in dict.fromkeys(MIX):
+            values = latencies[kind]
+            print(
+                f"{label:<14}{kind:<8}{len(values) / seconds:8.1f}"
+                f"{statistics.median(values):9.1f}{_percentile(values, 0.95):9.1f}"
+            )
+        print(f"{label:<14}{'all':<8}{total / seconds:8.1f}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((float, int, int), sys.argv[1:4])))
@@ -0,0 +1,42 @@
+"""
+Synthetic invoice data shared by the benchmark scripts.
+"""
+
+from datetime import date, timedelta
+
+from app.models import Invoice, ExpenseItem
+
+
+CATEGORIES = [
+    "Travel", "Transportation", "Snacks", "Stationary", "Internet Bill",
+    "Office Equipment", "Mobile Recharge", "Courier Service", "Rent", "Others",
+]
+
+
+def make_expenses(rows: int, description_words: int = 2, start: date = date(2026, 1, 1)):
+    """Return ``rows`` deterministic ExpenseItems spread over a year."""
+    words = ["Flight", "booking", "client", "visit", "team", "lunch", "hotel", "stay"]
+    description = " ".join(words[i % len(words)] for i in range(description_words))
+    return [
+        ExpenseItem(
+            date=start + timedelta(days=i % 365),
+            category=CATEGORIES[i % len(CATEGORIES)],
+            description=description,
+            note="HR meeting" if i % 3 == 0 else "",
+            amount=1000 + (i * 37) % 9000 + 0.5,
+        )
+        for i in range(rows)
+    ]
+
+
+def make_invoice(rows: int = 25, company: str = "BitApps", description_words: int = 2) -> Invoice:
+    """Return an Invoice with ``rows`` synthetic expense items."""
+    return Invoice(
+        company=company,
+        prepared_by="John Doe",
+        employee_id="EMP001",
+        department="HR",
+        start_date=date(2026, 1, 1),
+        end_date=date(2026, 12, 31),
+        expenses=make_expenses(rows, description_words),
+    )
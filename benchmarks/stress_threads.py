@@ -0,0 +1,128 @@
+"""
+Thread-safety stress test for the PDF renderer.
+
+Renders a mix of invoices (both companies, both table engines, single-
+and multi-page) once serially, then many times concurrently from a thread
+pool in the same process, and checks every concurrent PDF is byte-for-byte
+identical to its serial render. Concurrent writes of the same stored name
+through FileInvoiceStore and generate_invoice_pdf are checked as well.
+Slow-render profiling is on, so its per-process profiler is exercised
+too. ReportLab's invariant mode is switched on so PDFs carry no
+timestamps.
+
+Exits with status 1 if any render differs or fails.
+
+Usage:
+    python -m benchmarks.stress_threads [threads] [rounds]   (default: 8 threads, 20 rounds)
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from reportlab import rl_config
+
+from benchmarks.sample_data import make_invoice
+
+# (rows, company, description words, engine)
+CASES = [
+    (3, "BitCode", 2, "platypus"),
+    (25, "BitCode", 6, "platypus"),
+    (60, "BitApps", 12, "platypus"),
+    (40, "BitCode", 2, "fast"),
+    (300, "BitApps", 4, "fast"),
+    (120, "Unbranded", 3, "auto"),
+]
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def check_renders(threads: int, rounds: int) -> int:
+    """Compare concurrent renders against serial ones; return the number of mismatches."""
+    from app.pdf_generator import render_invoice_pdf
+
+    invoices = [make_invoice(rows, company, words) for rows, company, words, _ in CASES]
+    engines = [engine for *_, engine in CASES]
+    expected = [_digest(render_invoice_pdf(invoice, engine)) for invoice, engine in zip(invoices, engines)]
+
+    def render(index):
+        try:
+            return index, _digest(render_invoice_pdf(invoices[index], engines[index]))
+        except Exception as e:
+            print(f"Render of case {index} failed: {e!r}")
+            return index, None
+
+    jobs = [index for _ in range(rounds) for index in range(len(CASES))]
+    mismatches = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for index, digest in pool.map(render, jobs):
+            if digest != expected[index]:
+                mismatches += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"Concurrent renders: {len(jobs)} on {threads} threads in {elapsed:.1f} s, {mismatches} mismatches or failures")
+    return mismatches
+
+
+def check_store(threads: int, rounds: int) -> int:
+    """Write the same file names from many threads; return the number of corrupt files."""
+    from config import Config
+    from app.metrics import profiler
+    from app.storage import FileInvoiceStore
+    from app.pdf_generator import generate_invoice_pdf, render_invoice_pdf
+
+    invoices = [make_invoice(rows, company) for rows, company, *_ in CASES[:3]]
+    pdfs = [render_invoice_pdf(invoice) for invoice in invoices]
+    expected = [_digest(pdf) for pdf in pdfs]
+    store = FileInvoiceStore()
+
+    def write(index):
+        case = index % len(pdfs)
+        name = f"stress-{case}.pdf"
+        try:
+            # Alternate between storing rendered bytes and rendering into the file
+            if index % 2:
+                generate_invoice_pdf(invoices[case], name)
+            else:
+                store.put(name, pdfs[case])
+            with open(os.path.join(Config.OUTPUT_DIR, name), "rb") as pdf_file:
+                return _digest(pdf_file.read()) in expected
+        except OSError as e:
+            print(f"Store write {index} failed: {e!r}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(write, range(rounds * len(pdfs))))
+
+    leftovers = [name for name in os.listdir(Config.OUTPUT_DIR) if name.endswith(".tmp")]
+    leftovers += [name for name in os.listdir(profiler.directory) if name.endswith(".tmp")]
+    corrupt = results.count(False) + len(leftovers)
+    print(f"Concurrent store writes: {len(results)} on {threads} threads, {corrupt} corrupt or leftover files")
+    return corrupt
+
+
+def main(threads: int = 8, rounds: int = 20) -> int:
+    from config import Config
+    from app.metrics import profiler
+
+    rl_config.invariant = 1
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Keep stress files out of the real OUTPUT_DIR and PROFILE_DIR
+        Config.OUTPUT_DIR = output_dir
+        Config.CLEANUP_INDEX_FILE = os.path.join(output_dir, ".expiry-index")
+        profiler.directory, profiler.keep = os.path.join(output_dir, "profiles"), 3
+        failures = check_renders(threads, rounds) + check_store(threads, rounds)
+
+    print("OK" if not failures else "FAILED")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(main(*args))
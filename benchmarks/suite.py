@@ -0,0 +1,241 @@
+"""
+Render benchmark suite and performance regression harness.
+
+Every case runs in a fresh process and reports p50/p95 latency, throughput,
+peak RSS and output size. Results can be written as JSON and compared
+against a baseline from an earlier run; any metric that got worse by more
+than the tolerance is reported as a regression and the exit status is 1.
+
+Usage:
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json -o results.json
+    python -m benchmarks.suite --cases render_25 flask_post_25 --iterations 5
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+from benchmarks.sample_data import make_invoice
+
+
+# Company without a logo file, used for the no-watermark cases
+NO_LOGO_COMPANY = "Unbranded"
+
+# Metrics compared against the baseline (all lower-is-better)
+COMPARED_METRICS = ("p50_ms", "p95_ms", "peak_rss_mb", "output_bytes")
+
+
+def _render_case(rows: int, description_words: int, company: str):
+    """Render an invoice in memory (the layout path used by every entry point)."""
+    def factory():
+        from app.pdf_generator import render_invoice_pdf
+
+        invoice = make_invoice(rows, company=company, description_words=description_words)
+        return lambda: render_invoice_pdf(invoice)
+    return factory
+
+
+def _total_amount_case(rows: int):
+    """Sum a large invoice's expenses (the Invoice.total_amount property)."""
+    def factory():
+        invoice = make_invoice(rows)
+        return lambda: invoice.total_amount
+    return factory
+
+
+def _aggregate_case(rows: int):
+    """Aggregate a large invoice from scratch (totals, category/month subtotals, date check)."""
+    def factory():
+        from app.aggregation import aggregate
+
+        invoice = make_invoice(rows)
+        return lambda: aggregate(invoice.expenses, invoice.start_date, invoice.end_date)
+    return factory
+
+
+def _flask_post_case(rows: int):
+    """POST the invoice form through the test client and follow it to the PDF."""
+    def factory():
+        from config import Config
+        from app import create_app
+
+        # Keep benchmark renders out of OUTPUT_DIR and away from earlier runs
+        Config.PDF_STORAGE = "memory"
+
+        app = create_app()
+        app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        client = app.test_client()
+        data = {
+            "company": "BitCode",
+            "prepared_by": "John Doe",
+            "department": "HR",
+            "start_date": "2026-01-01",
+            "end_date": "2026-12-31",
+        }
+        for i, item in enumerate(make_invoice(rows).expenses):
+            data[f"expenses-{i}-date"] = item.date.isoformat()
+            data[f"expenses-{i}-category"] = item.category
+            data[f"expenses-{i}-description"] = item.description
+            data[f"expenses-{i}-note"] = item.note
+            data[f"expenses-{i}-amount"] = f"{item.amount:.2f}"
+        counter = iter(range(sys.maxsize))
+
+        def post():
+            # A new employee ID per request so the render cache never hits
+            data["employee_id"] = f"EMP{next(counter)}"
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = client.post("/", data=data)
+                assert response.status_code == 302, response.status_code
+                with client.session_transaction() as session:
+                    filename = session["invoice_filename"]
+                download = client.get(f"/download/{filename}")
+                assert download.mimetype == "application/pdf", download.status_code
+            return download.data
+        return post
+    return factory
+
+
+# name -> (factory, default iterations)
+CASES = {
+    "render_25": (_render_case(25, 2, "BitCode"), 30),
+    "render_250": (_render_case(250, 2, "BitCode"), 10),
+    "render_1000": (_render_case(1000, 2, "BitCode"), 3),
+    "render_250_long_descriptions": (_render_case(250, 40, "BitCode"), 5),
+    "render_25_no_watermark": (_render_case(25, 2, NO_LOGO_COMPANY), 30),
+    "render_250_no_watermark": (_render_case(250, 2, NO_LOGO_COMPANY), 10),
+    "total_amount_10000": (_total_amount_case(10000), 200),
+    "aggregate_10000": (_aggregate_case(10000), 50),
+    "flask_post_25": (_flask_post_case(25), 20),
+}
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _run_case(name: str, iterations: int, warmup: int, results) -> None:
+    """Child process entry point: time one case and report its metrics."""
+    factory, _ = CASES[name]
+    func = factory()
+    for _ in range(warmup):
+        func()
+
+    latencies, output = [], None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        output = func()
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    results.put({
+        "iterations": iterations,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "throughput_per_s": iterations / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "output_bytes": len(output) if isinstance(output, (bytes, bytearray)) else None,
+    })
+
+
+def run_case(name: str, iterations: int = None, warmup: int = 1) -> dict:
+    """Run one case in a fresh process and return its metrics."""
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    iterations = iterations or CASES[name][1]
+    process = ctx.Process(target=_run_case, args=(name, iterations, warmup, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Benchmark case {name!r} failed (exit code {process.exitcode})")
+    return results.get()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare results with a baseline.
+
+    Returns:
+        list: (case, metric, baseline value, current value) for every metric
+        that is more than ``tolerance`` (a fraction) worse than the baseline
+    """
+    regressions = []
+    for name, metrics in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            current, previous = metrics.get(metric), base.get(metric)
+            if current is None or not previous:
+                continue
+            if current > previous * (1 + tolerance):
+                regressions.append((name, metric, previous, current))
+    return regressions
+
+
+def _print_table(results: dict) -> None:
+    print(f"{'case':<30} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9} {'peak MB':>8} {'bytes':>9}")
+    for name, m in results["cases"].items():
+        size = m["output_bytes"] if m["output_bytes"] is not None else "-"
+        print(
+            f"{name:<30} {m['p50_ms']:>9.2f} {m['p95_ms']:>9.2f} "
+            f"{m['throughput_per_s']:>9.1f} {m['peak_rss_mb']:>8.1f} {size:>9}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="Cases to run (default: all)")
+    parser.add_argument("--iterations", type=int, help="Override the per-case iteration count")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against this results JSON and fail on regressions")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write results as the new baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed slowdown/growth as a fraction (default: 0.25)"
+    )
+    args = parser.parse_args(argv)
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": {},
+    }
+    for name in args.cases or CASES:
+        results["cases"][name] = run_case(name, args.iterations)
+    _print_table(results)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.tolerance)
+    if not regressions:
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        return 0
+
+    print(f"\nREGRESSIONS against {args.baseline} (tolerance {args.tolerance:.0%}):", file=sys.stderr)
+    for name, metric, previous, current in regressions:
+        print(
+            f"  {name}.{metric}: {previous:.2f} -> {current:.2f} ({current / previous - 1:+.0%})",
+            file=sys.stderr,
+        )
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
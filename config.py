@@ -16,8 +16,12 @@ class Config:
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     OUTPUT_DIR = os.path.join(BASE_DIR, "output", "invoices")
     
-    # Session configuration
-    SESSION_TYPE = 'filesystem'
+    # Session configuration: 'sqlite' keeps session data server-side in
+    # SESSION_DB (shared by all gunicorn workers), 'memory' in a per-process
+    # dict, 'cookie' uses Flask's signed cookie sessions. Server-side
+    # sessions expire PERMANENT_SESSION_LIFETIME after their last write.
+    SESSION_TYPE = os.environ.get("SESSION_TYPE", "sqlite")
+    SESSION_DB = os.path.join(BASE_DIR, "output", "sessions.sqlite3")
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hour
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY = True
@@ -25,11 +29,117 @@ class Config:
     
     # File cleanup settings
     CLEANUP_MAX_AGE = 3600  # Remove PDFs older than 1 hour (in seconds)
+    CLEANUP_INTERVAL = int(os.environ.get("CLEANUP_INTERVAL", 300))  # Seconds between background sweeps
+    CLEANUP_INDEX_FILE = os.path.join(OUTPUT_DIR, ".expiry-index")
+    
+    # PDF storage: 'file' writes PDFs to OUTPUT_DIR, 'memory' renders into
+    # memory and keeps them in a short-lived per-process store. The memory
+    # store is not shared between gunicorn workers, so use it with a single
+    # worker process (scale with threads) or sticky routing.
+    PDF_STORAGE = os.environ.get("PDF_STORAGE", "file")
+    MEMORY_STORE_MAX_ITEMS = 256
+    MEMORY_STORE_MAX_BYTES = 64 * 1024 * 1024  # 64MB across all cached PDFs
+    PDF_SPOOL_MAX_SIZE = 8 * 1024 * 1024  # Spill streamed renders to disk above 8MB
+    
+    # Expense table engine: 'platypus' (Table of Paragraphs), 'fast' (rows
+    # drawn directly on the canvas) or 'auto' (fast from FAST_TABLE_MIN_ROWS)
+    TABLE_ENGINE = os.environ.get("TABLE_ENGINE", "auto")
+    FAST_TABLE_MIN_ROWS = 200
+    
+    # Invoices loaded from JSON with this many expenses (and every CSV
+    # import) keep them in a column-oriented ExpenseTable
+    COMPACT_EXPENSES_MIN_ROWS = 1000
+    
+    # Largest accepted expense amount (BDT); keeps every invoice total, in
+    # integer paisa, far inside int64
+    MAX_EXPENSE_AMOUNT = 9_999_999_999.99
+    
+    # Add a per-category subtotal table under the invoice total
+    PDF_CATEGORY_SUMMARY = os.environ.get("PDF_CATEGORY_SUMMARY", "false").lower() == "true"
+    
+    # Output profile of invoices that do not pick one: "standard", "compact"
+    # (smallest file), "draft" (fastest render) or "archival" (reproducible)
+    PDF_PROFILE = os.environ.get("PDF_PROFILE", "standard")
+    
+    # Warm up the PDF pipeline (imports, fonts, styles, logos, one throwaway
+    # render) in create_app, i.e. in the gunicorn master before workers fork
+    WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() == "true"
+    
+    # Static CSS/JS are served fingerprinted from /assets with immutable
+    # caching; files under the minimum size are not compressed
+    ASSET_MAX_AGE = 365 * 24 * 3600  # 1 year
+    ASSET_COMPRESS_MIN_SIZE = 512
+    
+    # Serve the invoice form from a pre-rendered shell (off in debug mode)
+    PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE_ENABLED", "true").lower() == "true"
+    
+    # Render cache: identical invoices are served from the stored PDF. Each
+    # process evicts its least recently used PDFs beyond these limits, except
+    # those a live session still references (left to CLEANUP_MAX_AGE)
+    RENDER_CACHE_MAX_ITEMS = 512
+    RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256MB of cached PDFs per process
+    
+    # Asynchronous render queue (app.jobs). When enabled the form POST only
+    # enqueues a job; render workers run in-process (one pool per gunicorn
+    # worker) or in a dedicated `python -m app.jobs` process.
+    RENDER_QUEUE_ENABLED = os.environ.get("RENDER_QUEUE_ENABLED", "false").lower() == "true"
+    RENDER_QUEUE_INPROCESS = os.environ.get("RENDER_QUEUE_INPROCESS", "true").lower() == "true"
+    RENDER_QUEUE_DB = os.path.join(BASE_DIR, "output", "jobs.sqlite3")
+    RENDER_QUEUE_CONCURRENCY = int(os.environ.get("RENDER_QUEUE_CONCURRENCY", 2))
+    RENDER_QUEUE_MAX_DEPTH = 100  # Reject new submissions beyond this many pending jobs
+    RENDER_QUEUE_JOB_TIMEOUT = 120  # Requeue running jobs without a heartbeat for this long
+    RENDER_QUEUE_HEARTBEAT_INTERVAL = 15  # Seconds between heartbeats of a worker's running jobs
+    
+    # Persistent invoice archive (app.archive): every rendered invoice is
+    # recorded in ARCHIVE_DB with its PDF in ARCHIVE_BLOB_DIR, queryable via
+    # /api/v1/archive, and kept ARCHIVE_RETENTION_DAYS (0 = forever) rather
+    # than CLEANUP_MAX_AGE
+    ARCHIVE_ENABLED = os.environ.get("ARCHIVE_ENABLED", "false").lower() == "true"
+    ARCHIVE_DB = os.environ.get("ARCHIVE_DB", os.path.join(BASE_DIR, "output", "archive.sqlite3"))
+    ARCHIVE_BLOB_DIR = os.environ.get("ARCHIVE_BLOB_DIR", os.path.join(BASE_DIR, "output", "archive"))
+    ARCHIVE_RETENTION_DAYS = int(os.environ.get("ARCHIVE_RETENTION_DAYS", 7 * 365))
+    ARCHIVE_PAGE_SIZE = 50
+    ARCHIVE_API_TOKEN = os.environ.get("ARCHIVE_API_TOKEN", "")  # Bearer token for /api/v1/archive (unset = API off)
+    ARCHIVE_MAX_PAGE_SIZE = 500
+    
+    # Batch generation (app.batch and /batch). BATCH_WORKERS is the CLI's
+    # default process count; /batch renders on the render workers' pool
+    BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+    BATCH_CHUNK_SIZE = 32  # Max invoices rendering at once; bounds batch memory
+    BATCH_API_TOKEN = os.environ.get("BATCH_API_TOKEN", "")  # Bearer token for /batch (unset = endpoint off)
+    
+    # Intra-invoice parallel rendering (app.parallel_render): invoices with at
+    # least PARALLEL_RENDER_MIN_ROWS expenses are paginated up front and their
+    # page ranges rendered in PARALLEL_RENDER_WORKERS processes (0 or 1 = off)
+    PARALLEL_RENDER_WORKERS = int(os.environ.get("PARALLEL_RENDER_WORKERS", 0))
+    PARALLEL_RENDER_MIN_ROWS = int(os.environ.get("PARALLEL_RENDER_MIN_ROWS", 5000))
+    
+    # Metrics (/metrics): every process writes its samples to METRICS_DIR
+    # every METRICS_FLUSH_INTERVAL seconds and scrapes merge them, so totals
+    # cover all gunicorn workers (other workers' samples may lag that long)
+    METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(BASE_DIR, "output", "metrics"))
+    METRICS_FLUSH_INTERVAL = int(os.environ.get("METRICS_FLUSH_INTERVAL", 10))
+    
+    # Opt-in profiling: keep cProfile dumps of the N slowest renders (0 = off)
+    PROFILE_SLOWEST_RENDERS = int(os.environ.get("PROFILE_SLOWEST_RENDERS", 0))
+    PROFILE_DIR = os.path.join(BASE_DIR, "output", "profiles")
+    
+    # Logging (app.logs): records are written by a background listener
+    # thread. Form dumps are DEBUG level, redacted and sampled.
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+    LOG_FORM_SAMPLE_RATE = float(os.environ.get("LOG_FORM_SAMPLE_RATE", 0.01))  # Fraction of forms dumped
     
     # WTForms settings
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None  # No time limit for CSRF tokens
     
-    # Upload settings (if needed in future)
+    # Upload settings (expense imports and /batch)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
+    IMPORT_MAX_ERRORS = 100  # Row errors reported for a rejected CSV/XLSX expense import or API invoice
+    
+    # JSON API (/api/v1): MAX_CONTENT_LENGTH bounds the request body as sent,
+    # API_MAX_BODY_SIZE the body after gzip decompression
+    API_MAX_BODY_SIZE = 16 * 1024 * 1024
+    API_MAX_EXPENSES = 50000
 
@@ -5,12 +5,18 @@ import os
 # Bind to 0.0.0.0 on PORT from environment (required for Render)
 bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
 
-# Worker configuration
-workers = 4
-worker_class = "sync"
-threads = 2
+# Worker configuration. Rendering is thread-safe (no shared mutable
+# flowables, unique temporary files), so the threaded worker serves
+# `threads` requests per process: cache hits, downloads and slow clients
+# no longer hold a whole process while it could be rendering. Compare
+# against sync workers with `python -m benchmarks.bench_workers`.
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
 
-# Timeout settings
+# Timeout settings. The threaded worker keeps idle client connections open
+# for `keepalive` seconds so API clients can send several requests over
+# one connection.
 timeout = 120
 keepalive = 5
 
@@ -22,5 +28,29 @@ loglevel = "info"
 # Process naming
 proc_name = "invoice_generator"
 
-# Preload app for better performance
+# Preload app for better performance: create_app warms up the PDF pipeline
+# in the master, so workers start with ReportLab, fonts and logos loaded
 preload_app = True
+
+
+def on_starting(server):
+    """Drop metrics files left by a previous server run."""
+    from app.metrics import clear_metrics_dir
+    clear_metrics_dir()
+
+
+def when_ready(server):
+    """Publish the master's warm-up timings (on_starting cleared old metrics files)."""
+    from app.metrics import registry
+    registry.flush()
+
+
+def post_fork(server, worker):
+    """Start the background cleanup thread and render workers in each worker."""
+    from config import Config
+    from app.cleanup import start_cleanup_scheduler
+    start_cleanup_scheduler()
+    
+    if Config.RENDER_QUEUE_ENABLED and Config.RENDER_QUEUE_INPROCESS:
+        from app.jobs import start_render_workers
+        start_render_workers()
@@ -0,0 +1,183 @@
+// Expense form behaviour: date limits, adding/removing expense rows and
+// client-side checks before submit. New rows are cloned from the
+// <template id="expense-row-template"> rendered into the page.
+
+const startDateInput = document.getElementById('start_date');
+const endDateInput = document.getElementById('end_date');
+const expenseContainer = document.getElementById('expense-container');
+const importButton = document.getElementById('import-button');
+const expensesFileInput = document.getElementById('expenses-file');
+
+let expenseIndex = expenseContainer.getElementsByClassName('expense-row').length;
+
+// Date range validation
+startDateInput.addEventListener('change', function() {
+    // Set minimum end date to start date
+    endDateInput.min = this.value;
+
+    // If end date is before start date, clear it
+    if (endDateInput.value && endDateInput.value < this.value) {
+        endDateInput.value = '';
+    }
+
+    // Update all expense date inputs
+    updateExpenseDateLimits();
+});
+
+endDateInput.addEventListener('change', function() {
+    updateExpenseDateLimits();
+});
+
+function updateExpenseDateLimits() {
+    const startDate = startDateInput.value;
+    const endDate = endDateInput.value;
+
+    const expenseDateInputs = document.querySelectorAll('.expense-date, [name*="-date"]');
+    expenseDateInputs.forEach(input => {
+        if (startDate) {
+            input.min = startDate;
+        }
+        if (endDate) {
+            input.max = endDate;
+        }
+    });
+}
+
+function validateExpenseRow(row) {
+    const inputs = row.querySelectorAll('input[required], select[required]');
+    for (let input of inputs) {
+        if (!input.value || input.value.trim() === '') {
+            return false;
+        }
+    }
+    return true;
+}
+
+function addExpense() {
+    const rows = expenseContainer.getElementsByClassName('expense-row');
+
+    // Validate all existing rows are complete
+    for (let row of rows) {
+        if (!validateExpenseRow(row)) {
+            alert('Please fill all fields in the current expense items before adding a new one.');
+            return;
+        }
+    }
+
+    const startDate = startDateInput.value;
+    const endDate = endDateInput.value;
+
+    if (!startDate || !endDate) {
+        alert('Please select start and end dates first.');
+        return;
+    }
+
+    const template = document.getElementById('expense-row-template');
+    const newRow = template.content.firstElementChild.cloneNode(true);
+    newRow.setAttribute('data-index', expenseIndex);
+    newRow.querySelectorAll('[name]').forEach(input => {
+        input.name = input.name.replace('__index__', expenseIndex);
+    });
+
+    const dateInput = newRow.querySelector('[name$="-date"]');
+    dateInput.min = startDate;
+    dateInput.max = endDate;
+
+    expenseContainer.appendChild(newRow);
+    expenseIndex++;
+
+    // Scroll to the new row
+    newRow.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
+}
+
+function removeExpense(button) {
+    const rows = expenseContainer.getElementsByClassName('expense-row');
+
+    // Prevent removing the last row
+    if (rows.length <= 1) {
+        alert('At least one expense item is required.');
+        return;
+    }
+
+    const row = button.closest('.expense-row');
+    row.remove();
+
+    // Reindex remaining rows
+    reindexExpenses();
+}
+
+function reindexExpenses() {
+    const rows = expenseContainer.getElementsByClassName('expense-row');
+
+    Array.from(rows).forEach((row, index) => {
+        row.setAttribute('data-index', index);
+
+        const inputs = row.querySelectorAll('input, select');
+        inputs.forEach(input => {
+            const name = input.getAttribute('name');
+            if (name) {
+                const newName = name.replace(/expenses-\d+-/, `expenses-${index}-`);
+                input.setAttribute('name', newName);
+            }
+        });
+    });
+
+    expenseIndex = rows.length;
+}
+
+// Form validation
+document.getElementById('invoiceForm').addEventListener('submit', function(e) {
+    const startDate = new Date(startDateInput.value);
+    const endDate = new Date(endDateInput.value);
+
+    if (endDate < startDate) {
+        e.preventDefault();
+        alert('End date must be after start date.');
+        return false;
+    }
+
+    // Imports take their expenses from the file: the rows on the page,
+    // including the empty one the form always renders, are not checked
+    if (e.submitter === importButton) {
+        return true;
+    }
+
+    // Check if at least one expense exists
+    const rows = expenseContainer.getElementsByClassName('expense-row');
+    if (rows.length === 0) {
+        e.preventDefault();
+        alert('Please add at least one expense item.');
+        return false;
+    }
+
+    // Validate all expense dates are within range
+    const expenseDateInputs = document.querySelectorAll('[name*="-date"]');
+    for (let input of expenseDateInputs) {
+        const expenseDate = new Date(input.value);
+        if (expenseDate < startDate || expenseDate > endDate) {
+            e.preventDefault();
+            alert('All expense dates must be between the start and end dates.');
+            return false;
+        }
+    }
+
+    // Validate all rows are complete
+    for (let row of rows) {
+        if (!validateExpenseRow(row)) {
+            e.preventDefault();
+            alert('Please fill all required fields in all expense items.');
+            return false;
+        }
+    }
+
+    // Generating from the rows on the page does not upload a chosen file
+    expensesFileInput.disabled = true;
+});
+
+// Re-enable the file input when the page is restored from the back/forward cache
+window.addEventListener('pageshow', function() {
+    expensesFileInput.disabled = false;
+});
+
+// Initialize date limits on page load
+updateExpenseDateLimits();
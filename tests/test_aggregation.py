@@ -0,0 +1,112 @@
+"""
+Tests for exact invoice aggregation (app.aggregation) and the streamed
+invoice total.
+"""
+
+import io
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app import aggregation
+from app.aggregation import ExpenseColumns, aggregate, to_paisa
+from app.fast_table import RunningTotal
+from app.models import EXPENSE_CATEGORIES, ExpenseItem, ExpenseTable, Invoice
+from app.pdf_generator import InvoiceTemplate, generate_invoice_pdf_streaming
+
+START = date(2026, 1, 1)
+END = date(2026, 12, 31)
+
+
+def _expenses(amounts, seed=0):
+    rng = random.Random(seed)
+    categories = list(EXPENSE_CATEGORIES) + ["Custom"]
+    return [
+        ExpenseItem(
+            date=START + timedelta(days=rng.randrange(-20, 385)),
+            category=rng.choice(categories),
+            description=f"Expense {index}",
+            note="",
+            amount=amount,
+        )
+        for index, amount in enumerate(amounts)
+    ]
+
+
+def _decimal_total(amounts) -> Decimal:
+    return sum((Decimal(str(amount)).quantize(Decimal("0.01")) for amount in amounts), Decimal(0))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_numpy_and_array_aggregation_agree(seed):
+    pytest.importorskip("numpy")
+    rng = random.Random(seed)
+    amounts = [round(rng.uniform(0.01, 100000), 2) for _ in range(500)]
+    columns = ExpenseColumns(_expenses(amounts, seed))
+    assert columns.vectorized
+
+    first, last = START.toordinal(), END.toordinal()
+    numpy_result = aggregation._aggregate_numpy(columns, first, last)
+    array_result = aggregation._aggregate_array(columns, first, last)
+    assert numpy_result == array_result
+    assert numpy_result[0] == sum(to_paisa(amount) for amount in amounts)
+
+
+@pytest.mark.parametrize("amounts", [
+    [0.1, 0.2],
+    [0.1] * 10,
+    [0.1, 0.2, 0.3, 19.99, 0.01],
+    [1234567.89, 0.05, 0.15, 2.675],
+    ["0.10", Decimal("0.20"), 3],
+])
+def test_total_matches_decimal_sum(amounts):
+    totals = aggregate(_expenses(amounts))
+    expected = _decimal_total(amounts)
+    assert totals.total_decimal == expected
+    assert InvoiceTemplate.paisa_text(totals.total) == f"BDT {expected:,.2f}"
+
+
+def test_amounts_beyond_int64_stay_exact():
+    amounts = [10 ** 17, 10 ** 17, 0.01]
+    totals = aggregate(_expenses(amounts))
+    assert not ExpenseColumns(_expenses(amounts)).vectorized
+    assert totals.total == 2 * 10 ** 19 + 1
+    assert sum(totals.by_category.values()) == totals.total
+    assert sum(totals.by_month.values()) == totals.total
+
+
+def test_sums_beyond_int64_stay_exact():
+    # Every amount fits int64 paisa, but their sum does not
+    amounts = [50_000_000_000_000_000] * 4
+    totals = aggregate(_expenses(amounts))
+    assert totals.total == 4 * 5 * 10 ** 18
+
+
+def test_expense_table_beyond_int64_stays_exact():
+    items = _expenses([10 ** 17, 0.25])
+    totals = aggregate(ExpenseTable(items))
+    assert totals.total == 10 ** 19 + 25
+
+
+def test_running_total_is_exact():
+    totals = RunningTotal()
+    for amount in (0.1, 0.2, 0.3):
+        totals.add(amount)
+    assert totals.total == 60
+    assert totals.count == 3
+    assert totals.total_decimal == Decimal("0.60")
+
+
+def test_streamed_total_matches_aggregate():
+    amounts = [0.1, 0.2] * 50 + [19.99]
+    expenses = _expenses(amounts)
+    invoice = Invoice(
+        company="BitCode", prepared_by="Test", employee_id="E1", department="HR",
+        start_date=START, end_date=END, expenses=[],
+    )
+    totals = generate_invoice_pdf_streaming(invoice, iter(expenses), io.BytesIO())
+    assert totals.count == len(amounts)
+    assert totals.total == aggregate(expenses).total
+    assert totals.total_decimal == _decimal_total(amounts)
@@ -0,0 +1,123 @@
+"""
+Tests for the JSON API's request validation and conditional responses
+(app.api).
+"""
+
+import gzip
+import json
+
+import pytest
+
+from app import create_app
+from app.cleanup import stop_cleanup_scheduler
+from app.metrics import profiler, registry
+from config import Config
+
+INVOICE = {
+    "company": "BitApps",
+    "prepared_by": "John Doe",
+    "employee_id": "EMP001",
+    "department": "HR",
+    "start_date": "2026-01-01",
+    "end_date": "2026-01-31",
+    "expenses": [
+        {"date": "2026-01-05", "category": "Travel", "description": "Client visit", "note": "", "amount": 1200.5},
+    ],
+}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    output_dir = tmp_path / "invoices"
+    monkeypatch.setattr(Config, "OUTPUT_DIR", str(output_dir))
+    monkeypatch.setattr(Config, "CLEANUP_INDEX_FILE", str(output_dir / ".expiry-index"))
+    monkeypatch.setattr(Config, "SESSION_TYPE", "memory")
+    monkeypatch.setattr(Config, "WARMUP_ENABLED", False)
+    monkeypatch.setattr(Config, "RENDER_QUEUE_ENABLED", False)
+    monkeypatch.setattr(registry, "directory", str(tmp_path / "metrics"))
+    monkeypatch.setattr(profiler, "directory", str(tmp_path / "profiles"))
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app.test_client()
+    stop_cleanup_scheduler()
+
+
+def _post(client, body, **kwargs):
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    return client.post("/api/v1/invoices", data=body, content_type="application/json", **kwargs)
+
+
+def test_renders_pdf_with_content_etag(client):
+    response = _post(client, INVOICE)
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/pdf"
+    assert response.data.startswith(b"%PDF")
+    etag, _ = response.get_etag()
+    assert len(etag) == 64
+
+
+def test_if_none_match_gets_304(client):
+    etag, _ = _post(client, INVOICE).get_etag()
+
+    response = _post(client, INVOICE, headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag() == (etag, False)
+    assert response.data == b""
+
+
+@pytest.mark.parametrize("body", [b"{not json", b"[]", json.dumps({"company": "BitApps"}).encode()])
+def test_malformed_body_gets_400(client, body):
+    response = _post(client, body)
+
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_missing_field_gets_400(client):
+    data = {name: value for name, value in INVOICE.items() if name != "start_date"}
+
+    response = _post(client, data)
+    assert response.status_code == 400
+    assert "start_date" in response.get_json()["error"]
+
+
+def test_invalid_values_get_422_with_field_errors(client):
+    data = dict(INVOICE, expenses=[dict(INVOICE["expenses"][0], amount=-5)])
+
+    response = _post(client, data)
+    assert response.status_code == 422
+    fields = [error["field"] for error in response.get_json()["errors"]]
+    assert fields == ["expenses[0].amount"]
+
+
+def test_body_over_limit_gets_413(client, monkeypatch):
+    monkeypatch.setattr(Config, "API_MAX_BODY_SIZE", 64)
+
+    response = _post(client, INVOICE)
+    assert response.status_code == 413
+
+
+def test_gzip_body_expanding_over_limit_gets_413(client, monkeypatch):
+    body = gzip.compress(json.dumps(INVOICE).encode() + b" " * 10000)
+    monkeypatch.setattr(Config, "API_MAX_BODY_SIZE", 4096)
+    assert len(body) < 4096
+
+    response = _post(client, body, headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 413
+
+
+def test_gzip_body_is_accepted(client):
+    body = gzip.compress(json.dumps(INVOICE).encode())
+
+    response = _post(client, body, headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 200
+
+
+def test_too_many_expenses_gets_413(client, monkeypatch):
+    monkeypatch.setattr(Config, "API_MAX_EXPENSES", 1)
+    data = dict(INVOICE, expenses=INVOICE["expenses"] * 2)
+
+    response = _post(client, data)
+    assert response.status_code == 413
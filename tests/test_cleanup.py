@@ -0,0 +1,55 @@
+"""
+Tests for the expiry index behind the background cleanup (app.cleanup).
+"""
+
+import json
+
+from app.cleanup import ExpiryIndex
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as index_file:
+        return [json.loads(line) for line in index_file]
+
+
+def test_pop_expired_returns_only_old_files(tmp_path):
+    index = ExpiryIndex(str(tmp_path / "index"))
+    index.add("old.pdf", created_at=100.0)
+    index.add("new.pdf", created_at=300.0)
+
+    assert index.pop_expired(cutoff=200.0) == ["old.pdf"]
+    assert index.pop_expired(cutoff=200.0) == []
+    assert _lines(index.path) == [[300.0, "new.pdf"]]
+
+
+def test_pop_expired_picks_up_appended_entries(tmp_path):
+    index = ExpiryIndex(str(tmp_path / "index"))
+    index.add("a.pdf", created_at=100.0)
+    assert index.pop_expired(cutoff=50.0) == []
+
+    index.add("b.pdf", created_at=60.0)
+    assert index.pop_expired(cutoff=150.0) == ["b.pdf", "a.pdf"]
+
+
+def test_compaction_keeps_newest_entry_per_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(ExpiryIndex, "COMPACT_MIN_ENTRIES", 4)
+    index = ExpiryIndex(str(tmp_path / "index"))
+    # Each file's expiry clock restarted several times
+    for created_at in (100.0, 200.0, 300.0):
+        index.add("a.pdf", created_at=created_at)
+        index.add("b.pdf", created_at=created_at + 1)
+
+    assert index.pop_expired(cutoff=50.0) == []
+    assert sorted(_lines(index.path)) == [[300.0, "a.pdf"], [301.0, "b.pdf"]]
+    assert index.pop_expired(cutoff=300.0) == ["a.pdf"]
+
+
+def test_no_compaction_below_ratio(tmp_path, monkeypatch):
+    monkeypatch.setattr(ExpiryIndex, "COMPACT_MIN_ENTRIES", 4)
+    index = ExpiryIndex(str(tmp_path / "index"))
+    for number in range(4):
+        index.add(f"{number}.pdf", created_at=100.0 + number)
+    index.add("0.pdf", created_at=200.0)
+
+    assert index.pop_expired(cutoff=50.0) == []
+    assert len(_lines(index.path)) == 5
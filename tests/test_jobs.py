@@ -0,0 +1,137 @@
+"""
+Tests for the SQLite render job queue (app.jobs): claiming, completion and
+the purge that requeues jobs of dead or hung workers.
+"""
+
+import os
+import sqlite3
+import subprocess
+import time
+
+import pytest
+
+from app.jobs import DONE, FAILED, HOST, INVOICE, QUEUED, RUNNING, JobQueue, QueueFullError
+from benchmarks.sample_data import make_invoice
+
+JOB_TIMEOUT = 600
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_depth=10)
+
+
+def _update(queue, job_id, **columns):
+    """Set job columns behind the queue's back, as another process would."""
+    assignments = ", ".join(f"{name} = ?" for name in columns)
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id))
+
+
+def _payload(queue, job_id):
+    with sqlite3.connect(queue.path) as conn:
+        return conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def _dead_pid():
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def _claimed(queue, filename="a.pdf"):
+    job_id = queue.enqueue(make_invoice(3), filename)
+    job = queue.claim()
+    assert job["id"] == job_id
+    return job_id
+
+
+def test_claim_takes_oldest_job_and_records_owner(queue):
+    first = queue.enqueue(make_invoice(3), "a.pdf")
+    queue.enqueue(make_invoice(4), "b.pdf")
+
+    job = queue.claim()
+    assert job["id"] == first
+    assert job["kind"] == INVOICE
+    with sqlite3.connect(queue.path) as conn:
+        status, host, pid, heartbeat_at = conn.execute(
+            "SELECT status, owner_host, owner_pid, heartbeat_at FROM jobs WHERE id = ?", (first,)
+        ).fetchone()
+    assert (status, host, pid) == (RUNNING, HOST, os.getpid())
+    assert heartbeat_at is not None
+
+    assert queue.claim()["filename"] == "b.pdf"
+    assert queue.claim() is None
+
+
+def test_enqueue_shares_pending_job_and_applies_backpressure(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_depth=1)
+    job_id = queue.enqueue(make_invoice(3), "a.pdf")
+
+    assert queue.enqueue(make_invoice(3), "a.pdf") == job_id
+    with pytest.raises(QueueFullError):
+        queue.enqueue(make_invoice(4), "b.pdf")
+
+
+def test_complete_and_fail_drop_payload(queue):
+    done = _claimed(queue, "a.pdf")
+    failed = _claimed(queue, "b.pdf")
+
+    queue.complete(done)
+    queue.fail(failed, "boom")
+
+    assert queue.get(done)["status"] == DONE
+    assert queue.get(failed)["status"] == FAILED
+    assert queue.get(failed)["error"] == "boom"
+    assert _payload(queue, done) == _payload(queue, failed) == ""
+
+
+def test_purge_leaves_slow_job_of_live_worker_running(queue):
+    job_id = _claimed(queue)
+    _update(queue, job_id, started_at=time.time() - 2 * JOB_TIMEOUT)
+    queue.heartbeat()
+
+    queue.purge(max_age_seconds=3600, job_timeout=JOB_TIMEOUT)
+    assert queue.get(job_id)["status"] == RUNNING
+
+
+def test_purge_requeues_job_of_dead_worker(queue):
+    job_id = _claimed(queue)
+    _update(queue, job_id, owner_pid=_dead_pid())
+
+    queue.purge(max_age_seconds=3600, job_timeout=JOB_TIMEOUT)
+    job = queue.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["started_at"] is None
+    assert queue.claim()["id"] == job_id
+
+
+def test_purge_requeues_job_with_stale_heartbeat(queue):
+    job_id = _claimed(queue)
+    # Owned by a worker on another host that stopped heartbeating
+    stale = time.time() - 2 * JOB_TIMEOUT
+    _update(queue, job_id, owner_host="elsewhere", owner_pid=1, started_at=stale, heartbeat_at=stale)
+
+    queue.purge(max_age_seconds=3600, job_timeout=JOB_TIMEOUT)
+    assert queue.get(job_id)["status"] == QUEUED
+
+
+def test_purge_requeues_stale_job_claimed_before_heartbeats(queue):
+    job_id = _claimed(queue)
+    _update(queue, job_id, owner_host=None, owner_pid=None, heartbeat_at=None,
+            started_at=time.time() - 2 * JOB_TIMEOUT)
+
+    queue.purge(max_age_seconds=3600, job_timeout=JOB_TIMEOUT)
+    assert queue.get(job_id)["status"] == QUEUED
+
+
+def test_purge_drops_old_finished_jobs(queue):
+    old = _claimed(queue, "a.pdf")
+    recent = _claimed(queue, "b.pdf")
+    queue.complete(old)
+    queue.complete(recent)
+    _update(queue, old, finished_at=time.time() - 7200)
+
+    queue.purge(max_age_seconds=3600, job_timeout=JOB_TIMEOUT)
+    assert queue.get(old) is None
+    assert queue.get(recent)["status"] == DONE
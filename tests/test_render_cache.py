@@ -0,0 +1,48 @@
+"""
+Tests for the render cache's content key (app.render_cache.invoice_key).
+"""
+
+from dataclasses import replace
+
+from app.render_cache import invoice_key, stored_filename
+from benchmarks.sample_data import make_invoice
+
+
+def test_key_ignores_surrounding_whitespace():
+    invoice = make_invoice(3)
+    padded = replace(
+        invoice,
+        company=f"  {invoice.company} ",
+        prepared_by=f"{invoice.prepared_by}\n",
+        expenses=[
+            replace(item, category=f" {item.category}", description=f"{item.description}  ", note=f"\t{item.note}")
+            for item in invoice.expenses
+        ],
+    )
+
+    assert invoice_key(padded) == invoice_key(invoice)
+
+
+def test_key_uses_amounts_as_printed():
+    invoice = make_invoice(3)
+    item = invoice.expenses[0]
+    # 1000.5 and 1000.50000001 both print as 1000.50
+    nudged = replace(invoice, expenses=[replace(item, amount=item.amount + 1e-8), *invoice.expenses[1:]])
+    assert invoice_key(nudged) == invoice_key(invoice)
+
+    changed = replace(invoice, expenses=[replace(item, amount=item.amount + 0.01), *invoice.expenses[1:]])
+    assert invoice_key(changed) != invoice_key(invoice)
+
+
+def test_key_changes_with_content():
+    invoice = make_invoice(3)
+    assert invoice_key(replace(invoice, department="Finance")) != invoice_key(invoice)
+    assert invoice_key(make_invoice(4)) != invoice_key(invoice)
+    assert invoice_key(replace(invoice, expenses=invoice.expenses[::-1])) != invoice_key(invoice)
+
+
+def test_stored_filename_is_key():
+    invoice = make_invoice(3)
+    key = invoice_key(invoice)
+    assert len(key) == 64
+    assert stored_filename(invoice) == f"{key}.pdf"
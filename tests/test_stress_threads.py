@@ -0,0 +1,17 @@
+"""
+Thread-safety check of the PDF renderer: concurrent renders in one process
+must match their serial renders byte for byte (benchmarks.stress_threads).
+"""
+
+from reportlab import rl_config
+
+from app.metrics import profiler
+from benchmarks.stress_threads import check_renders
+
+
+def test_concurrent_renders_match_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    monkeypatch.setattr(profiler, "directory", str(tmp_path / "profiles"))
+    monkeypatch.setattr(profiler, "keep", 3)
+
+    assert check_renders(threads=4, rounds=2) == 0